@@ -0,0 +1,16 @@
+"""Past games cutoff
+
+More often then not we don't care about games in the past, games lists
+keep them for CUTOFF_DELTA after they start (see GameQuerySet.future)
+"""
+from datetime import datetime, timedelta
+
+__all__ = ['CUTOFF_DELTA', 'get_cutoff_time']
+
+
+CUTOFF_DELTA = timedelta(minutes=90)
+
+
+def get_cutoff_time():
+    """Datetime to use in a query with datetime__gt filter"""
+    return datetime.utcnow() - CUTOFF_DELTA
@@ -0,0 +1,87 @@
+"""Per-user cache for game feeds (my games and game invites)
+
+Cached feeds are keyed by a user's feed version. The version is bumped
+whenever any of the user's RsvpStatus rows or games they have rsvps for
+change, along with the locations and teams of those games, which makes
+every cached page of their feeds stale at once.
+
+Games drop out of the feeds by time too (see GameQuerySet.future), so
+a cached page never outlives the first of its games to do so.
+
+Versions are bumped in the cache, so it has to be shared by every API
+process (see CACHES)
+"""
+import hashlib
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .cutoff import CUTOFF_DELTA
+
+__all__ = [
+    'bump_feed_versions',
+    'get_feed_cache_key',
+    'get_feed_timeout',
+]
+
+
+# Feed cache timeout in seconds
+CACHE_TIMEOUT = 10 * 60
+
+
+def get_version_key(user_id):
+    return f'games:feed-version:{user_id}'
+
+
+def get_feed_version(user_id):
+    return cache.get_or_set(get_version_key(user_id), uuid4().hex, None)
+
+
+def set_feed_versions(user_ids):
+    cache.set_many({
+        get_version_key(user_id): uuid4().hex
+        for user_id in user_ids
+    }, None)
+
+
+def bump_feed_versions(user_ids):
+    """Invalidate cached feeds of the users
+
+    Bumped right away and once again after the transaction commits, so
+    requests running meanwhile can't cache data that is about to change
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    set_feed_versions(user_ids)
+    transaction.on_commit(lambda: set_feed_versions(user_ids))
+
+
+def get_feed_cache_key(user_id, feed, params=''):
+    """Cache key for a page of the user feed
+
+    Args:
+        user_id - feed owner
+        feed - feed name (view action)
+        params - anything else that changes the page (query params, etc...)
+    """
+    version = get_feed_version(user_id)
+    params = hashlib.md5(str(params).encode()).hexdigest()
+    return f'games:feed:{user_id}:{version}:{feed}:{params}'
+
+
+def get_feed_timeout(datetimes, cutoff=True):
+    """Feed cache timeout, in seconds, for a page of games
+
+    Args:
+        datetimes - datetimes of the games on the page
+        cutoff - whether or not old games are filtered out of the feed
+    """
+    if not cutoff or not datetimes:
+        return CACHE_TIMEOUT
+
+    expires = min(datetimes) + CUTOFF_DELTA - timezone.now()
+    return max(1, min(CACHE_TIMEOUT, int(expires.total_seconds())))
@@ -0,0 +1,194 @@
+"""Games and locations filter backends"""
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db.models import BooleanField, F, FloatField, Func, Q, Value
+from django.db.models.functions import Greatest
+from rest_framework.compat import coreapi
+from rest_framework.exceptions import ParseError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+__all__ = ['GameSearchFilter', 'NearFilter']
+
+
+class Geography(Func):
+    """Cast SRID 4326 geometry to geography, distances are in metres"""
+    template = '%(expressions)s::geography'
+
+
+class GeographyPoint(Func):
+    template = 'ST_SetSRID(ST_MakePoint(%(expressions)s), 4326)::geography'
+
+
+class GeographyDistance(Func):
+    function = 'ST_Distance'
+    output_field = FloatField()
+
+
+class GeographyDWithin(Func):
+    function = 'ST_DWithin'
+    output_field = BooleanField()
+
+
+class KNNDistance(Func):
+    """
+    <-> operator, index assisted nearest neighbour ordering when one side
+    is an indexed column (or expression) and the other is a constant
+    """
+    arg_joiner = ' <-> '
+    template = '(%(expressions)s)'
+    output_field = FloatField()
+
+
+class NearFilter(BaseFilterBackend):
+    """
+    Games (or locations) near a point, ordered by distance
+
+    `?near=lon,lat` orders results by distance, nearest first, adding
+    `distance` in metres to each of them. `radius` (in metres) limits
+    results to those within the radius from the point
+
+    Results of a search (GameSearchFilter should come first) stay in the
+    best matches first order, distance only orders equally ranked ones
+
+    Use `near_filter_field` view attribute to set SRID 4326 point field to
+    filter on
+    """
+    near_param = 'near'
+    radius_param = 'radius'
+
+    def get_point(self, request):
+        value = request.query_params.get(self.near_param, None)
+        if not value:
+            return None
+
+        try:
+            lon, lat = (float(n) for n in value.split(','))
+        except ValueError:
+            raise ParseError(
+                f'Invalid point string supplied for parameter {self.near_param}'
+            )
+
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            raise ParseError(f'Point {value!r} is out of range')
+        return lon, lat
+
+    def get_radius(self, request):
+        value = request.query_params.get(self.radius_param, None)
+        if not value:
+            return None
+
+        try:
+            radius = float(value)
+        except ValueError:
+            raise ParseError(
+                f'Invalid distance supplied for parameter {self.radius_param}'
+            )
+
+        if radius < 0:
+            raise ParseError('Radius can not be negative')
+        return radius
+
+    def filter_queryset(self, request, queryset, view):
+        filter_field = getattr(view, 'near_filter_field', None)
+        point = self.get_point(request)
+
+        if not filter_field or point is None:
+            return queryset
+
+        lon, lat = point
+        radius = self.get_radius(request)
+
+        # Both sides are geographies so the ordering and filtering use the
+        # (field::geography) GiST index and radius is in metres
+        field = Geography(F(filter_field))
+        point = GeographyPoint(
+            Value(lon, output_field=FloatField()),
+            Value(lat, output_field=FloatField()),
+        )
+
+        queryset = queryset.annotate(
+            distance=GeographyDistance(field, point),
+            knn_distance=KNNDistance(field, point),
+        )
+
+        if radius is not None:
+            queryset = queryset\
+                .annotate(near=GeographyDWithin(
+                    field, point, Value(radius, output_field=FloatField())
+                ))\
+                .filter(near=True)
+
+        if 'search_rank' in queryset.query.annotations:
+            return queryset.order_by('-search_rank', 'distance', 'id')
+        return queryset.order_by('knn_distance', 'id')
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=self.near_param,
+                required=False,
+                location='query',
+                description='Point (lon,lat) to look for nearest results.',
+            ),
+            coreapi.Field(
+                name=self.radius_param,
+                required=False,
+                location='query',
+                description='Max distance from the `near` point in metres.',
+            ),
+        ]
+
+
+class GameSearchFilter(BaseFilterBackend):
+    """
+    Full text search over game name, description, location name and
+    address (see Game.search_vector), best matches first.
+
+    When the first page of matches is empty, views can set
+    `search_fallback` and filter again to get games with similar (trigram)
+    game or location names instead, so typos still get results (see
+    GameViewSet.list)
+    """
+    search_param = api_settings.SEARCH_PARAM
+    search_config = 'english'
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        if getattr(view, 'search_fallback', False):
+            matches = queryset\
+                .filter(
+                    Q(name__trigram_similar=terms) |
+                    Q(location__name__trigram_similar=terms)
+                )\
+                .annotate(search_rank=Greatest(
+                    TrigramSimilarity('name', terms),
+                    TrigramSimilarity('location__name', terms),
+                ))
+        else:
+            query = SearchQuery(terms, config=self.search_config)
+            matches = queryset\
+                .filter(search_vector=query)\
+                .annotate(search_rank=SearchRank(F('search_vector'), query))
+
+        return matches.order_by('-search_rank', 'id')
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=self.search_param,
+                required=False,
+                location='query',
+                description='Search by game or location name, address and '
+                            'game description.',
+            ),
+        ]
@@ -0,0 +1,113 @@
+"""Compare game list RsvpStatus annotation strategies
+
+Creates games with a given number of RSVPs each (inside a transaction that
+is rolled back at the end) and times a page of `Game.objects.with_rsvps()`
+plus the pagination COUNT for every strategy
+"""
+from datetime import timedelta
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from games.models import Game, GameQuerySet, Location, RsvpStatus
+from main.transactions import rolled_back
+from users.models import User
+
+
+DEFAULT_SIZES = [20, 200, 2000]
+DEFAULT_GAMES = 50
+DEFAULT_REPEAT = 5
+
+STRATEGIES = [GameQuerySet.RSVPS_JOIN, GameQuerySet.RSVPS_SUBQUERY]
+
+USERNAME_PREFIX = '_benchrsvps'
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            dest='sizes',
+            type=int,
+            nargs='+',
+            default=DEFAULT_SIZES,
+            help='RSVPs per game to benchmark (Default {}).'
+                 .format(DEFAULT_SIZES),
+        )
+        parser.add_argument(
+            '--games',
+            dest='games',
+            type=int,
+            default=DEFAULT_GAMES,
+            help='Number of games (Default {}).'.format(DEFAULT_GAMES),
+        )
+        parser.add_argument(
+            '--repeat',
+            dest='repeat',
+            type=int,
+            default=DEFAULT_REPEAT,
+            help='Runs per measurement (Default {}).'.format(DEFAULT_REPEAT),
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:>8} {:>10} {:>12} {:>12}'.format(
+            'rsvps', 'strategy', 'page, ms', 'count, ms'))
+
+        for size in options['sizes']:
+            with rolled_back():
+                viewer = self.create_data(size, options['games'])
+                for strategy in STRATEGIES:
+                    page_ms, count_ms = self.measure(
+                        viewer, strategy, options['repeat'])
+                    self.stdout.write('{:>8} {:>10} {:>12.2f} {:>12.2f}'
+                                      .format(size, strategy,
+                                              page_ms, count_ms))
+
+    def create_data(self, size, games_count):
+        users = User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{i}', email='')
+            for i in range(size)
+        ])
+        location = Location.objects.create(name=USERNAME_PREFIX)
+        now = timezone.now()
+        games = Game.objects.bulk_create([
+            Game(
+                datetime=now + timedelta(hours=i + 1),
+                location=location,
+                organizer=users[0],
+            )
+            for i in range(games_count)
+        ])
+        statuses = [choice for choice, _ in RsvpStatus.RSVP_CHOICES]
+        RsvpStatus.objects.bulk_create([
+            RsvpStatus(
+                game=game,
+                player=player,
+                status=statuses[(game.id + player.id) % len(statuses)],
+            )
+            for game in games
+            for player in users
+        ], batch_size=5000)
+        return users[0]
+
+    def measure(self, viewer, strategy, repeat):
+        queryset = Game.objects\
+            .with_rsvps(viewer, strategy=strategy)\
+            .select_related('location')
+
+        page_times = []
+        count_times = []
+        for _ in range(repeat):
+            start = perf_counter()
+            list(queryset[:DEFAULT_GAMES])
+            page_times.append(perf_counter() - start)
+
+            start = perf_counter()
+            queryset.count()
+            count_times.append(perf_counter() - start)
+
+        return median(page_times) * 1000, median(count_times) * 1000
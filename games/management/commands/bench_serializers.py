@@ -0,0 +1,119 @@
+"""Compare game list and rsvp list serializers throughput
+
+Creates games with teams and RSVPs (inside a transaction that is rolled
+back at the end) and times a page through the model serializers and
+through the fast `values()` ones (see main.fast), queries included
+"""
+from datetime import timedelta
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from games.models import Game, Location, RsvpStatus
+from games.serializers import (
+    GameListFastSerializer,
+    GameListSerializer,
+    RsvpFastSerializer,
+    RsvpSerializer,
+)
+from main.eager import optimize_queryset
+from main.transactions import rolled_back
+from teams.models import Team
+from users.models import User
+
+
+DEFAULT_PAGE = 50
+DEFAULT_REPEAT = 20
+
+USERNAME_PREFIX = '_benchserializers'
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page',
+            dest='page',
+            type=int,
+            default=DEFAULT_PAGE,
+            help='Page size (Default {}).'.format(DEFAULT_PAGE),
+        )
+        parser.add_argument(
+            '--repeat',
+            dest='repeat',
+            type=int,
+            default=DEFAULT_REPEAT,
+            help='Runs per measurement (Default {}).'.format(DEFAULT_REPEAT),
+        )
+
+    def handle(self, *args, **options):
+        page = options['page']
+        repeat = options['repeat']
+
+        self.stdout.write('{:>8} {:>8} {:>12} {:>12}'.format(
+            'list', 'path', 'page, ms', 'rows/s'))
+
+        with rolled_back():
+            viewer, game = self.create_data(page)
+
+            games = Game.objects.with_rsvps(viewer)
+            rsvps = RsvpStatus.objects.filter(game=game)
+            benchmarks = [
+                ('games', games,
+                 GameListSerializer, GameListFastSerializer),
+                ('rsvps', rsvps,
+                 RsvpSerializer, RsvpFastSerializer),
+            ]
+            for name, queryset, serializer_class, fast_class in \
+                    benchmarks:
+                slow = optimize_queryset(queryset, serializer_class)
+                fast = fast_class.get_values(queryset)
+                for path, rows, cls in [('model', slow, serializer_class),
+                                        ('fast', fast, fast_class)]:
+                    ms = self.measure(rows[:page], cls, repeat)
+                    self.stdout.write('{:>8} {:>8} {:>12.2f} {:>12.0f}'
+                                      .format(name, path, ms,
+                                              page / ms * 1000))
+
+    def create_data(self, size):
+        users = User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{i}', email='')
+            for i in range(size)
+        ])
+        teams = Team.objects.bulk_create([
+            Team(name=f'{USERNAME_PREFIX}{i}') for i in range(2)
+        ])
+        location = Location.objects.create(name=USERNAME_PREFIX)
+        now = timezone.now()
+        games = Game.objects.bulk_create([
+            Game(
+                datetime=now + timedelta(hours=i + 1),
+                location=location,
+                organizer=users[0],
+            )
+            for i in range(size)
+        ])
+        Game.teams.through.objects.bulk_create([
+            Game.teams.through(game=game, team=team)
+            for game in games
+            for team in teams
+        ])
+        RsvpStatus.objects.bulk_create([
+            RsvpStatus(game=games[0], player=player, status=RsvpStatus.GOING)
+            for player in users
+        ] + [
+            RsvpStatus(game=game, player=users[0], status=RsvpStatus.GOING)
+            for game in games[1:]
+        ])
+        return users[0], games[0]
+
+    def measure(self, queryset, serializer_class, repeat):
+        times = []
+        for _ in range(repeat):
+            start = perf_counter()
+            serializer_class(queryset.all(), many=True).data
+            times.append(perf_counter() - start)
+        return median(times) * 1000
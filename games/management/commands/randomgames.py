@@ -1,15 +1,26 @@
 """Ensure that there are randomly generated games in the system
+
+With --offline any number of games is generated from a seed, along with
+their locations. Part of them are games between random teams (see
+randomteams), the rest are pickup games of random users. RSVPs are copied
+in parallel processes
 """
+import os
+from collections import defaultdict
 from random import choice, sample, randrange
 from datetime import timedelta
 
+from django.contrib.gis.geos import Point
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 
-from users.models import User
-from teams.models import Team
+from main.seeding import DEFAULT_SEED, copy_rows, get_random, run_chunks
+from users.models import User, recount_invites
+from teams.models import Role, Team
 from games.models import Game, Location, RsvpStatus
 
+from teams.management.commands.randomteams import \
+    VERSIONED_PREFIX as TEAMS_PREFIX
 from users.management.commands.randomusers import USERNAME_PREFIX
 from .randomlocations import VERSIONED_PREFIX as LOCATIONS_PREFIX
 
@@ -22,6 +33,46 @@ DESC_PREFIX = '_rndgnd'
 VERSION = 'v003'  # Change this when you update the command
 VERSIONED_PREFIX = DESC_PREFIX + VERSION
 
+# Offline games
+DEFAULT_LOCATIONS = 50
+DEFAULT_TEAM_GAMES = 25  # percent of the games
+CENTER = (-121.49, 38.58)  # Sacramento (lon, lat)
+SPREAD = 0.5  # degrees around the center
+DAYS = 60  # games are spread over that many days from now
+PLAYERS = [11 * 2, 8 * 2]
+# Weighted rsvps of pickup game players other than the organizer
+STATUSES = [RsvpStatus.GOING] * 4 + [
+    RsvpStatus.INVITED,
+    RsvpStatus.NOT_GOING,
+    RsvpStatus.UNCERTAIN,
+]
+BATCH_SIZE = 5000
+# Pickup games per rsvps copying process call, doesn't depend on --jobs
+# so that the rsvps are the same
+CHUNK_SIZE = 2000
+RSVP_COLUMNS = ['game_id', 'player_id', 'status', 'team']
+
+
+def copy_pickup_rsvps(chunk):
+    """Copy rsvps of a chunk of pickup games (see run_chunks)
+
+    chunk - (seed, number, [(game_id, organizer_id), ...], player_ids)
+    """
+    seed, number, games, player_ids = chunk
+    random = get_random(seed, 'rsvps', number)
+
+    rows = []
+    for game_id, organizer_id in games:
+        rows.append(
+            (game_id, organizer_id, RsvpStatus.GOING, RsvpStatus.NO_TEAM))
+        rows.extend(
+            (game_id, player_id, random.choice(STATUSES), RsvpStatus.NO_TEAM)
+            for player_id in random.sample(player_ids, random.choice(PLAYERS))
+            if player_id != organizer_id
+        )
+    copy_rows(RsvpStatus, RSVP_COLUMNS, rows)
+    return len(rows)
+
 
 class Command(BaseCommand):
     help = __doc__
@@ -42,6 +93,44 @@ class Command(BaseCommand):
             default=False,
             help='Force (re)creationg of games',
         )
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            dest='offline',
+            default=False,
+            help='Generate games with locations and team games',
+        )
+        parser.add_argument(
+            '--locations',
+            dest='locations',
+            type=int,
+            default=DEFAULT_LOCATIONS,
+            help='Number of offline locations (Default {}).'
+                 .format(DEFAULT_LOCATIONS),
+        )
+        parser.add_argument(
+            '--team-games',
+            dest='team_games',
+            type=int,
+            default=DEFAULT_TEAM_GAMES,
+            help='Percent of offline team games (Default {}).'
+                 .format(DEFAULT_TEAM_GAMES),
+        )
+        parser.add_argument(
+            '--seed',
+            dest='seed',
+            default=DEFAULT_SEED,
+            help='Seed of the offline games (Default {}).'
+                 .format(DEFAULT_SEED),
+        )
+        parser.add_argument(
+            '--jobs',
+            dest='jobs',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes copying offline rsvps (Default {}).'
+                 .format(os.cpu_count() or 1),
+        )
 
     def handle(self, *args, **options):
         count = options['count']
@@ -61,6 +150,13 @@ class Command(BaseCommand):
             if count == 0:
                 return
 
+        if options['offline']:
+            self.create_offline_games(count, options)
+            self.stdout.write(self.style.SUCCESS(
+                'Successfully created "{}" offline games'.format(count)
+            ))
+            return
+
         locations = list(Location.objects.filter(
             address__startswith=LOCATIONS_PREFIX
         ))
@@ -87,3 +183,102 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(
             'Successfully created "{}" random games'.format(options['count'])
         ))
+
+    def create_offline_games(self, count, options):
+        seed = options['seed']
+        random = get_random(seed, 'games')
+
+        player_ids = list(User.objects
+                          .filter(username__startswith=USERNAME_PREFIX)
+                          .order_by('id')
+                          .values_list('id', flat=True))
+        if len(player_ids) < max(PLAYERS):
+            raise CommandError('Not enough random users, run randomusers')
+
+        # Team id -> (captain id, active players ids)
+        teams = defaultdict(lambda: (None, []))
+        roles = Role.objects\
+            .filter(team__info__startswith=TEAMS_PREFIX)\
+            .filter(role__gt=Role.INACTIVE)\
+            .order_by('team_id', '-role', 'player_id')\
+            .values_list('team_id', 'player_id', 'role')
+        for team_id, player_id, role in roles:
+            captain, players = teams[team_id]
+            if role == Role.CAPTAIN:
+                captain = player_id
+            teams[team_id] = (captain, players + [player_id])
+        team_ids = sorted(
+            team_id for team_id, (captain, _) in teams.items() if captain)
+
+        offline_locations = f'{LOCATIONS_PREFIX}offline '
+        Location.objects\
+            .filter(address__startswith=offline_locations)\
+            .delete()
+        locations = Location.objects.bulk_create([
+            Location(
+                address=f'{offline_locations}{i}',
+                gis=Point(
+                    CENTER[0] + random.uniform(-SPREAD, SPREAD),
+                    CENTER[1] + random.uniform(-SPREAD, SPREAD),
+                ),
+                name=f'Offline field {i}',
+            )
+            for i in range(options['locations'])
+        ])
+
+        now = timezone.now()
+        pickup_games = []
+        for start in range(0, count, BATCH_SIZE):
+            games = []
+            games_teams = []
+            for _ in range(start, min(count, start + BATCH_SIZE)):
+                game_teams = []
+                if len(team_ids) > 1 and \
+                        random.randrange(100) < options['team_games']:
+                    game_teams = random.sample(team_ids, 2)
+                organizer_id = teams[game_teams[0]][0] if game_teams else \
+                    random.choice(player_ids)
+                games.append(Game(
+                    datetime=now + timedelta(
+                        minutes=random.randrange(DAYS * 24 * 60)),
+                    description=VERSIONED_PREFIX,
+                    duration=random.choice([40, 45, 90]),
+                    location=random.choice(locations),
+                    organizer_id=organizer_id,
+                ))
+                games_teams.append(game_teams)
+
+            Game.objects.bulk_create(games)
+
+            rsvps = []
+            through = []
+            for game, game_teams in zip(games, games_teams):
+                if not game_teams:
+                    pickup_games.append((game.id, game.organizer_id))
+                    continue
+
+                # Through rows are created in team number order
+                invited = set()
+                for number, team_id in enumerate(game_teams):
+                    through.append((game.id, team_id))
+                    for player_id in teams[team_id][1]:
+                        if player_id in invited:
+                            continue
+                        invited.add(player_id)
+                        status = RsvpStatus.GOING \
+                            if player_id == game.organizer_id \
+                            else random.choice(
+                                [RsvpStatus.INVITED, RsvpStatus.GOING])
+                        rsvps.append((game.id, player_id, status, number))
+
+            copy_rows(Game.teams.through, ['game_id', 'team_id'], through)
+            copy_rows(RsvpStatus, RSVP_COLUMNS, rsvps)
+
+        run_chunks(copy_pickup_rsvps, [
+            (seed, number, pickup_games[i:i + CHUNK_SIZE], player_ids)
+            for number, i in enumerate(
+                range(0, len(pickup_games), CHUNK_SIZE))
+        ], max(1, options['jobs']))
+
+        # Rsvps are copied without signals
+        recount_invites()
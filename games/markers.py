@@ -0,0 +1,142 @@
+"""Map markers for game lists
+
+Games are aggregated inside PostGIS, either into per-location markers or,
+at lower zoom levels, into grid clusters (ST_SnapToGrid on `Location.gis`).
+Results are cached per bbox tile, zoom level and filter so panning around
+the map doesn't hit the database for every request.
+"""
+import hashlib
+from math import floor, ceil
+
+from django.contrib.gis.db.models.functions import SnapToGrid
+from django.contrib.gis.geos import Polygon
+from django.core.cache import cache
+from django.db.models import Avg, Count, FloatField, Func
+
+__all__ = ['get_markers', 'get_tile_bbox']
+
+
+# Zoom levels (as in slippy map tiles) clients are allowed to ask for
+MIN_ZOOM = 0
+MAX_ZOOM = 22
+
+# Starting from this zoom level every location gets its own marker
+LOCATIONS_ZOOM = 14
+
+# Number of cluster cells along one side of a 256px map tile
+CELLS_PER_TILE = 4
+
+# Markers cache timeout in seconds
+CACHE_TIMEOUT = 60
+
+
+class X(Func):
+    function = 'ST_X'
+    output_field = FloatField()
+
+
+class Y(Func):
+    function = 'ST_Y'
+    output_field = FloatField()
+
+
+def get_tile_size(zoom):
+    """Width of a map tile in degrees for the zoom level"""
+    return 360 / 2 ** zoom
+
+
+def get_tile_bbox(bbox, zoom):
+    """Extend (min_x, min_y, max_x, max_y) bbox to the map tiles borders
+
+    Makes nearby bboxes share a cache key and cluster cells
+    """
+    size = get_tile_size(zoom)
+    min_x, min_y, max_x, max_y = bbox
+    return (
+        max(floor(min_x / size) * size, -180),
+        max(floor(min_y / size) * size, -90),
+        min(ceil(max_x / size) * size, 180),
+        min(ceil(max_y / size) * size, 90),
+    )
+
+
+def get_cache_key(bbox, zoom, query_key):
+    key = hashlib.md5(f'{bbox}:{zoom}:{query_key}'.encode()).hexdigest()
+    return f'games:markers:{key}'
+
+
+def get_location_markers(queryset):
+    rows = queryset\
+        .values('location_id', 'location__name', 'location__address')\
+        .annotate(
+            games=Count('id'),
+            x=X('location__gis'),
+            y=Y('location__gis'),
+        )\
+        .order_by()
+
+    return [{
+        'type': 'location',
+        'id': row['location_id'],
+        'name': row['location__name'],
+        'address': row['location__address'],
+        'coordinates': [row['x'], row['y']],
+        'games': row['games'],
+    } for row in rows]
+
+
+def get_cluster_markers(queryset, zoom):
+    cell_size = get_tile_size(zoom) / CELLS_PER_TILE
+    rows = queryset\
+        .annotate(cell=SnapToGrid('location__gis', cell_size))\
+        .values('cell')\
+        .annotate(
+            games=Count('id'),
+            locations=Count('location_id', distinct=True),
+            x=Avg(X('location__gis')),
+            y=Avg(Y('location__gis')),
+        )\
+        .order_by()
+
+    return [{
+        'type': 'cluster',
+        'coordinates': [row['x'], row['y']],
+        'games': row['games'],
+        'locations': row['locations'],
+    } for row in rows]
+
+
+def get_markers(queryset, zoom, bbox=None, query_key=''):
+    """Aggregate games in the queryset into map markers
+
+    Args:
+        queryset - filtered games queryset, without the bbox filter
+        zoom - map zoom level (MIN_ZOOM..MAX_ZOOM)
+        bbox - optional (min_x, min_y, max_x, max_y) map bounding box
+        query_key - a string that identifies the rest of the filters
+    """
+    if bbox is not None:
+        bbox = get_tile_bbox(bbox, zoom)
+
+    key = get_cache_key(bbox, zoom, query_key)
+    markers = cache.get(key)
+    if markers is not None:
+        return markers
+
+    queryset = queryset\
+        .exclude(location__gis=None)\
+        .select_related(None)\
+        .prefetch_related(None)
+
+    if bbox is not None:
+        queryset = queryset.filter(
+            location__gis__contained=Polygon.from_bbox(bbox)
+        )
+
+    if zoom >= LOCATIONS_ZOOM:
+        markers = get_location_markers(queryset)
+    else:
+        markers = get_cluster_markers(queryset, zoom)
+
+    cache.set(key, markers, CACHE_TIMEOUT)
+    return markers
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2017-10-02 12:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0010_auto_20170825_1600'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['datetime', 'id'], name='games_game_datetime_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rsvpstatus',
+            index=models.Index(fields=['player', 'status'], name='games_rsvp_player_status_idx'),
+        ),
+        # Pending game invites (status = INVITED)
+        migrations.RunSQL(
+            'CREATE INDEX games_rsvp_invited_idx '
+            'ON games_rsvpstatus (player_id) WHERE status = -1',
+            'DROP INDEX games_rsvp_invited_idx',
+        ),
+    ]
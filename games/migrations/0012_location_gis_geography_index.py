@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2017-10-04 10:31
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        # Nearest neighbour ordering and metre based radius filtering
+        # (see games.filters.NearFilter)
+        migrations.RunSQL(
+            'CREATE INDEX games_location_gis_geography_idx '
+            'ON games_location USING GIST ((gis::geography))',
+            'DROP INDEX games_location_gis_geography_idx',
+        ),
+    ]
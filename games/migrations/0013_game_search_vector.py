@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2017-10-05 17:12
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# Game search vector is maintained by triggers, so it stays up to date
+# no matter how games (or their locations) are written
+SEARCH_VECTOR_TRIGGERS = [
+    """
+    CREATE FUNCTION games_game_search_vector_update() RETURNS trigger AS $$
+    DECLARE
+        location RECORD;
+    BEGIN
+        SELECT name, address INTO location
+        FROM games_location WHERE id = NEW.location_id;
+
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(location.name, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(location.address, '')), 'C') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'D');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER games_game_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON games_game
+    FOR EACH ROW EXECUTE PROCEDURE games_game_search_vector_update()
+    """,
+    """
+    CREATE FUNCTION games_location_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE games_game SET search_vector = NULL
+        WHERE location_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER games_location_search_vector_trigger
+    AFTER UPDATE OF name, address ON games_location
+    FOR EACH ROW EXECUTE PROCEDURE games_location_search_vector_update()
+    """,
+    # Populate vectors for existing games
+    'UPDATE games_game SET search_vector = NULL',
+]
+
+DROP_SEARCH_VECTOR_TRIGGERS = [
+    'DROP TRIGGER games_location_search_vector_trigger ON games_location',
+    'DROP FUNCTION games_location_search_vector_update()',
+    'DROP TRIGGER games_game_search_vector_trigger ON games_game',
+    'DROP FUNCTION games_game_search_vector_update()',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0012_location_gis_geography_index'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='game',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='games_game_search_idx'),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGERS, DROP_SEARCH_VECTOR_TRIGGERS),
+        # Trigram indexes for typo tolerant search fallback
+        migrations.RunSQL(
+            [
+                'CREATE INDEX games_game_name_trgm_idx '
+                'ON games_game USING GIN (name gin_trgm_ops)',
+                'CREATE INDEX games_location_name_trgm_idx '
+                'ON games_location USING GIN (name gin_trgm_ops)',
+            ],
+            [
+                'DROP INDEX games_location_name_trgm_idx',
+                'DROP INDEX games_game_name_trgm_idx',
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2017-10-09 11:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# Game.modified is bumped on every rsvp change, search vector only needs
+# updating when the searched columns change (search_vector is set to NULL
+# by the location trigger, see migration 0013)
+SEARCH_VECTOR_TRIGGER = [
+    'DROP TRIGGER games_game_search_vector_trigger ON games_game',
+    """
+    CREATE TRIGGER games_game_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, location_id, search_vector
+    ON games_game
+    FOR EACH ROW EXECUTE PROCEDURE games_game_search_vector_update()
+    """,
+]
+
+PREVIOUS_SEARCH_VECTOR_TRIGGER = [
+    'DROP TRIGGER games_game_search_vector_trigger ON games_game',
+    """
+    CREATE TRIGGER games_game_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON games_game
+    FOR EACH ROW EXECUTE PROCEDURE games_game_search_vector_update()
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0013_game_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            SEARCH_VECTOR_TRIGGER,
+            PREVIOUS_SEARCH_VECTOR_TRIGGER,
+        ),
+    ]
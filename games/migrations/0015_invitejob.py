@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2017-10-10 15:42
+from __future__ import unicode_literals
+
+from django.conf import settings
+import django.contrib.postgres.fields
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('games', '0014_game_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InviteJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunks', models.IntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('failed', models.BooleanField(default=False)),
+                ('finished_chunks', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('game_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None)),
+                ('invited', models.IntegerField(default=0)),
+                ('players', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invite_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Team number of a game team is the position of its through row by id (see
+# GamePermissionContext), older games were created with teams.add(), which
+# inserts rows in any order. Their numbers are kept by the rsvps of the
+# team players (RsvpStatus.team, 0 or 1), rows of games with two teams are
+# inserted again in that order
+ORDER_GAME_TEAMS = [
+    """
+    CREATE TEMPORARY TABLE games_game_teams_order AS
+    SELECT game_team.id, game_team.game_id, game_team.team_id, (
+        SELECT rsvp.team FROM games_rsvpstatus AS rsvp
+        JOIN teams_role AS role ON role.player_id = rsvp.player_id
+        WHERE rsvp.game_id = game_team.game_id
+        AND role.team_id = game_team.team_id
+        AND rsvp.team IN (0, 1)
+        GROUP BY rsvp.team
+        ORDER BY count(*) DESC, rsvp.team
+        LIMIT 1
+    ) AS number
+    FROM games_game_teams AS game_team
+    WHERE game_team.game_id IN (
+        SELECT game_id FROM games_game_teams
+        GROUP BY game_id HAVING count(*) > 1
+    )
+    """,
+    """
+    DELETE FROM games_game_teams
+    WHERE id IN (SELECT id FROM games_game_teams_order)
+    """,
+    """
+    INSERT INTO games_game_teams (game_id, team_id)
+    SELECT game_id, team_id FROM games_game_teams_order
+    ORDER BY game_id, number NULLS LAST, id
+    """,
+    'DROP TABLE games_game_teams_order',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0015_invitejob'),
+        ('teams', '0005_team_modified'),
+    ]
+
+    operations = [
+        migrations.RunSQL(ORDER_GAME_TEAMS, migrations.RunSQL.noop),
+    ]
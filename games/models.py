@@ -1,9 +1,35 @@
-from datetime import datetime, timedelta
+from collections import Counter
 
 from django.contrib.gis.db import models
-from django.db.models import F, When, Case, Max
+from django.contrib.postgres.fields import ArrayField, JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections
+from django.db.transaction import atomic
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.db.models import (
+    Case,
+    DateTimeField,
+    F,
+    Func,
+    IntegerField,
+    Max,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 from teams.models import Team
+from .cutoff import get_cutoff_time
+from .feeds import bump_feed_versions
+
+
+class ArrayAppend(Func):
+    function = 'array_append'
 
 
 class Location(models.Model):
@@ -29,27 +55,90 @@ class Location(models.Model):
 class GameQuerySet(models.QuerySet):
     """Support "future" games query filter"""
 
-    def get_cuttoff_time(self):
-        """
-        More often then not we don't care about games in the past. This
-        method returns datetime to use in a query with datetime__gt filter
-        """
-        return datetime.utcnow() - timedelta(minutes=90)
+    # Ways to annotate games with a player's RsvpStatus (see .with_rsvps)
+    RSVPS_JOIN = 'join'
+    RSVPS_SUBQUERY = 'subquery'
+
+    get_cuttoff_time = staticmethod(get_cutoff_time)
 
     def future(self):
         return self.filter(datetime__gt=self.get_cuttoff_time())
 
-    def with_rsvps(self, player):
-        """Annotate the query with RsvpStatus values for a player"""
+    def with_rsvps(self, player, strategy=RSVPS_SUBQUERY):
+        """Annotate the query with RsvpStatus values for a player
+
+        Adds `rsvp` and `rsvp_id` attributes to each game, both are None
+        when a player has no RsvpStatus for the game. Strategies:
+
+            RSVPS_SUBQUERY (default) - two correlated lookups per game
+                served by the (player, game) unique index
+            RSVPS_JOIN - joins every rsvp of every game and groups the
+                whole game row, gets slower as rosters grow
+        """
+        if strategy == self.RSVPS_JOIN:
+            return self.annotate(
+                rsvp=Max(Case(
+                    When(rsvps__player=player, then=F('rsvps__status'))
+                )),
+                rsvp_id=Max(Case(
+                    When(rsvps__player=player, then=F('rsvps__id')),
+                )),
+            )
+
+        if strategy != self.RSVPS_SUBQUERY:
+            raise ValueError(f'Unknown rsvps annotation strategy {strategy!r}')
+
+        # Default RsvpStatus ordering joins games, we don't need it here
+        rsvps = RsvpStatus.objects\
+            .filter(game=OuterRef('pk'), player=player)\
+            .order_by()
         return self.annotate(
-            rsvp=Max(Case(
-                When(rsvps__player=player, then=F('rsvps__status'))
-            )),
-            rsvp_id=Max(Case(
-                When(rsvps__player=player, then=F('rsvps__id')),
-            )),
+            rsvp=Subquery(
+                rsvps.values('status')[:1],
+                output_field=IntegerField(),
+            ),
+            rsvp_id=Subquery(
+                rsvps.values('id')[:1],
+                output_field=IntegerField(),
+            ),
         )
 
+    def with_last_modified(self):
+        """Annotate `last_modified`, the latest change of a game details
+
+        Game.modified covers the game itself and its rsvps, the organizer,
+        players and teams are changed separately
+        """
+        players = RsvpStatus.objects\
+            .filter(game=OuterRef('pk'))\
+            .order_by()\
+            .values('game')\
+            .annotate(last_modified=Max('player__modified'))\
+            .values('last_modified')
+        teams = Game.teams.through.objects\
+            .filter(game=OuterRef('pk'))\
+            .order_by()\
+            .values('game')\
+            .annotate(last_modified=Max('team__modified'))\
+            .values('last_modified')
+        return self.annotate(last_modified=Greatest(
+            'modified',
+            'organizer__modified',
+            Subquery(players, output_field=DateTimeField()),
+            Subquery(teams, output_field=DateTimeField()),
+        ))
+
+    def get_last_modified(self, pk):
+        """Last modification time of a game details or None"""
+        try:
+            queryset = self.filter(pk=pk)
+        except (TypeError, ValueError):
+            return None  # Not a valid id
+        return queryset\
+            .with_last_modified()\
+            .values_list('last_modified', flat=True)\
+            .first()
+
 
 class GameManager(models.Manager):
     def get_queryset(self):
@@ -58,8 +147,11 @@ class GameManager(models.Manager):
     def future(self):
         return self.get_queryset().future()
 
-    def with_rsvps(self, player):
-        return self.get_queryset().future().with_rsvps(player)
+    def with_rsvps(self, player, **kwargs):
+        return self.get_queryset().future().with_rsvps(player, **kwargs)
+
+    def get_last_modified(self, pk):
+        return self.get_queryset().get_last_modified(pk)
 
 
 class Game(models.Model):
@@ -71,8 +163,12 @@ class Game(models.Model):
         description? (String) - notes, reminders, etc...
         duration? (Int) - number in minutes
         location (FK) - Location, place where a game will take place
+        modified (DateTime) - last change of the game, its location or
+            rsvps
         name? (String) - Optional name for a game
         organizer? (FK) - User, creator of an event
+        search_vector (SearchVector) - game and location names, address and
+            description for the full text search
         teams? (MtM) - 0, 1 or 2 teams (pickup games have no teams)
     """
 
@@ -80,23 +176,107 @@ class Game(models.Model):
     description = models.CharField(blank=True, max_length=255, default='')
     duration = models.IntegerField(null=True)
     location = models.ForeignKey(Location, related_name='games')
+    modified = models.DateTimeField(auto_now=True)
     name = models.CharField(blank=True, max_length=255, default='')
     organizer = models.ForeignKey('users.User', related_name='games_created')
     teams = models.ManyToManyField(Team, related_name='games')
     players = models.ManyToManyField('users.User', related_name='games',
                                      through='RsvpStatus')
+    # Maintained by database triggers (see migration 0013)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return f'Game(datetime={self.datetime!r}, location={self.location})'
 
     class Meta:
         ordering = ['datetime']
+        indexes = [
+            # future() filter and keyset pagination of game lists
+            models.Index(
+                fields=['datetime', 'id'],
+                name='games_game_datetime_id_idx',
+            ),
+            GinIndex(fields=['search_vector'], name='games_game_search_idx'),
+        ]
 
     objects = GameManager()
 
-    @staticmethod
-    def get_cuttoff_time():
-        return datetime.utcnow() - timedelta(minutes=90)
+    get_cuttoff_time = staticmethod(get_cutoff_time)
+
+
+class RsvpStatusQuerySet(models.QuerySet):
+
+    @atomic
+    def bulk_insert(self, rsvps, batch_size=1000):
+        """Insert RsvpStatus objects in a few statements, unlike
+        bulk_create, skips (player, game) pairs that already exist
+
+        rsvps.bulk_insert([RsvpStatus(...), ...]) ->
+            [(id, game_id, player_id, status), ...] for inserted rows
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        inserted = []
+
+        with connection.cursor() as cursor:
+            for i in range(0, len(rsvps), batch_size):
+                batch = rsvps[i:i + batch_size]
+                values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+                params = [
+                    value
+                    for rsvp in batch
+                    for value in (
+                        rsvp.game_id, rsvp.player_id, rsvp.status, rsvp.team,
+                    )
+                ]
+                cursor.execute(
+                    f'INSERT INTO {table} (game_id, player_id, status, team) '
+                    f'VALUES {values} '
+                    'ON CONFLICT (player_id, game_id) DO NOTHING '
+                    'RETURNING id, game_id, player_id, status',
+                    params,
+                )
+                inserted += cursor.fetchall()
+
+        rsvps_inserted(inserted)
+        return inserted
+
+    @atomic
+    def invite_to_team_games(self, team_id, player_id):
+        """Invite a team player to every future game of the team in one
+        statement, skipping games the player already has rsvps for
+
+        Team number of the rsvps is the team position in the game (see
+        GamePermissionContext.team_ids)
+
+        rsvps.invite_to_team_games(team_id, player_id) ->
+            [(id, game_id, player_id, status), ...] for inserted rows
+        """
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        games = quote_name(Game._meta.db_table)
+        game_teams = quote_name(Game.teams.through._meta.db_table)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (game_id, player_id, status, team) '
+                f'SELECT game_team.game_id, %s, %s, ('
+                f'    SELECT count(*) FROM {game_teams} AS other '
+                f'    WHERE other.game_id = game_team.game_id '
+                f'    AND other.id < game_team.id'
+                f') '
+                f'FROM {game_teams} AS game_team '
+                f'JOIN {games} AS game ON game.id = game_team.game_id '
+                f'WHERE game_team.team_id = %s AND game.datetime > %s '
+                'ON CONFLICT (player_id, game_id) DO NOTHING '
+                'RETURNING id, game_id, player_id, status',
+                [player_id, RsvpStatus.INVITED, team_id, timezone.now()],
+            )
+            inserted = cursor.fetchall()
+
+        rsvps_inserted(inserted)
+        return inserted
 
 
 class RsvpStatus(models.Model):
@@ -136,8 +316,208 @@ class RsvpStatus(models.Model):
     status = models.IntegerField(choices=RSVP_CHOICES, default=INVITED)
     team = models.IntegerField(default=NO_TEAM)
 
+    objects = RsvpStatusQuerySet.as_manager()
+
     class Meta:
         unique_together = 'player', 'game'
         ordering = ['game__datetime', '-status']
+        indexes = [
+            # Player's games and invites, see also partial index on
+            # invites in migration 0011
+            models.Index(
+                fields=['player', 'status'],
+                name='games_rsvp_player_status_idx',
+            ),
+        ]
         verbose_name = 'RSVP status'
         verbose_name_plural = 'RSVP statuses'
+
+    # Status in the database, to keep User.game_invites counters (see
+    # users.models), None for new rsvps
+    _db_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        rsvp = super().from_db(db, field_names, values)
+        rsvp._db_status = rsvp.__dict__.get('status')
+        return rsvp
+
+    @atomic
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._db_status = self.status
+
+    @atomic
+    def delete(self, *args, **kwargs):
+        return super().delete(*args, **kwargs)
+
+
+class InviteJob(models.Model):
+    """Background invitation of team players to a series of games
+
+    Rsvps are inserted in chunks of games by celery tasks (see .tasks),
+    each chunk is recorded once as finished in the same transaction as
+    its rsvps, so retried chunks don't add or count anything twice
+
+    Fields:
+        chunks (Int) - number of chunks
+        created (DateTime) - job creation time
+        failed (Bool) - a chunk failed after all the retries
+        finished_chunks (Array) - numbers of the chunks that are done
+        game_ids (Array) - games to invite players to
+        invited (Int) - number of rsvps inserted so far
+        organizer (FK) - user that created the games
+        players (JSON) - player id -> team number
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    # Max number of rsvps inserted by a single task
+    CHUNK_SIZE = 1000
+
+    chunks = models.IntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+    failed = models.BooleanField(default=False)
+    finished_chunks = ArrayField(models.IntegerField(), default=list)
+    game_ids = ArrayField(models.IntegerField())
+    invited = models.IntegerField(default=0)
+    organizer = models.ForeignKey('users.User', related_name='invite_jobs')
+    players = JSONField(default=dict)
+
+    def __str__(self):
+        return f'InviteJob(id={self.id!r}, status={self.status!r})'
+
+    @classmethod
+    def create(cls, organizer, game_ids, players):
+        """Job for the games and players (player id -> team number)"""
+        games_per_chunk = max(1, cls.CHUNK_SIZE // max(1, len(players)))
+        return cls.objects.create(
+            chunks=-(-len(game_ids) // games_per_chunk),
+            game_ids=game_ids,
+            organizer=organizer,
+            players={str(player_id): team
+                     for player_id, team in players.items()},
+        )
+
+    @property
+    def total(self):
+        """Number of rsvps to insert, including the existing ones"""
+        return len(self.game_ids) * len(self.players)
+
+    @property
+    def status(self):
+        if self.failed:
+            return self.FAILED
+        if len(self.finished_chunks) >= self.chunks:
+            return self.DONE
+        if self.finished_chunks:
+            return self.RUNNING
+        return self.PENDING
+
+    @property
+    def progress(self):
+        """Finished part of the job, 0 to 1"""
+        if not self.chunks:
+            return 1.0
+        return len(self.finished_chunks) / self.chunks
+
+    def get_chunk_game_ids(self, chunk):
+        size = -(-len(self.game_ids) // self.chunks)
+        return self.game_ids[chunk * size:(chunk + 1) * size]
+
+    @atomic
+    def run_chunk(self, chunk):
+        """Invite players to the chunk games
+
+        Returns number of inserted rsvps, 0 when the chunk was done before
+        """
+        finished = InviteJob.objects\
+            .filter(pk=self.pk, finished_chunks__contains=[chunk])\
+            .exists()
+        if finished:
+            return 0
+
+        inserted = RsvpStatus.objects.bulk_insert([
+            RsvpStatus(
+                game_id=game_id,
+                player_id=int(player_id),
+                status=RsvpStatus.INVITED,
+                team=team,
+            )
+            for game_id in self.get_chunk_game_ids(chunk)
+            for player_id, team in self.players.items()
+        ])
+
+        InviteJob.objects\
+            .filter(pk=self.pk)\
+            .exclude(finished_chunks__contains=[chunk])\
+            .update(
+                finished_chunks=ArrayAppend('finished_chunks', Value(chunk)),
+                invited=F('invited') + len(inserted),
+            )
+        return len(inserted)
+
+
+def rsvps_inserted(rows):
+    """What rsvp signals do, for rows inserted in bulk"""
+    # FIXME: can't import at the top (circular imports)
+    from users.models import add_invites
+
+    bump_feed_versions(player_id for _, _, player_id, _ in rows)
+    touch_games({game_id for _, game_id, _, _ in rows})
+    add_invites('game_invites', Counter(
+        player_id
+        for _, _, player_id, rsvp_status in rows
+        if rsvp_status == RsvpStatus.INVITED
+    ))
+
+
+def touch_games(game_ids):
+    """Bump Game.modified, without Game signals"""
+    if game_ids:
+        Game.objects.filter(id__in=game_ids).update(modified=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=RsvpStatus)
+def rsvp_changed(sender, instance, **kwargs):
+    bump_feed_versions([instance.player_id])
+    touch_games([instance.game_id])
+
+
+@receiver([post_save, post_delete], sender=Game)
+def game_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return  # No rsvps yet
+    bump_feed_versions(RsvpStatus.objects
+                       .filter(game_id=instance.id)
+                       .order_by()
+                       .values_list('player_id', flat=True))
+
+
+@receiver(post_save, sender=Location)
+def location_changed(sender, instance, created, **kwargs):
+    if created:
+        return
+    Game.objects\
+        .filter(location_id=instance.id)\
+        .update(modified=timezone.now())
+    bump_feed_versions(RsvpStatus.objects
+                       .filter(game__location_id=instance.id)
+                       .filter(game__datetime__gt=get_cutoff_time())
+                       .order_by()
+                       .values_list('player_id', flat=True))
+
+
+@receiver([post_save, pre_delete], sender=Team)
+def team_changed(sender, instance, created=False, **kwargs):
+    # Feeds include teams of the games, games of a deleted team are only
+    # known before the delete
+    if created:
+        return  # No games yet
+    bump_feed_versions(RsvpStatus.objects
+                       .filter(game__teams=instance.id)
+                       .filter(game__datetime__gt=get_cutoff_time())
+                       .order_by()
+                       .values_list('player_id', flat=True))
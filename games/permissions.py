@@ -1,5 +1,8 @@
+from django.http import Http404
 from rest_framework import permissions
 
+from .models import Game, RsvpStatus
+
 
 class GameUpdateDestroyPermission(permissions.BasePermission):
     """Only an organizer of a game can edit and delete games"""
@@ -13,3 +16,166 @@ class GameUpdateDestroyPermission(permissions.BasePermission):
             return True
 
         return request.user == obj.organizer
+
+
+class GamePermissionContext:
+    """
+    Game details needed to check rsvp permissions, loaded with two queries
+
+    Fields:
+        game_id (Int) - the game
+        organizer_id (Int) - user that created the game
+        team_ids (List) - game teams ids, index is a team number
+            (see RsvpStatus.team)
+        managers (Dict) - team id -> set of team managers ids
+    """
+
+    def __init__(self, game_id, organizer_id, team_ids, managers):
+        self.game_id = game_id
+        self.organizer_id = organizer_id
+        self.team_ids = team_ids
+        self.managers = managers
+
+    @classmethod
+    def load(cls, game_id):
+        organizer_id = Game.objects\
+            .filter(id=game_id)\
+            .values_list('organizer_id', flat=True)\
+            .first()
+        if organizer_id is None:
+            raise Http404('No game matches the given query.')
+
+        # Through rows are created in team number order (rows of older
+        # games are ordered by migration 0016)
+        teams = Game.teams.through.objects\
+            .filter(game_id=game_id)\
+            .order_by('id')\
+            .values_list('team_id', 'team__managers')
+
+        team_ids = []
+        managers = {}
+        for team_id, manager_id in teams:
+            if team_id not in managers:
+                team_ids.append(team_id)
+                managers[team_id] = set()
+            if manager_id is not None:
+                managers[team_id].add(manager_id)
+
+        return cls(int(game_id), organizer_id, team_ids, managers)
+
+    @property
+    def is_pickup_game(self):
+        return not self.team_ids
+
+    def get_team_id(self, team_number):
+        try:
+            return self.team_ids[team_number]
+        except (IndexError, TypeError):
+            return None
+
+    def is_team_manager(self, user, team_number):
+        team_id = self.get_team_id(team_number)
+        return user.id in self.managers.get(team_id, ())
+
+
+class RsvpCreateUpdateDestroyPermission(permissions.BasePermission):
+    """
+    Ensure that the change is withing the following options:
+        - User joins pickup games and asks to join league games
+        - Player changes status or leaves
+        - Game organizer removes player from open games
+        - Team manager can invite and remove players to/from league games
+
+    Game details are taken from the view's `get_game_context()`
+    """
+    message = __doc__
+
+    def has_permission(self, request, view):
+
+        if request.method in permissions.SAFE_METHODS:
+            return True
+
+        data = request.data
+
+        if not data:
+            return True
+
+        try:
+            new_status = int(data.get('rsvp', None))
+            new_player_id = int(data.get('id', None))
+        except (TypeError, ValueError):
+            # It will raise a validation error during serializing
+            # and produce a sensible error message so here we can give
+            # id it green light without worries
+            return True
+
+        new_team = data.get('team', None)
+        # Only pickup games for now, No teams allowed yet
+        if new_team and new_team != RsvpStatus.NO_TEAM:
+            # TODO: Check permission to be on that team
+            pass
+
+        is_invite = new_status == RsvpStatus.INVITED
+        is_request = new_status == RsvpStatus.REQUESTED_TO_JOIN
+        is_rsvp = new_status is not None and new_status >= 0
+
+        game = view.get_game_context()
+        is_pickup_game = game.is_pickup_game
+        is_team_game = not is_pickup_game
+        user = request.user
+        user_is_organizer = user.id == game.organizer_id
+        user_is_team_manager = False  # TODO:
+        user_is_player = user.id == new_player_id
+
+        return (
+            (user_is_player and is_pickup_game and is_rsvp) or
+            (user_is_player and is_team_game and is_request) or
+            (user_is_organizer and is_pickup_game and is_invite) or
+            (user_is_team_manager and is_team_game and is_invite)
+        )
+
+    def has_object_permission(self, request, view, obj):
+
+        if request.method in permissions.SAFE_METHODS:
+            return True
+
+        if request.user.is_superuser:
+            return True
+
+        game = view.get_game_context()
+        is_pickup_game = game.is_pickup_game
+        is_team_game = not is_pickup_game
+
+        user = request.user
+
+        user_is_organizer = user.id == game.organizer_id
+        user_is_team_manager = game.is_team_manager(user, obj.team)
+        user_is_player = user.id == obj.player_id
+
+        if request.method == 'DELETE':
+            return (
+                user_is_player or
+                (user_is_organizer and is_pickup_game) or
+                (user_is_team_manager and is_team_game)
+            )
+
+        data = request.data
+
+        if not data:
+            return True
+        try:
+            new_status = int(data.get('rsvp', None))
+        except ValueError:
+            return True  # Will be stopped by serializer validator
+
+        old_status = obj.status
+        is_rsvp = new_status is not None and new_status >= 0
+
+        is_request_accept = ((
+            (user_is_organizer and is_pickup_game) or
+            (user_is_team_manager and is_team_game)
+        ) and (
+            old_status == RsvpStatus.REQUESTED_TO_JOIN and
+            new_status == RsvpStatus.GOING
+        ))
+        return (user_is_player and is_rsvp) or is_request_accept
@@ -1,5 +1,6 @@
 from .games import *
+from .jobs import *
 from .locations import *
 from .rsvps import *
 
-__all__ = [games.__all__ + locations.__all__ + rsvps.__all__]
+__all__ = [games.__all__ + jobs.__all__ + locations.__all__ + rsvps.__all__]
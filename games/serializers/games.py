@@ -1,8 +1,9 @@
 import coreschema
-from django.db.transaction import atomic
+from django.db.transaction import atomic, on_commit
 from rest_framework.exceptions import ValidationError
 from rest_framework.reverse import reverse
 from rest_framework.serializers import (
+    BooleanField,
     CharField,
     DateTimeField,
     ListField,
@@ -10,16 +11,22 @@ from rest_framework.serializers import (
     PrimaryKeyRelatedField,
 )
 
+from main.fast import FastSerializer
+from teams.models import Role
+from teams.serializers import TeamListFastSerializer
 from teams.views import Team, TeamListSerializer
 from users.serializers.players import PlayerListSerializer
 
-from ..models import Game, Location, RsvpStatus
+from ..models import Game, InviteJob, Location, RsvpStatus
+from ..tasks import run_invite_job
+from .jobs import InviteJobSerializer
 from .locations import LocationSerializer
 from .rsvps import *
 
 __all__ = [
     'GameCreateSerializer',
     'GameDetailsSerializer',
+    'GameListFastSerializer',
     'GameListSerializer',
 ]
 
@@ -43,6 +50,10 @@ class GameListSerializer(ModelSerializer):
             data['rsvp'] = game.rsvp
             data['rsvp_id'] = game.rsvp_id
 
+        # Distance in metres from a point, see `NearFilter`
+        if getattr(game, 'distance', None) is not None:
+            data['distance'] = game.distance
+
         request = self.context.get('request', None)
         if request and request.accepted_renderer.format == 'api':
             data['url'] = reverse('game-detail', (game.id, ),
@@ -50,6 +61,31 @@ class GameListSerializer(ModelSerializer):
         return data
 
 
+class GameListFastSerializer(FastSerializer):
+    """GameListSerializer for `values()` rows (see main.fast)"""
+    serializer_class = GameListSerializer
+    annotations = 'rsvp', 'rsvp_id', 'distance'
+    nested_serializer_classes = {
+        'teams': TeamListFastSerializer,
+    }
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+
+        if row.get('rsvp') is not None:
+            data['rsvp'] = row['rsvp']
+            data['rsvp_id'] = row['rsvp_id']
+
+        if row.get('distance') is not None:
+            data['distance'] = row['distance']
+
+        request = self.context.get('request', None)
+        if request and request.accepted_renderer.format == 'api':
+            data['url'] = reverse('game-detail', (row['pk'], ),
+                                  request=request)
+        return data
+
+
 class GameCreateSerializer(ModelSerializer):
     """
     Special format for game creation. Primarily due to providing a way to
@@ -71,10 +107,17 @@ class GameCreateSerializer(ModelSerializer):
         write_only=True,
     )
     name = CharField(help_text='game name', required=False)
+    background = BooleanField(
+        default=False,
+        help_text='invite team players in the background, see invite_job '
+                  'in the response for the progress',
+        write_only=True,
+    )
 
     class Meta:
         model = Game
-        fields = 'id', 'teams', 'name', 'datetime', 'datetimes', 'location',
+        fields = ('id', 'teams', 'name', 'datetime', 'datetimes', 'location',
+                  'background')
 
     def is_valid(self, *args, **kwargs):
         # Work around an issue with the browsable api where empty input
@@ -99,6 +142,11 @@ class GameCreateSerializer(ModelSerializer):
     def to_representation(self, obj):
         data = super().to_representation(obj)
 
+        invite_job = getattr(obj, 'invite_job', None)
+        if invite_job is not None:
+            data['invite_job'] = InviteJobSerializer(
+                invite_job, context=self.context).data
+
         request = self.context.get('request', None)
         if request and request.accepted_renderer.format == 'api':
             data['url'] = reverse('game-detail', (obj.id, ),
@@ -131,39 +179,76 @@ class GameCreateSerializer(ModelSerializer):
             address=location_data['address'],
         )
 
-        games = []
         game_name = validated_data.get('name', '')
-        for i, dt in enumerate(datetimes):
-            name_suffix = f' ({i + 1})' if i > 0 and game_name else ''
-            game = Game.objects.create(
+        games = Game.objects.bulk_create([
+            Game(
                 datetime=dt,
                 location=location_obj,
                 organizer=request.user,
-                name=game_name + name_suffix,
+                name=game_name + (f' ({i + 1})' if i > 0 and game_name
+                                  else ''),
+            )
+            for i, dt in enumerate(datetimes)
+        ])
+
+        # Teams are numbered in the order they were given, through rows
+        # are inserted in that order as well
+        Game.teams.through.objects.bulk_create([
+            Game.teams.through(game_id=game.id, team_id=team.id)
+            for game in games
+            for team in teams
+        ])
+
+        if teams:
+            team_numbers = {team.id: i for i, team in enumerate(teams)}
+            roles = Role.objects\
+                .filter(team__in=teams, role__gt=0)\
+                .order_by()\
+                .values_list('team_id', 'player_id')
+
+            # Player of both teams ends up in the second one
+            players = {}
+            for team_id, player_id in sorted(
+                roles, key=lambda role: team_numbers[role[0]]
+            ):
+                players[player_id] = team_numbers[team_id]
+        else:
+            players = {request.user.id: RsvpStatus.NO_TEAM}
+
+        invite_job = None
+        if validated_data.get('background') and teams:
+            # Only the organizer's rsvps are inserted right away
+            invite_job = InviteJob.create(
+                organizer=request.user,
+                game_ids=[game.id for game in games],
+                players={
+                    player_id: team
+                    for player_id, team in players.items()
+                    if player_id != request.user.id
+                },
+            )
+            on_commit(lambda: run_invite_job.delay(invite_job.id))
+            players = {
+                player_id: team
+                for player_id, team in players.items()
+                if player_id == request.user.id
+            }
+
+        RsvpStatus.objects.bulk_insert([
+            RsvpStatus(
+                game_id=game.id,
+                player_id=player_id,
+                status=(
+                    RsvpStatus.GOING if player_id == request.user.id
+                    else RsvpStatus.INVITED
+                ),
+                team=team,
             )
-            game.teams.add(*teams)
-
-            for i, team in enumerate(teams):
-                for player in team.players.filter(role__gt=0):
-                    rsvp, _ = RsvpStatus.objects.get_or_create(
-                        game=game,
-                        player=player,
-                    )
-                    rsvp.team = i
-                    if player.id == request.user.id:
-                        rsvp.status = RsvpStatus.GOING
-                    else:
-                        rsvp.status = RsvpStatus.INVITED
-                    rsvp.save()
-
-            if not teams:
-                RsvpStatus.objects.create(
-                    game=game,
-                    player=request.user,
-                    status=RsvpStatus.GOING,
-                )
-            games.append(game)
+            for game in games
+            for player_id, team in players.items()
+        ])
 
+        games[0].invite_job = invite_job
         return games[0]
 
 
@@ -178,5 +263,5 @@ class GameDetailsSerializer(ModelSerializer):
 
     class Meta:
         model = Game
-        fields = '__all__'
+        exclude = 'modified', 'search_vector'
         read_only_fields = 'players', 'organizer', 'teams'
@@ -0,0 +1,33 @@
+from rest_framework.reverse import reverse
+from rest_framework.serializers import (
+    FloatField,
+    IntegerField,
+    ModelSerializer,
+    ReadOnlyField,
+)
+
+from ..models import InviteJob
+
+
+__all__ = ['InviteJobSerializer']
+
+
+class InviteJobSerializer(ModelSerializer):
+    """Progress of a background game invitations job (read only)"""
+    status = ReadOnlyField()
+    progress = FloatField(read_only=True)
+    total = IntegerField(read_only=True)
+
+    class Meta:
+        model = InviteJob
+        fields = 'id', 'status', 'progress', 'invited', 'total', 'created'
+        read_only_fields = fields
+
+    def to_representation(self, job):
+        data = super().to_representation(job)
+
+        request = self.context.get('request', None)
+        if request and request.accepted_renderer.format == 'api':
+            data['url'] = reverse('invite-job-detail', (job.id, ),
+                                  request=request)
+        return data
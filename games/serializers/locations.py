@@ -10,3 +10,11 @@ class LocationSerializer(ModelSerializer):
     class Meta:
         model = Location
         fields = '__all__'
+
+    def to_representation(self, location):
+        data = super().to_representation(location)
+
+        # Distance in metres from a point, see `NearFilter`
+        if getattr(location, 'distance', None) is not None:
+            data['distance'] = location.distance
+        return data
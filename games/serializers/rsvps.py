@@ -10,11 +10,14 @@ from rest_framework.serializers import (
 )
 
 from main.exceptions import RelationAlreadyExist
+from main.fast import FastSerializer
+from main.images import ImageVariantsField
 from ..models import RsvpStatus
 
 
 __all__ = [
     'RsvpCreateSerializer',
+    'RsvpFastSerializer',
     'RsvpSerializer',
 ]
 
@@ -26,10 +29,12 @@ class RsvpSerializer(ModelSerializer):
     first_name = ReadOnlyField(source='player.first_name')
     last_name = ReadOnlyField(source='player.last_name')
     img = ImageField(source='player.img', read_only=True)
+    img_variants = ImageVariantsField(source='player.img_variants')
 
     class Meta:
         model = RsvpStatus
-        fields = 'id', 'rsvp_id', 'rsvp', 'first_name', 'last_name', 'img'
+        fields = ('id', 'rsvp_id', 'rsvp', 'first_name', 'last_name', 'img',
+                  'img_variants')
 
     def to_representation(self, obj):
         data = super().to_representation(obj)
@@ -43,6 +48,25 @@ class RsvpSerializer(ModelSerializer):
         return data
 
 
+class RsvpFastSerializer(FastSerializer):
+    """RsvpSerializer for `values()` rows (see main.fast)"""
+    serializer_class = RsvpSerializer
+
+    def get_lookups(self):
+        return super().get_lookups() + [self.prefix + 'game_id']
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+        request = self.context.get('request', None)
+        if request and request.accepted_renderer.format == 'api':
+            data['url'] = reverse(
+                'rsvp-detail',
+                (row[self.prefix + 'game_id'], row['pk']),
+                request=request
+            )
+        return data
+
+
 class RsvpCreateSerializer(RsvpSerializer):
     id = IntegerField(source='player_id')
 
@@ -50,7 +74,8 @@ class RsvpCreateSerializer(RsvpSerializer):
         fields = 'id', 'rsvp_id', 'rsvp', 'team'
 
     def create(self, validated_data):
-        validated_data['game_id'] = self.context['view'].kwargs['game_pk']
+        game = self.context['view'].get_game_context()
+        validated_data['game_id'] = game.game_id
         try:
             return super().create(validated_data)
         except IntegrityError as e:
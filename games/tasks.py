@@ -0,0 +1,26 @@
+"""Games background tasks"""
+from celery import shared_task
+from django.db import DatabaseError
+
+from .models import InviteJob
+
+
+@shared_task
+def run_invite_job(job_id):
+    """Start a task for every chunk of the job (see InviteJob)"""
+    job = InviteJob.objects.get(id=job_id)
+    for chunk in range(job.chunks):
+        invite_chunk.delay(job_id, chunk)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def invite_chunk(self, job_id, chunk):
+    """Invite players to a chunk of the job games, safe to retry"""
+    job = InviteJob.objects.get(id=job_id)
+    try:
+        return job.run_chunk(chunk)
+    except DatabaseError as exc:
+        if self.request.retries >= self.max_retries:
+            InviteJob.objects.filter(id=job_id).update(failed=True)
+            raise
+        raise self.retry(exc=exc)
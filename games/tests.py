@@ -1,15 +1,26 @@
+import json
 from datetime import datetime, timedelta
+from io import StringIO
 from itertools import chain, product
 
+import msgpack
 import pytest
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
 from django.db.utils import IntegrityError
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 
-from main.tests import mixer, client
+from main.tests import mixer, client, search_vectors
 from teams.models import Role
-from .models import Game, Location, RsvpStatus
+from users.models import recount_invites
+from .models import Game, InviteJob, Location, RsvpStatus
+from .tasks import run_invite_job
 
 pytestmark = pytest.mark.django_db
 
@@ -36,6 +47,28 @@ def test_rsvps_annotation():
     assert res.data['results'][0]['rsvp'] == RsvpStatus.GOING
 
 
+def test_rsvps_annotation_strategies():
+    user = mixer.blend('users.User')
+    games = mixer.cycle(3).blend('games.Game')
+    rsvp = RsvpStatus.objects.create(
+        player=user, game=games[0], status=RsvpStatus.INVITED)
+    mixer.cycle(3).blend('games.RsvpStatus', game=games[1])
+
+    def annotations(strategy):
+        return sorted(
+            (game.id, game.rsvp, game.rsvp_id)
+            for game in Game.objects.with_rsvps(user, strategy=strategy)
+        )
+
+    subquery = annotations(Game.objects.get_queryset().RSVPS_SUBQUERY)
+    join = annotations(Game.objects.get_queryset().RSVPS_JOIN)
+
+    assert subquery == join, 'Both strategies should annotate the same'
+    assert (games[0].id, RsvpStatus.INVITED, rsvp.id) in subquery
+    assert (games[1].id, None, None) in subquery, \
+        'Games without player rsvp should have None annotations'
+
+
 def test_game_queryset_and_manager():
     old = mixer.blend('games.Game', datetime=datetime.utcnow() - timedelta(1))
     new = mixer.blend('games.Game', datetime=datetime.utcnow() + timedelta(1))
@@ -102,6 +135,88 @@ def test_game_create():
         'Player joining a team should be invited to the future team games'
 
 
+def test_team_game_series_create():
+    manager = mixer.blend('users.User')
+    teams = mixer.cycle(2).blend('teams.Team', managers=[manager])
+    players = mixer.cycle(6).blend('users.User')
+    for i, player in enumerate(players):
+        Role.objects.create(player=player, team=teams[i % 2], role=Role.FIELD)
+    Role.objects.create(player=players[0], team=teams[1], role=Role.INVITED)
+
+    client = APIClient()
+    client.force_authenticate(user=manager)
+
+    with CaptureQueriesContext(connection) as queries:
+        res = client.post(reverse('game-list'), {
+            'datetimes': [
+                datetime.utcnow() + timedelta(i) for i in range(1, 21)
+            ],
+            'location': {'address': 'Address', 'name': 'Location'},
+            'teams': [team.id for team in teams],
+        })
+
+    assert res.status_code == status.HTTP_201_CREATED
+    assert len(queries) < 20, \
+        'Query count should not depend on number of games and players'
+
+    rsvps = RsvpStatus.objects.filter(game__location__name='Location')
+    assert rsvps.count() == 20 * 7, 'Every active player should be invited'
+
+    for player, rsvp_status, team in rsvps.values_list(
+        'player_id', 'status', 'team'
+    ):
+        if player == manager.id:
+            assert rsvp_status == RsvpStatus.GOING, 'Creator is going'
+            assert team == 1, 'Player of both teams ends up in the second'
+        else:
+            assert rsvp_status == RsvpStatus.INVITED
+            assert team == [p.id for p in players].index(player) % 2
+
+
+def test_team_game_series_background_invites(client, monkeypatch):
+    teams = mixer.cycle(2).blend('teams.Team', managers=[client.user])
+    players = mixer.cycle(4).blend('users.User')
+    for i, player in enumerate(players):
+        Role.objects.create(player=player, team=teams[i % 2], role=Role.FIELD)
+    monkeypatch.setattr(InviteJob, 'CHUNK_SIZE', 8)
+
+    res = client.post(reverse('game-list'), {
+        'background': True,
+        'datetimes': [datetime.utcnow() + timedelta(i) for i in range(1, 6)],
+        'location': {'address': 'Address', 'name': 'Location'},
+        'teams': [team.id for team in teams],
+    })
+
+    assert res.status_code == status.HTTP_201_CREATED
+    assert res.data['invite_job']['status'] == InviteJob.PENDING
+    assert res.data['invite_job']['total'] == 5 * 4
+
+    rsvps = RsvpStatus.objects.filter(game__location__name='Location')
+    assert list(rsvps.values_list('player_id', flat=True).distinct()) == \
+        [client.user.id], 'Only the organizer rsvps are created right away'
+
+    job_id = res.data['invite_job']['id']
+    url = reverse('invite-job-detail', (job_id, ))
+    run_invite_job(job_id)  # on_commit callbacks don't run in tests
+
+    res = client.get(url)
+    assert res.status_code == status.HTTP_200_OK
+    assert res.data['status'] == InviteJob.DONE
+    assert res.data['progress'] == 1
+    assert res.data['invited'] == 5 * 4
+    assert rsvps.count() == 5 * 5
+
+    job = InviteJob.objects.get(id=job_id)
+    assert job.chunks == 3
+    assert job.run_chunk(0) == 0, 'Finished chunks should not run again'
+    assert rsvps.count() == 5 * 5
+
+    client.force_authenticate(user=players[0])
+    res = client.get(url)
+    assert res.status_code == status.HTTP_404_NOT_FOUND, \
+        'Only the organizer can see the job'
+
+
 def test_my_games():
     user = mixer.blend('users.User')
     mixer.cycle(5).blend(
@@ -125,6 +240,47 @@ def test_my_games():
     assert res.data['count'] == 5, 'User should have 5 games'
 
 
+def test_my_games_cache(client, django_assert_num_queries):
+    cache.clear()
+    url = reverse('game-my')
+    mixer.blend('games.RsvpStatus', status=RsvpStatus.GOING,
+                player=client.user)
+
+    res = client.get(url)
+    assert res.data['count'] == 1
+
+    with django_assert_num_queries(0):
+        cached = client.get(url)
+    assert cached.data == res.data, 'Should be served from cache'
+
+    rsvp = mixer.blend('games.RsvpStatus', status=RsvpStatus.GOING,
+                       player=client.user)
+    res = client.get(url)
+    assert res.data['count'] == 2, 'New rsvp should invalidate the cache'
+
+    rsvp.game.name = 'Renamed'
+    rsvp.game.save()
+    res = client.get(url)
+    assert 'Renamed' in [game['name'] for game in res.data['results']], \
+        'Game changes should invalidate the cache'
+
+    rsvp.delete()
+    res = client.get(url)
+    assert res.data['count'] == 1, 'Deleted rsvp should invalidate the cache'
+
+    team = mixer.blend('teams.Team')
+    game = RsvpStatus.objects.get(player=client.user).game
+    game.teams.add(team)
+    game.save()
+    client.get(url)
+    team.name = 'Renamed team'
+    team.save()
+    res = client.get(url)
+    assert ['Renamed team'] == [
+        team['name'] for game in res.data['results'] for team in game['teams']
+    ], 'Team changes should invalidate the cache'
+
+
 def test_game_invites(client):
     mixer.cycle(5).blend(
         'games.RsvpStatus',
@@ -149,6 +305,147 @@ def test_pickup_games(client):
     assert res.data['count'] == 5, 'Should be 5 games'
 
 
+def test_game_list_keyset_pagination(client):
+    now = datetime.utcnow()
+    games = [
+        mixer.blend('games.Game', datetime=now + timedelta(days=i % 3))
+        for i in range(7)
+    ]
+    expected = [
+        game.id for game in sorted(games, key=lambda g: (g.datetime, g.id))
+    ]
+
+    res = client.get(reverse('game-list'), {'limit': 3})
+    assert res.data['count'] == 7, 'Count should be included by default'
+    assert res.data['previous'] is None, 'First page has no previous page'
+
+    ids = [game['id'] for game in res.data['results']]
+    pages = [res.data]
+    # Game added to already seen part of the list
+    mixer.blend('games.Game', datetime=now - timedelta(hours=1))
+
+    while res.data['next']:
+        res = client.get(res.data['next'])
+        ids += [game['id'] for game in res.data['results']]
+        pages.append(res.data)
+
+    assert ids == expected, \
+        'Should go through games in order without skips or duplicates'
+
+    res = client.get(pages[-1]['previous'])
+    assert res.data['results'] == pages[-2]['results'], \
+        'Previous link should lead to the previous page'
+
+    res = client.get(reverse('game-list'), {'limit': 3, 'count': 'false'})
+    assert 'count' not in res.data, 'Should be able to skip count'
+
+    res = client.get(reverse('game-list'), {'cursor': 'foo'})
+    assert res.status_code == status.HTTP_404_NOT_FOUND, \
+        'Invalid cursor should result in 404'
+
+
+def test_game_list_markers(client):
+    cache.clear()
+    near = mixer.blend('games.Location', gis=Point(-121.5, 38.5))
+    nearby = mixer.blend('games.Location', gis=Point(-121.49, 38.51))
+    far = mixer.blend('games.Location', gis=Point(10, 50))
+    mixer.cycle(2).blend('games.Game', location=near)
+    mixer.blend('games.Game', location=nearby)
+    mixer.blend('games.Game', location=far)
+
+    url = reverse('game-list')
+    res = client.get(url)
+    assert 'map' not in res.data, 'Markers should only be included on demand'
+
+    res = client.get(url, {'zoom': 16, 'in_bbox': '-122,38,-121,39'})
+    markers = {marker['id']: marker for marker in res.data['map']['markers']}
+    assert set(markers) == {near.id, nearby.id}, \
+        'Should be a marker for each location within the bbox'
+    assert markers[near.id]['games'] == 2, 'Should count games per location'
+
+    res = client.get(url, {'zoom': 2})
+    markers = res.data['map']['markers']
+    assert sorted(marker['games'] for marker in markers) == [1, 3], \
+        'Nearby locations should be clustered on the lower zoom levels'
+
+    res = client.get(url, {'zoom': 'foo'})
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_games_near(client):
+    here = mixer.blend('games.Location', gis=Point(-121.5, 38.5))
+    # About 1.1 km and 111 km to the north
+    close = mixer.blend('games.Location', gis=Point(-121.5, 38.51))
+    far = mixer.blend('games.Location', gis=Point(-121.5, 39.5))
+    games = {
+        location.id: mixer.blend('games.Game', location=location)
+        for location in (far, here, close)
+    }
+
+    url = reverse('game-list')
+    res = client.get(url, {'near': '-121.5,38.5'})
+    assert [game['id'] for game in res.data['results']] == [
+        games[here.id].id, games[close.id].id, games[far.id].id,
+    ], 'Games should be ordered by distance'
+    distances = [game['distance'] for game in res.data['results']]
+    assert distances[0] == 0, 'Distance should be included'
+    assert 1100 < distances[1] < 1125, 'Distance should be in metres'
+
+    res = client.get(url, {'near': '-121.5,38.5', 'radius': 2000})
+    assert res.data['count'] == 2, 'Radius should be in metres'
+
+    res = client.get(reverse('location-list'), {
+        'near': '-121.5,39.5', 'radius': 10,
+    })
+    assert [location['id'] for location in res.data['results']] == [far.id]
+
+    res = client.get(url, {'near': 'foo'})
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_fast_serializers_parity(client, settings):
+    teams = mixer.cycle(2).blend('teams.Team')
+    user = mixer.blend('users.User', img='players/1.jpg')
+    games = [
+        mixer.blend('games.Game', teams=teams),
+        mixer.blend('games.Game', location__gis=None),
+        mixer.blend('games.Game', location__gis=Point(-121.5, 38.5)),
+    ]
+    for game, rsvp_status in zip(games, (RsvpStatus.GOING,
+                                         RsvpStatus.INVITED,
+                                         RsvpStatus.NOT_GOING)):
+        mixer.blend('games.RsvpStatus', game=game, player=client.user,
+                    status=rsvp_status)
+        mixer.blend('games.RsvpStatus', game=game, player=user)
+
+    requests = [
+        (reverse('game-list'), {}),
+        (reverse('game-list'), {'near': '-121.5,38.5'}),
+        (reverse('game-my'), {}),
+        (reverse('game-invites'), {}),
+        (reverse('team-games-list', (teams[0].id, )), {}),
+        (reverse('rsvp-list', (games[0].id, )), {}),
+        (reverse('team-list'), {}),
+    ]
+
+    for url, params in requests:
+        responses = []
+        for enabled in (False, True):
+            settings.FAST_SERIALIZERS = enabled
+            cache.clear()
+            responses.append((
+                client.get(url, params),
+                client.get(url, dict(params, format='api')),
+            ))
+
+        (slow, slow_api), (fast, fast_api) = responses
+        assert slow.status_code == status.HTTP_200_OK
+        assert fast.content == slow.content, \
+            f'{url} {params} should be the same with fast serializers'
+        assert fast_api.data == slow_api.data, \
+            f'{url} {params} should be the same in browsable api'
+
+
 def test_game_in_the_past(client):
     game = mixer.blend('games.Game', datetime=datetime.utcnow() - timedelta(1))
 
@@ -210,6 +507,58 @@ def test_rsvp_list(client):
     assert res.data['count'] == 5, 'Should have 5 rsvps'
 
 
+def test_game_conditional_get(client, django_assert_num_queries):
+    game = mixer.blend('games.Game')
+    rsvp = mixer.blend('games.RsvpStatus', game=game)
+
+    for url in (reverse('game-detail', (game.id, )),
+                reverse('rsvp-list', (game.id, ))):
+        res = client.get(url)
+        etag = res['ETag']
+
+        with django_assert_num_queries(1):
+            res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED, \
+            'Should not load and serialize unchanged data'
+
+        res = client.get(url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+
+    changes = [
+        lambda: mixer.blend('games.RsvpStatus', game=game),
+        lambda: RsvpStatus.objects.filter(id=rsvp.id).first().save(),
+        lambda: rsvp.player.save(),
+        lambda: game.organizer.save(),
+        lambda: game.location.save(),
+    ]
+    url = reverse('game-detail', (game.id, ))
+    for change in changes:
+        etag = client.get(url)['ETag']
+        change()
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == status.HTTP_200_OK, \
+            'Should be modified by game, rsvps, players, organizer and ' \
+            'location changes'
+
+
+def test_game_details_eager_loading(client):
+    game = mixer.blend('games.Game')
+    url = reverse('game-detail', (game.id, ))
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as context:
+            res = client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        return len(context.captured_queries)
+
+    mixer.cycle(2).blend('games.RsvpStatus', game=game)
+    queries = count_queries()
+
+    mixer.cycle(20).blend('games.RsvpStatus', game=game)
+    assert count_queries() == queries, \
+        'Should not depend on number of players'
+
+
 def test_pickup_organizer_can_invite():
     organizer = mixer.blend('users.User')
     players = mixer.cycle(6).blend('users.User')
@@ -262,6 +611,25 @@ def test_can_join_pickup(client):
                 'Inviting yourself to a game you can join does not make sense'
 
 
+def test_msgpack(client):
+    game = mixer.blend('games.Game')
+    url = reverse('game-list')
+
+    res = client.get(url, HTTP_ACCEPT='application/msgpack')
+    assert res['Content-Type'] == 'application/msgpack'
+    assert msgpack.unpackb(res.content, encoding='utf-8') == \
+        json.loads(client.get(url).content.decode()), \
+        'Should have the same data as json'
+
+    res = client.post(
+        reverse('rsvp-list', (game.id, )),
+        {'id': client.user.id, 'rsvp': RsvpStatus.GOING},
+        format='msgpack',
+    )
+    assert res.status_code == status.HTTP_201_CREATED, \
+        'Should accept msgpack requests'
+
+
 def test_rsvp_create_validation(client):
     invalid_payloads = [
         {'id': client.user.id, 'rsvp': 'foo'},
@@ -355,6 +723,35 @@ def test_rsvp_update_by_user(client):
             'Should not be able to access any other players rsvp'
 
 
+def test_rsvp_permission_queries(client):
+    team = mixer.blend('teams.Team')
+    game = mixer.blend('games.Game', teams=[team])
+    rsvp = mixer.blend('games.RsvpStatus', game=game, player=client.user,
+                       status=RsvpStatus.INVITED, team=0)
+    url = reverse('rsvp-detail', (game.id, rsvp.id))
+
+    with CaptureQueriesContext(connection) as queries:
+        res = client.patch(url, {'rsvp': RsvpStatus.GOING})
+    assert res.status_code == status.HTTP_200_OK
+
+    game_queries = [
+        query for query in queries
+        if query['sql'].startswith('SELECT') and (
+            'FROM "games_game"' in query['sql'] or
+            'FROM "games_game_teams"' in query['sql']
+        )
+    ]
+    assert len(game_queries) == 2, \
+        'Game details should be loaded once for both permission checks'
+
+    res = client.post(reverse('rsvp-list', (0, )), {
+        'id': client.user.id,
+        'rsvp': RsvpStatus.GOING,
+    })
+    assert res.status_code == status.HTTP_404_NOT_FOUND, \
+        'Should not be able to rsvp to games that do not exist'
+
+
 def test_rsvp_update_validation(client):
     invalid_payloads = [{'rsvp': 'foo'}, {}]
 
@@ -399,5 +796,90 @@ def test_game_name(client):
         game_name + ' (4)',
     ], 'Games created at once with a name should get a (n) suffix'
 
+
+def test_game_search(client, search_vectors):
+    riverside = mixer.blend('games.Location', name='Riverside field',
+                            address='River road')
+    central = mixer.blend('games.Location', name='Central park',
+                          address='Main street')
+    by_name = mixer.blend('games.Game', name='Sunday football',
+                          location=riverside, description='')
+    by_description = mixer.blend('games.Game', name='Evening kickabout',
+                                 location=central,
+                                 description='Friendly game on sunday')
+    mixer.blend('games.Game', name='Tuesday futsal', location=central,
+                description='')
+    url = reverse('game-list')
+
+    with CaptureQueriesContext(connection) as queries:
+        res = client.get(url, {'search': 'sunday'})
+    assert [game['id'] for game in res.data['results']] == [
+        by_name.id,
+        by_description.id,
+    ], 'Should find full text matches, game names first'
+    assert not any(
+        'SIMILARITY' in query['sql'] or '(1) AS "a"' in query['sql']
+        for query in queries
+    ), 'Should not check for matches or look for similar names first'
+
+    res = client.get(url, {'search': 'riversde'})
+    assert [game['id'] for game in res.data['results']] == [by_name.id], \
+        'Should fall back to similar names when nothing matches'
+
+    res = client.get(url, {'search': 'riversde', 'offset': 50})
+    assert res.data['results'] == [], \
+        'Should only fall back on the first page'
+
+    riverside.name = 'Lakeside field'
+    riverside.save()
+    res = client.get(url, {'search': 'lakeside'})
+    assert [game['id'] for game in res.data['results']] == [by_name.id], \
+        'Location changes should update game search vectors'
+
+
+def test_game_search_near(client, search_vectors):
+    here = mixer.blend('games.Location', name='Park', address='Main street',
+                       gis=Point(-121.5, 38.5))
+    far = mixer.blend('games.Location', name='Park', address='Main street',
+                      gis=Point(-121.5, 39.5))
+    by_name_far = mixer.blend('games.Game', name='Sunday football',
+                              location=far, description='')
+    by_description = mixer.blend('games.Game', name='Evening kickabout',
+                                 location=here,
+                                 description='Friendly game on sunday')
+    by_name_here = mixer.blend('games.Game', name='Sunday football',
+                               location=here, description='')
+
+    res = client.get(reverse('game-list'), {
+        'search': 'sunday', 'near': '-121.5,38.5',
+    })
+    assert [game['id'] for game in res.data['results']] == [
+        by_name_here.id,
+        by_name_far.id,
+        by_description.id,
+    ], 'Best matches should go first, nearest first among equal ones'
+
+
+def test_offline_seeding(settings, tmpdir):
+    settings.MEDIA_ROOT = str(tmpdir)
+    call_command('randomusers', offline=True, count=40, stdout=StringIO())
+    call_command('randomteams', offline=True, count=4, players=8,
+                 stdout=StringIO())
+    call_command('randomgames', offline=True, count=20, jobs=1,
+                 stdout=StringIO())
+
+    games = Game.objects.filter(description__startswith='_rndgnd')
+    assert games.count() == 20
+    assert not RsvpStatus.objects.filter(game__in=games)\
+        .values('game_id', 'player_id')\
+        .annotate(count=Count('id'))\
+        .filter(count__gt=1)\
+        .exists()
+    for game in games:
+        assert game.rsvps.get(player_id=game.organizer_id).status == \
+            RsvpStatus.GOING, 'Organizers are going'
+
+    assert recount_invites() == 0, 'Invites counters should be right'
+
 # TODO: team games
 # TODO: delete
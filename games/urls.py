@@ -2,12 +2,18 @@
 from django.conf.urls import url
 from rest_framework_nested import routers
 
-from .views import GameViewSet, LocationViewSet, RsvpViewSet
+from .views import (
+    GameViewSet,
+    InviteJobViewSet,
+    LocationViewSet,
+    RsvpViewSet,
+)
 
 
 router = routers.SimpleRouter()
 router.register(r'games', GameViewSet)
 router.register(r'locations', LocationViewSet)
+router.register(r'invite-jobs', InviteJobViewSet, base_name='invite-job')
 
 games_router = routers.NestedSimpleRouter(router, r'games', lookup='game')
 games_router.register(r'players', RsvpViewSet, base_name='rsvp')
@@ -1,21 +1,59 @@
-from django.db.models import Count
-from rest_framework import permissions
+from django.core.cache import cache
+from rest_framework import mixins, permissions
 from rest_framework.decorators import list_route
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
 from rest_framework_gis.filters import InBBoxFilter
 
+from main.pagination import KeysetPagination
 from main.viewsets import AppViewSet
-from .models import Game, Location, RsvpStatus
-from .permissions import GameUpdateDestroyPermission
+from .feeds import get_feed_cache_key, get_feed_timeout
+from .filters import GameSearchFilter, NearFilter
+from .markers import MAX_ZOOM, MIN_ZOOM, get_markers
+from .models import Game, InviteJob, Location, RsvpStatus
+from .permissions import (
+    GamePermissionContext,
+    GameUpdateDestroyPermission,
+    RsvpCreateUpdateDestroyPermission,
+)
 from .serializers import (
     GameCreateSerializer,
     GameDetailsSerializer,
+    GameListFastSerializer,
     GameListSerializer,
+    InviteJobSerializer,
     LocationSerializer,
     RsvpCreateSerializer,
+    RsvpFastSerializer,
     RsvpSerializer,
 )
 
 
+def get_datetime(game):
+    """Datetime of a game instance or a `values()` row"""
+    if isinstance(game, dict):
+        return game['datetime']
+    return game.datetime
+
+
+class GameListPagination(KeysetPagination):
+    """Keyset pagination that matches the default Game ordering"""
+    ordering = ('datetime', 'id')
+
+
+# Personal game lists, cached per user (see .feeds)
+FEEDS = ('my', 'invites')
+
+# Paginator attributes with names of query params used for pagination
+PAGINATOR_QUERY_PARAMS = (
+    'cursor_query_param',
+    'limit_query_param',
+    'offset_query_param',
+    'page_query_param',
+)
+
+
 class GameViewSet(AppViewSet):
     """
     # Games Api
@@ -25,8 +63,14 @@ class GameViewSet(AppViewSet):
     list:
 
     Get a list of upcoming pickup games\n
-    Can be searched by name, date, location name, location address.\n
-    Can be ordered by `datetime` (default) and `-datetime`.
+    Can be searched by name, description, location name and address with
+    the `search` param, best matches first.\n
+    Can be ordered by `datetime` (default) and `-datetime`.\n
+    Use `near=lon,lat` param to get games nearest to a point first (after
+    the best matches, when searching) and `radius` param (in metres) to
+    limit the distance.\n
+    Map markers for the games are included when `zoom` param is supplied,
+    use `in_bbox` param to only get markers within the map bounds.
 
     create:
 
@@ -45,9 +89,7 @@ class GameViewSet(AppViewSet):
 
     destroy: Delete the game (hard)
     """
-    queryset = Game.objects.all()\
-        .select_related('location')\
-        .prefetch_related('teams')
+    queryset = Game.objects.all()
 
     serializer_class = GameDetailsSerializer
     serializer_classes = {
@@ -56,6 +98,16 @@ class GameViewSet(AppViewSet):
         'invites': GameListSerializer,
         'my': GameListSerializer,
     }
+    fast_serializer_classes = {
+        'list': GameListFastSerializer,
+        'invites': GameListFastSerializer,
+        'my': GameListFastSerializer,
+    }
+    pagination_classes = {
+        'list': GameListPagination,
+        'invites': GameListPagination,
+        'my': GameListPagination,
+    }
 
     permission_classes = (
         permissions.IsAuthenticated,
@@ -63,9 +115,12 @@ class GameViewSet(AppViewSet):
     )
 
     ordering_fields = ('datetime', )
-    search_fields = ('datetime', 'location__name', 'location__address', 'name')
+    # Trigram search instead of the full text one (see GameSearchFilter)
+    search_fallback = False
     bbox_filter_field = 'location__gis'
-    filter_backends = (InBBoxFilter, )
+    near_filter_field = 'location__gis'
+    filter_backends = (InBBoxFilter, GameSearchFilter, NearFilter)
+    zoom_param = 'zoom'
 
     def get_queryset(self):
         """
@@ -79,13 +134,22 @@ class GameViewSet(AppViewSet):
         if self.action not in ['invites', 'list', 'my']:  # not list
             return queryset
 
-        queryset = queryset.with_rsvps(self.request.user)
+        user = self.request.user
+        queryset = queryset.with_rsvps(user)
 
+        # Start from the player's rsvps (player, status) rather than going
+        # through every game's rsvp annotation
         if self.action == 'my':
-            queryset = queryset.filter(rsvp__gt=RsvpStatus.INVITED)
+            queryset = queryset.filter(id__in=RsvpStatus.objects.filter(
+                player=user,
+                status__gt=RsvpStatus.INVITED,
+            ).order_by().values('game_id'))
 
         if self.action == 'invites':
-            return queryset.filter(rsvp=RsvpStatus.INVITED)
+            return queryset.filter(id__in=RsvpStatus.objects.filter(
+                player=user,
+                status=RsvpStatus.INVITED,
+            ).order_by().values('game_id'))
 
         if 'team_pk' in self.kwargs:
             # Team games for a specific team
@@ -99,35 +163,108 @@ class GameViewSet(AppViewSet):
 
         return queryset.future()
 
-    def get_markers(self, queryset):
+    def get_last_modified(self):
+        if self.action == 'retrieve':
+            return Game.objects.get_last_modified(self.kwargs['pk'])
+        return None
+
+    def get_markers(self, request):
         """
-        Get locations data with count of games
+        Map markers for the list, games are counted per location (or per
+        grid cluster on lower zoom levels) within the bbox tile
         """
-        data = queryset.values(
-            'location__id',
-            'location__name',
-            'location__address',
-            'location__gis',
+        zoom = request.query_params[self.zoom_param]
+        try:
+            zoom = int(zoom)
+        except ValueError:
+            raise ParseError(f'Invalid zoom level: {zoom!r}')
+
+        if not MIN_ZOOM <= zoom <= MAX_ZOOM:
+            raise ParseError(
+                f'Zoom level must be between {MIN_ZOOM} and {MAX_ZOOM}')
+
+        bbox_filter = InBBoxFilter()
+        bbox = bbox_filter.get_filter_bbox(request)
+
+        queryset = self.get_queryset()
+        for backend in self.filter_backends:
+            if not issubclass(backend, InBBoxFilter):
+                queryset = backend().filter_queryset(
+                    request, queryset, self)
+
+        # Pagination doesn't change markers
+        ignored_params = {self.zoom_param, bbox_filter.bbox_param, 'format'}
+        ignored_params.update(
+            getattr(self.paginator, param, None)
+            for param in PAGINATOR_QUERY_PARAMS
+        )
+        query_key = [
+            self.action,
+            self.kwargs.get('team_pk'),
+            sorted(
+                (key, value)
+                for key, value in request.query_params.lists()
+                if key not in ignored_params
+            ),
+        ]
+        if self.action != 'list':
+            # my and invites are different for every user
+            query_key.append(request.user.id)
+
+        return get_markers(
+            queryset,
+            zoom,
+            bbox=bbox.extent if bbox else None,
+            query_key=repr(query_key),
         )
-        # import pdb
-        # pdb.set_trace()
-        data = queryset.values(
-            'location__id',
-            'location__name',
-            'location__address',
-        ).annotate(games=Count('location__id'))
-        return data
 
     def list(self, request, *args, **kwargs):
+        # Personal feeds are served from cache until they change
+        is_feed = self.action in FEEDS
+        if is_feed:
+            cache_key = get_feed_cache_key(
+                request.user.id,
+                self.action,
+                (sorted(request.query_params.lists()),
+                 request.accepted_renderer.format),
+            )
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
+        if not page and self.is_first_search_page(request):
+            # Nothing matches the full text search, look for similar names
+            self.search_fallback = True
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset)
         serializer = self.get_serializer(page, many=True)
 
         res = self.get_paginated_response(serializer.data)
-        res.data['map'] = {'markers': 'TODO'}  # self.get_markers(queryset)}
-        res.data.move_to_end('results')
+        if self.zoom_param in request.query_params:
+            # Keep results last, re-adding rather than move_to_end() as the
+            # fast renderers iterate dicts in their insertion order
+            results = res.data.pop('results')
+            res.data['map'] = {'markers': self.get_markers(request)}
+            res.data['results'] = results
+
+        if is_feed:
+            timeout = get_feed_timeout(
+                [get_datetime(game) for game in page or []],
+                cutoff='all' not in request.query_params,
+            )
+            cache.set(cache_key, res.data, timeout)
         return res
 
+    def is_first_search_page(self, request):
+        return (
+            not self.search_fallback and
+            self.paginator is not None and
+            self.paginator.get_offset(request) == 0 and
+            bool(GameSearchFilter().get_search_terms(request))
+        )
+
     @list_route(methods=['get'])
     def my(self, *args, **kwargs):
         """Games for the logged in user"""
@@ -139,119 +276,23 @@ class GameViewSet(AppViewSet):
         return self.list(*args, **kwargs)
 
 
+class InviteJobViewSet(mixins.RetrieveModelMixin, GenericViewSet):
+    """Progress of background invitations for games the user created"""
+    serializer_class = InviteJobSerializer
+    queryset = InviteJob.objects.all()
+    permission_classes = (permissions.IsAuthenticated, )
+
+    def get_queryset(self):
+        return super().get_queryset().filter(organizer=self.request.user)
+
+
 class LocationViewSet(AppViewSet):
     serializer_class = LocationSerializer
     queryset = Location.objects.all()
     search_fields = ('address', 'name')
     bbox_filter_field = 'gis'
-    filter_backends = (InBBoxFilter, )
-
-
-# TODO: move to a separate permissions module
-class RsvpCreateUpdateDestroyPermission(permissions.BasePermission):
-    """
-    Ensure that the change is withing the following options:
-        - User joins pickup games and asks to join league games
-        - Player changes status or leaves
-        - Game organizer removes player from open games
-        - Team manager can invite and remove players to/from league games
-    """
-    message = __doc__
-
-    def has_permission(self, request, view):
-
-        if request.method in permissions.SAFE_METHODS:
-            return True
-
-        data = request.data
-
-        if not data:
-            return True
-
-        try:
-            new_status = int(data.get('rsvp', None))
-            new_player_id = int(data.get('id', None))
-        except (TypeError, ValueError):
-            # It will raise a validation error during serializing
-            # and produce a sensible error message so here we can give
-            # id it green light without worries
-            return True
-
-        new_team = data.get('team', None)
-        # Only pickup games for now, No teams allowed yet
-        if new_team and new_team != RsvpStatus.NO_TEAM:
-            # TODO: Check permission to be on that team
-            pass
-
-        is_invite = new_status == RsvpStatus.INVITED
-        is_request = new_status == RsvpStatus.REQUESTED_TO_JOIN
-        is_rsvp = new_status is not None and new_status >= 0
-
-        game = Game.objects.get(id=view.kwargs['game_pk'])
-        is_pickup_game = game.teams.count() == 0
-        is_team_game = not is_pickup_game
-        user = request.user
-        user_is_organizer = user == game.organizer
-        user_is_team_manager = False  # TODO:
-        user_is_player = user.id == new_player_id
-
-        return (
-            (user_is_player and is_pickup_game and is_rsvp) or
-            (user_is_player and is_team_game and is_request) or
-            (user_is_organizer and is_pickup_game and is_invite) or
-            (user_is_team_manager and is_team_game and is_invite)
-        )
-
-    def has_object_permission(self, request, view, obj):
-
-        if request.method in permissions.SAFE_METHODS:
-            return True
-
-        if request.user.is_superuser:
-            return True
-
-        game = obj.game
-        is_pickup_game = game.teams.count() == 0
-        is_team_game = not is_pickup_game
-
-        user = request.user
-
-        user_is_organizer = user == game.organizer
-        user_is_team_manager = False
-        try:
-            team = game.teams.all()[obj.team]
-            user_is_team_manager = user in team.managers.all()
-        except IndexError:
-            team = None
-        user_is_player = user == obj.player
-
-        if request.method == 'DELETE':
-            return (
-                user_is_player or
-                (user_is_organizer and is_pickup_game) or
-                (user_is_team_manager and is_team_game)
-            )
-
-        data = request.data
-
-        if not data:
-            return True
-        try:
-            new_status = int(data.get('rsvp', None))
-        except ValueError:
-            return True  # Will be stopped by serializer validator
-
-        old_status = obj.status
-        is_rsvp = new_status is not None and new_status >= 0
-
-        is_request_accept = ((
-            (user_is_organizer and is_pickup_game) or
-            (user_is_team_manager and is_team_game)
-        ) and (
-            old_status == RsvpStatus.REQUESTED_TO_JOIN and
-            new_status == RsvpStatus.GOING
-        ))
-        return (user_is_player and is_rsvp) or is_request_accept
+    near_filter_field = 'gis'
+    filter_backends = (InBBoxFilter, NearFilter)
 
 
 class RsvpViewSet(AppViewSet):
@@ -259,6 +300,9 @@ class RsvpViewSet(AppViewSet):
     serializer_classes = {
         'create': RsvpCreateSerializer,
     }
+    fast_serializer_classes = {
+        'list': RsvpFastSerializer,
+    }
     queryset = RsvpStatus.objects.all()
     permission_classes = (
         permissions.IsAuthenticated,
@@ -267,3 +311,14 @@ class RsvpViewSet(AppViewSet):
 
     def get_queryset(self):
         return super().get_queryset().filter(game_id=self.kwargs['game_pk'])
+
+    def get_last_modified(self):
+        # Any rsvp change bumps the game
+        return Game.objects.get_last_modified(self.kwargs['game_pk'])
+
+    def get_game_context(self):
+        """Game details for permission checks, loaded once per request"""
+        if not hasattr(self, '_game_context'):
+            self._game_context = GamePermissionContext.load(
+                self.kwargs['game_pk'])
+        return self._game_context
@@ -44,12 +44,13 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.gis',
     'django.contrib.messages',
+    'django.contrib.postgres',
     'django.contrib.sessions',
     'django.contrib.staticfiles',
 
     # 3rd party
     'crispy_forms',
-    'debug_toolbar',
+    'debug_toolbar',  # Development only, see prod and staging settings
     'django_filters',
     'djoser',
     'raven.contrib.django.raven_compat',
@@ -67,6 +68,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.timing.ServerTimingMiddleware',
+    'main.profiling.ProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -157,9 +160,17 @@ SOCIAL_AUTH_PIPELINE = (
     'users.pipeline.facebook_extra_details',
 )
 
+# Facebook details of new users are fetched by a celery task (see
+# users.tasks) from there
+FACEBOOK_GRAPH_URL = 'https://graph.facebook.com/v2.8'
+
 JWT_AUTH = {
     'JWT_EXPIRATION_DELTA': timedelta(days=60),
     'JWT_ALLOW_REFRESH': True,
+    # Token versions, see users.authentication
+    'JWT_PAYLOAD_HANDLER': 'users.authentication.jwt_payload_handler',
+    'JWT_PAYLOAD_GET_USERNAME_HANDLER':
+        'users.authentication.jwt_get_username_from_payload_handler',
 }
 
 LOGIN_REDIRECT_URL = '/api/'
@@ -258,7 +269,7 @@ API_TITLE = 'Good Foot Club API'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
+        'users.authentication.CachedJSONWebTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ),
@@ -272,11 +283,67 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'main.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'main.renderers.RapidJSONRenderer',
+        'main.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'PAGE_SIZE': 50,
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
+    'TEST_REQUEST_RENDERER_CLASSES': (
+        'rest_framework.renderers.MultiPartRenderer',
+        'rest_framework.renderers.JSONRenderer',
+        'main.renderers.MessagePackRenderer',
+    ),
 }
 
+# Serve list actions that have fast serializers from `values()` rows
+# (see main.fast)
+FAST_SERIALIZERS = True
+
+
+# Cache
+
+# Has to be shared by every process: cached data is invalidated through it
+# (see games.feeds and users.principals)
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    },
+}
+
+# Cache principals of JWT authenticated users (see users.principals), None
+# to only cache them when the cache above is shared by every process
+CACHE_PRINCIPALS = None
+
 
 # Celery
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
+
+# New team players are invited to the team games by a celery task when the
+# team has more future games than that (None to always invite right away)
+TEAM_INVITES_ASYNC_THRESHOLD = 50
+
+# Sampling profiler (see main.profiling)
+
+# Fraction of requests to profile
+PROFILE_SAMPLE_RATE = 0
+# Only keep profiles of sampled requests slower than that (None for all)
+PROFILE_SLOW_MS = None
+# Superusers can profile their requests with the `X-Profile` header, off
+# by default: every client sending it is sampled until its user is known
+PROFILE_HEADER = False
+PROFILE_INTERVAL = 0.005  # seconds between stack samples
+PROFILE_DIR = join_path(SRV_DIR, 'logs', 'profiles')
+PROFILE_KEEP = 200  # newest profiles
@@ -9,9 +9,19 @@ SECRET_KEY = os.environ.get('DJANGO_SECRET')
 
 DEBUG = False
 TEMPLATE_DEBUG = False
-DEBUG_TOOLBAR_CONFIG = {
-    'SHOW_TOOLBAR_CALLBACK': lambda request: DEBUG,
-}
+
+# Debug toolbar is for development only, see main.timing for timings
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if not middleware.startswith('debug_toolbar.')
+]
+
+# No browsable API
+REST_FRAMEWORK = dict(REST_FRAMEWORK, DEFAULT_RENDERER_CLASSES=(
+    'main.renderers.RapidJSONRenderer',
+    'main.renderers.MessagePackRenderer',
+))
 
 ALLOWED_HOSTS = ['goodfoot.club']
 
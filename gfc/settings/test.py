@@ -15,6 +15,18 @@ DATABASES = {
 
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
+CELERY_TASK_ALWAYS_EAGER = True
+
+# Tests run in a single process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+CACHE_PRINCIPALS = True
+
+PROFILE_HEADER = True
+
 
 LOGGING = {
     'version': 1,
@@ -0,0 +1,247 @@
+"""Endpoint benchmarks with query and latency budgets
+
+Hot api endpoints are requested through the whole middleware stack by a
+team captain of the offline random data (see the `random*` commands) at
+several data scales. Every endpoint has a budget per scale in
+BUDGETS_FILE, recorded with `bench_endpoints --record` on the reference
+machine:
+
+    {"small": {"games": {"ms": 80, "queries": 4}, ...}, ...}
+
+`queries` is the number of SQL queries of a request and `ms` is the median
+request time in milliseconds, budgets without `ms` are checked for queries
+only. Requests use a cache of their own (CACHES), which is cleared before
+every request, so cached feeds are measured by the work they do on a miss
+and the shared cache of a deployment is left alone.
+
+See the bench_endpoints command for running, recording and comparing them
+"""
+import json
+import os
+from collections import OrderedDict
+from io import StringIO
+from math import ceil
+from statistics import median
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.reverse import reverse
+
+from games.management.commands.randomgames import (
+    CENTER,
+    DESC_PREFIX as GAMES_PREFIX,
+)
+from games.models import Game, RsvpStatus
+from teams.management.commands.randomteams import INFO_PREFIX as TEAMS_PREFIX
+from teams.models import Role, Team
+from users.management.commands.randomusers import USERNAME_PREFIX
+from users.models import User
+from .seeding import DEFAULT_SEED
+
+__all__ = [
+    'BUDGETS_FILE',
+    'ENDPOINTS',
+    'SCALES',
+    'check_budgets',
+    'create_data',
+    'load_budgets',
+    'measure',
+    'record_budgets',
+    'save_budgets',
+]
+
+
+BUDGETS_FILE = os.path.join(os.path.dirname(__file__), 'budgets.json')
+
+# Numbers of random users, teams and games (see the random* commands)
+SCALES = OrderedDict([
+    ('tiny', {'users': 100, 'teams': 5, 'games': 250}),
+    ('small', {'users': 200, 'teams': 10, 'games': 500}),
+    ('medium', {'users': 2000, 'teams': 100, 'games': 10000}),
+    ('large', {'users': 20000, 'teams': 1000, 'games': 100000}),
+])
+
+# Cache of the measured requests, clearing the shared one would drop the
+# cached feeds and principals of every user
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmarks',
+    },
+}
+
+# Recorded latency budgets leave that much room for noise
+LATENCY_HEADROOM = 1.5
+
+# Map around the offline locations
+BBOX = '{},{},{},{}'.format(
+    CENTER[0] - 0.25, CENTER[1] - 0.25, CENTER[0] + 0.25, CENTER[1] + 0.25)
+ZOOM = 10
+SEARCH = 'offline field'
+
+# Statuses the rsvp benchmark switches between
+RSVPS = [RsvpStatus.NOT_GOING, RsvpStatus.GOING]
+
+# Endpoint name -> function(context, i) returning method, url and data of
+# the i-th request, see create_data() for the context
+ENDPOINTS = OrderedDict([
+    ('games', lambda context, i: (
+        'get', reverse('game-list'), {})),
+    ('games?in_bbox', lambda context, i: (
+        'get', reverse('game-list'), {'in_bbox': BBOX, 'zoom': ZOOM})),
+    ('games?search', lambda context, i: (
+        'get', reverse('game-list'), {'search': SEARCH})),
+    ('games/my', lambda context, i: (
+        'get', reverse('game-my'), {})),
+    ('games/invites', lambda context, i: (
+        'get', reverse('game-invites'), {})),
+    ('games/{id}', lambda context, i: (
+        'get', reverse('game-detail', (context['game_id'], )), {})),
+    ('games/{id}/players (join)', lambda context, i: (
+        'post',
+        reverse('rsvp-list', (context['pickup_game_id'], )),
+        {'id': context['user'].id, 'rsvp': RsvpStatus.GOING},
+    )),
+    ('games/{id}/players/{id} (rsvp)', lambda context, i: (
+        'patch',
+        reverse('rsvp-detail', (context['game_id'], context['rsvp_id'])),
+        {'rsvp': RSVPS[i % len(RSVPS)]},
+    )),
+    ('teams/my', lambda context, i: (
+        'get', reverse('team-my'), {})),
+    ('teams/{id}', lambda context, i: (
+        'get', reverse('team-detail', (context['team_id'], )), {})),
+    ('users/me', lambda context, i: (
+        'get', reverse('current-user'), {})),
+])
+
+
+def create_data(scale, seed=DEFAULT_SEED):
+    """Replace the random data with the offline one of the scale
+
+    Should run in a transaction that is rolled back afterwards (only
+    placeholder images stay in the storage). Returns the context of
+    ENDPOINTS requests
+    """
+    sizes = SCALES[scale]
+
+    # The commands keep existing data when there is enough of it
+    Game.objects.filter(description__startswith=GAMES_PREFIX).delete()
+    Team.objects.filter(info__startswith=TEAMS_PREFIX).delete()
+    User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    out = StringIO()
+    call_command('randomusers', offline=True, count=sizes['users'],
+                 seed=seed, stdout=out)
+    call_command('randomteams', offline=True, count=sizes['teams'],
+                 seed=seed, stdout=out)
+    # Rsvps are copied in this process, others can't see the transaction
+    call_command('randomgames', offline=True, count=sizes['games'],
+                 seed=seed, jobs=1, stdout=out)
+
+    captain = Role.objects\
+        .filter(team__info__startswith=TEAMS_PREFIX, role=Role.CAPTAIN)\
+        .select_related('player')\
+        .order_by('team_id')\
+        .first()
+    user = captain.player
+    rsvp = RsvpStatus.objects\
+        .filter(player=user, game__teams=captain.team_id)\
+        .filter(game__in=Game.objects.future())\
+        .order_by('game__datetime')\
+        .first()
+    pickup_game_id = Game.objects\
+        .future()\
+        .filter(description__startswith=GAMES_PREFIX, teams=None)\
+        .exclude(rsvps__player=user)\
+        .values_list('id', flat=True)\
+        .first()
+
+    return {
+        'game_id': rsvp.game_id,
+        'pickup_game_id': pickup_game_id,
+        'rsvp_id': rsvp.id,
+        'team_id': captain.team_id,
+        'user': user,
+    }
+
+
+def measure(client, name, context, repeat):
+    """Queries, median time and status of `repeat` requests of the endpoint
+
+    client should be authenticated as the context user
+    """
+    get_request = ENDPOINTS[name]
+    times = []
+    queries = 0
+    with override_settings(CACHES=CACHES):
+        for i in range(repeat):
+            method, url, data = get_request(context, i)
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = perf_counter()
+                res = getattr(client, method)(url, data)
+                times.append(perf_counter() - start)
+            queries = max(queries, len(captured))
+
+            if res.status_code >= 400:
+                break
+            if method == 'post':
+                # Leave the game, so that the next request joins it again
+                client.delete(f'{url}{res.data["rsvp_id"]}/')
+
+    return {
+        'ms': round(median(times) * 1000, 2),
+        'queries': queries,
+        'status': res.status_code,
+    }
+
+
+def load_budgets(path=BUDGETS_FILE):
+    with open(path) as budgets_file:
+        return json.load(budgets_file)
+
+
+def save_budgets(budgets, path=BUDGETS_FILE):
+    with open(path, 'w') as budgets_file:
+        json.dump(budgets, budgets_file, indent=2, sort_keys=True)
+        budgets_file.write('\n')
+
+
+def check_budgets(results, budgets, latency=True):
+    """Messages about endpoints over their budgets or without one
+
+    results - {scale: {endpoint: measure() result}}
+    """
+    exceeded = []
+    for scale, endpoints in results.items():
+        for name, result in endpoints.items():
+            budget = budgets.get(scale, {}).get(name)
+            if budget is None:
+                exceeded.append(f'{scale} {name}: no budget (see --record)')
+                continue
+
+            if result['queries'] > budget['queries']:
+                exceeded.append(
+                    f'{scale} {name}: {result["queries"]} queries '
+                    f'(budget {budget["queries"]})')
+            if latency and 'ms' in budget and result['ms'] > budget['ms']:
+                exceeded.append(
+                    f'{scale} {name}: {result["ms"]} ms '
+                    f'(budget {budget["ms"]})')
+    return exceeded
+
+
+def record_budgets(results, budgets):
+    """Budgets updated with the results (latency with LATENCY_HEADROOM)"""
+    budgets = {scale: dict(endpoints) for scale, endpoints in budgets.items()}
+    for scale, endpoints in results.items():
+        for name, result in endpoints.items():
+            budgets.setdefault(scale, {})[name] = {
+                'ms': ceil(result['ms'] * LATENCY_HEADROOM),
+                'queries': result['queries'],
+            }
+    return budgets
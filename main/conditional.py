@@ -0,0 +1,65 @@
+"""Conditional GET for API views
+
+Views with ConditionalGetMixin answer `If-None-Match` and
+`If-Modified-Since` requests of retrieve and list actions with 304 Not
+Modified before loading or serializing anything, and add `ETag` and
+`Last-Modified` headers to the full responses.
+
+ETags change with every modification while Last-Modified only has one
+second resolution, clients should prefer `If-None-Match`
+"""
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+__all__ = ['ConditionalGetMixin']
+
+
+class ConditionalGetMixin:
+    """
+    Implement `get_last_modified()` returning time of the latest change
+    of anything in the action's response, or None to skip conditional
+    handling (unknown objects, actions that don't track changes, etc...)
+    """
+
+    def get_last_modified(self):
+        return None
+
+    def get_etag(self, last_modified):
+        """Differs for representations (format, query params) of a version"""
+        request = self.request
+        key = ':'.join([
+            last_modified.isoformat(),
+            request.accepted_media_type,
+            request.get_full_path(),
+        ])
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return handler(request, *args, **kwargs)
+
+        etag = self.get_etag(last_modified)
+        timestamp = timegm(last_modified.utctimetuple())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if not 200 <= response.status_code < 300:
+                return response
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
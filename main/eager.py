@@ -0,0 +1,102 @@
+"""Eager loading derived from serializers
+
+Walks serializer fields (nested serializers included) and figures out
+which relations they read, so querysets can load them up front with
+`select_related` (forward foreign keys) and `prefetch_related` (anything
+that is many, and everything after it).
+
+Relations read outside of declared fields (e.g. in `to_representation`)
+can be listed in the serializer's Meta:
+
+    class Meta:
+        select_related = 'team',
+        prefetch_related = 'team__managers',
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+__all__ = ['get_eager_loading', 'optimize_queryset']
+
+
+_cache = {}
+
+
+def get_relation(model, name):
+    """Relation field of the model by the attribute name or None"""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # Reverse relations are accessed as `<model>_set` by default
+        for rel in model._meta.related_objects:
+            if rel.get_accessor_name() == name:
+                return rel
+        return None
+
+    if not field.is_relation:
+        return None
+    if getattr(field, 'attname', None) == name != field.name:
+        return None  # `<fk>_id` attribute doesn't need the related object
+    return field
+
+
+def walk_source(model, attrs, path, many, select, prefetch):
+    """Follow relations of source attrs, adding them to select or prefetch
+
+    Returns (model, path, many) for the last relation visited
+    """
+    for attr in attrs:
+        relation = get_relation(model, attr)
+        if relation is None:
+            break
+
+        path = f'{path}__{attr}' if path else attr
+        many = many or relation.many_to_many or relation.one_to_many
+        (prefetch if many else select).add(path)
+        model = relation.related_model
+    return model, path, many
+
+
+def walk_serializer(serializer, model, path, many, select, prefetch):
+    meta = getattr(serializer, 'Meta', None)
+    for hint in getattr(meta, 'select_related', ()):
+        walk_source(model, hint.split('__'), path, many, select, prefetch)
+    for hint in getattr(meta, 'prefetch_related', ()):
+        walk_source(model, hint.split('__'), path, True, select, prefetch)
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        field_model, field_path, field_many = walk_source(
+            model, field.source_attrs, path, many, select, prefetch)
+
+        if isinstance(field, ListSerializer):
+            field = field.child
+        if isinstance(field, BaseSerializer) and field_path != path:
+            walk_serializer(field, field_model, field_path, field_many,
+                            select, prefetch)
+
+
+def get_eager_loading(serializer_class, model):
+    """Relations to load for serializing model instances
+
+    get_eager_loading(GameDetailsSerializer, Game) ->
+        (['location', 'organizer'], ['rsvps', 'rsvps__player', 'teams'])
+    """
+    key = serializer_class, model
+    if key not in _cache:
+        select = set()
+        prefetch = set()
+        walk_serializer(serializer_class(), model, '', False,
+                        select, prefetch)
+        _cache[key] = sorted(select), sorted(prefetch)
+    return _cache[key]
+
+
+def optimize_queryset(queryset, serializer_class):
+    select, prefetch = get_eager_loading(serializer_class, queryset.model)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
@@ -0,0 +1,101 @@
+"""Image variants (thumbnails) of uploaded images
+
+Variants are resized copies of an image stored next to it, made with
+Pillow in the background (see users.tasks). Models keep variant names in
+a JSON field, `ImageVariantsField` serializes them as URLs:
+
+    {
+        "small": "https://.../media/photo_small.jpg",
+        "small_webp": "https://.../media/photo_small.webp",
+        ...
+    }
+
+or null while the variants are not made yet
+"""
+import os
+from collections import OrderedDict
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+from rest_framework.serializers import ReadOnlyField
+
+__all__ = ['ImageVariantsField', 'VARIANT_SIZES', 'make_variants']
+
+
+# Variant name -> max width and height
+VARIANT_SIZES = OrderedDict([
+    ('small', 64),
+    ('medium', 200),
+    ('large', 640),
+])
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def get_formats():
+    """(suffix, Pillow format, extension, save options) of the variants"""
+    Image.init()
+    formats = [('', 'JPEG', 'jpg', {'quality': JPEG_QUALITY})]
+    if 'WEBP' in Image.SAVE:
+        formats.append(('_webp', 'WEBP', 'webp', {'quality': WEBP_QUALITY}))
+    return formats
+
+
+def make_variants(field_file):
+    """Make and store variants of the image, existing ones are replaced
+
+    make_variants(user.img) -> {'small': 'photo_small.jpg', ...}
+    """
+    storage = field_file.storage
+    root, _ = os.path.splitext(field_file.name)
+
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image.load()
+    finally:
+        field_file.close()
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    variants = OrderedDict()
+    for variant, size in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+
+        for suffix, image_format, extension, options in get_formats():
+            content = BytesIO()
+            resized.save(content, image_format, **options)
+
+            name = f'{root}_{variant}.{extension}'
+            if storage.exists(name):
+                storage.delete(name)
+            variants[variant + suffix] = storage.save(
+                name, ContentFile(content.getvalue()))
+
+    return variants
+
+
+class ImageVariantsField(ReadOnlyField):
+    """Variant name -> URL, same URLs as serializers.ImageField gives"""
+
+    def __init__(self, storage=default_storage, **kwargs):
+        self.storage = storage
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        if not variants:
+            return None
+
+        request = self.context.get('request', None)
+        urls = OrderedDict()
+        for variant, name in sorted(variants.items()):
+            url = self.storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant] = url
+        return urls
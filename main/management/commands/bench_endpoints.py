@@ -0,0 +1,184 @@
+"""Benchmark hot api endpoints against their query and latency budgets
+
+For every scale the random data is replaced with the offline one (inside a
+transaction that is rolled back at the end) and every endpoint is
+requested by a team captain, see main.benchmarks. Results are written to a
+JSON file to compare runs over time (--compare), the command fails when
+any endpoint is over its budget or has none. Use --record to update the
+budgets with the results instead
+"""
+import json
+import os
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from main.benchmarks import (
+    BUDGETS_FILE,
+    ENDPOINTS,
+    SCALES,
+    check_budgets,
+    create_data,
+    load_budgets,
+    measure,
+    record_budgets,
+    save_budgets,
+)
+from main.seeding import DEFAULT_SEED
+from main.transactions import rolled_back
+
+
+DEFAULT_SCALES = ['small']
+DEFAULT_REPEAT = 10
+DEFAULT_OUTPUT_DIR = 'benchmarks'
+
+# Development settings only allow local hosts
+SERVER_NAME = 'localhost'
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            dest='scales',
+            nargs='+',
+            choices=list(SCALES),
+            default=DEFAULT_SCALES,
+            help='Data scales to benchmark (Default {}).'
+                 .format(DEFAULT_SCALES),
+        )
+        parser.add_argument(
+            '--endpoints',
+            dest='endpoints',
+            nargs='+',
+            choices=list(ENDPOINTS),
+            default=list(ENDPOINTS),
+            help='Endpoints to benchmark (Default all).',
+        )
+        parser.add_argument(
+            '--repeat',
+            dest='repeat',
+            type=int,
+            default=DEFAULT_REPEAT,
+            help='Requests per endpoint (Default {}).'.format(DEFAULT_REPEAT),
+        )
+        parser.add_argument(
+            '--seed',
+            dest='seed',
+            default=DEFAULT_SEED,
+            help='Random data seed (Default {}).'.format(DEFAULT_SEED),
+        )
+        parser.add_argument(
+            '--budgets',
+            dest='budgets',
+            default=BUDGETS_FILE,
+            help='Budgets file (Default {}).'.format(BUDGETS_FILE),
+        )
+        parser.add_argument(
+            '--output',
+            dest='output',
+            help='Results file (Default endpoints-<time>.json in {}).'
+                 .format(DEFAULT_OUTPUT_DIR),
+        )
+        parser.add_argument(
+            '--compare',
+            dest='compare',
+            help='Results file of a previous run to compare with',
+        )
+        parser.add_argument(
+            '--record',
+            action='store_true',
+            dest='record',
+            default=False,
+            help='Update the budgets with the results instead of checking',
+        )
+
+    def handle(self, *args, **options):
+        budgets = load_budgets(options['budgets'])
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as previous_file:
+                previous = json.load(previous_file)['results']
+
+        results = {}
+        for scale in options['scales']:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                '{} ({})'.format(scale, ', '.join(
+                    f'{count} {name}'
+                    for name, count in sorted(SCALES[scale].items())
+                ))
+            ))
+            results[scale] = self.run_scale(scale, options)
+            self.write_results(
+                scale, results[scale], budgets.get(scale, {}),
+                previous.get(scale, {}))
+
+        now = timezone.now()
+        output = options['output'] or os.path.join(
+            DEFAULT_OUTPUT_DIR,
+            'endpoints-{}.json'.format(now.strftime('%Y%m%d-%H%M%S')),
+        )
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as output_file:
+            json.dump({
+                'created': now.isoformat(),
+                'fast_serializers': settings.FAST_SERIALIZERS,
+                'python': platform.python_version(),
+                'repeat': options['repeat'],
+                'results': results,
+                'seed': options['seed'],
+            }, output_file, indent=2, sort_keys=True)
+        self.stdout.write(f'Results written to {output}')
+
+        failed = [
+            f'{scale} {name}: status {result["status"]}'
+            for scale, endpoints in results.items()
+            for name, result in endpoints.items()
+            if result['status'] >= 400
+        ]
+        if failed:
+            raise CommandError('Failed requests:\n' + '\n'.join(failed))
+
+        if options['record']:
+            save_budgets(record_budgets(results, budgets), options['budgets'])
+            self.stdout.write(f'Budgets recorded to {options["budgets"]}')
+            return
+
+        exceeded = check_budgets(results, budgets)
+        if exceeded:
+            raise CommandError('Over budget:\n' + '\n'.join(exceeded))
+
+    def run_scale(self, scale, options):
+        results = {}
+        with rolled_back():
+            context = create_data(scale, options['seed'])
+            client = APIClient(SERVER_NAME=SERVER_NAME)
+            client.force_authenticate(user=context['user'])
+            for name in options['endpoints']:
+                results[name] = measure(
+                    client, name, context, options['repeat'])
+        return results
+
+    def write_results(self, scale, results, budgets, previous):
+        self.stdout.write('{:<32} {:>7} {:>7} {:>9} {:>9} {:>9}'.format(
+            'endpoint', 'queries', 'budget', 'ms', 'budget', 'previous'))
+
+        for name, result in results.items():
+            budget = budgets.get(name, {})
+            over = check_budgets({scale: {name: result}}, {scale: budgets})
+            style = self.style.ERROR if over else self.style.SUCCESS
+            self.stdout.write(style(
+                '{:<32} {:>7} {:>7} {:>9.2f} {:>9} {:>9}'.format(
+                    name,
+                    result['queries'],
+                    budget.get('queries', '-'),
+                    result['ms'],
+                    budget.get('ms', '-'),
+                    previous.get(name, {}).get('ms', '-'),
+                )
+            ))
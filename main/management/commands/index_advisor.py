@@ -0,0 +1,174 @@
+"""Explain hot endpoint queries and flag sequential scans
+
+Builds querysets the same way api views do (for a given user), runs
+EXPLAIN (ANALYZE, BUFFERS) on a page of each and reports sequential scans
+over tables bigger than a threshold. Exits with an error when any are found
+and --fail is given, to catch missing indexes before production does.
+"""
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from games.models import Game, RsvpStatus
+from games.views import GameViewSet, RsvpViewSet
+from main.transactions import rolled_back
+from teams.models import Role, Team
+from teams.views import TeamViewSet
+from users.models import User
+
+
+# Sequential scans over less rows than that are fine
+DEFAULT_MIN_ROWS = 1000
+
+# World wide bbox, checks that bbox filter uses GiST index
+BBOX = '-180,-90,180,90'
+
+SEQ_SCAN_RE = re.compile(
+    r'Seq Scan on (?P<table>\w+).*'
+    r'actual time=\S+ rows=(?P<rows>\d+) loops=(?P<loops>\d+)'
+)
+REMOVED_RE = re.compile(r'Rows Removed by Filter: (?P<rows>\d+)')
+
+
+def get_view_queryset(viewset, action, user, params=None, **kwargs):
+    """Queryset of a viewset action for a GET request by the user"""
+    request = Request(APIRequestFactory().get('/', params or {}))
+    request.user = user
+    view = viewset(
+        action=action,
+        format_kwarg=None,
+        kwargs=kwargs,
+        request=request,
+    )
+    return view.filter_queryset(view.get_queryset())
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            dest='user',
+            type=int,
+            help='Id of a user to run queries for '
+                 '(Default: user with any rsvps).',
+        )
+        parser.add_argument(
+            '--min-rows',
+            dest='min_rows',
+            type=int,
+            default=DEFAULT_MIN_ROWS,
+            help='Only flag sequential scans over at least that many rows '
+                 '(Default {}).'.format(DEFAULT_MIN_ROWS),
+        )
+        parser.add_argument(
+            '--fail',
+            action='store_true',
+            dest='fail',
+            default=False,
+            help='Exit with an error if any sequential scans were flagged',
+        )
+
+    def get_querysets(self, user):
+        """(name, queryset) for every hot endpoint"""
+        game_id = Game.objects.values_list('id', flat=True).first()
+        team_id = Team.objects.values_list('id', flat=True).first()
+
+        querysets = [
+            ('games', get_view_queryset(GameViewSet, 'list', user)),
+            ('games?in_bbox', get_view_queryset(
+                GameViewSet, 'list', user, {'in_bbox': BBOX})),
+            ('games/my', get_view_queryset(GameViewSet, 'my', user)),
+            ('games/invites', get_view_queryset(
+                GameViewSet, 'invites', user)),
+            ('teams/my', get_view_queryset(TeamViewSet, 'my', user)),
+            ('teams/invites', get_view_queryset(
+                TeamViewSet, 'invites', user)),
+            ('users/me (game invites)',
+             user.rsvps.filter(status=RsvpStatus.INVITED)),
+            ('users/me (team invites)',
+             user.role_set.filter(role=Role.INVITED)),
+        ]
+
+        if game_id is not None:
+            querysets.append((
+                'games/{id}/players',
+                get_view_queryset(RsvpViewSet, 'list', user, game_pk=game_id),
+            ))
+        if team_id is not None:
+            querysets.append((
+                'teams/{id}/games',
+                get_view_queryset(GameViewSet, 'list', user, team_pk=team_id),
+            ))
+        return querysets
+
+    def explain(self, queryset):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        query = queryset[:page_size].query
+        connection = connections[queryset.db]
+        sql, params = query.get_compiler(connection=connection).as_sql()
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_seq_scans(self, plan, min_rows):
+        """(table, rows) for sequential scans over at least min_rows"""
+        seq_scans = []
+        for i, line in enumerate(plan):
+            match = SEQ_SCAN_RE.search(line)
+            if not match:
+                continue
+
+            rows = int(match.group('rows'))
+            # Removed rows are reported on the following lines of the node
+            for detail in plan[i + 1:i + 4]:
+                removed = REMOVED_RE.search(detail)
+                if removed:
+                    rows += int(removed.group('rows'))
+                    break
+            rows *= int(match.group('loops'))
+
+            if rows >= min_rows:
+                seq_scans.append((match.group('table'), rows))
+        return seq_scans
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.get(id=options['user'])
+        else:
+            player_id = RsvpStatus.objects\
+                .order_by()\
+                .values_list('player_id', flat=True)\
+                .first()
+            if player_id is None:
+                raise CommandError('No users with rsvps, use --user')
+            user = User.objects.get(id=player_id)
+
+        flagged = 0
+        with rolled_back():
+            for name, queryset in self.get_querysets(user):
+                plan = self.explain(queryset)
+                seq_scans = self.get_seq_scans(plan, options['min_rows'])
+
+                if seq_scans:
+                    flagged += 1
+                    self.stdout.write(self.style.WARNING(name))
+                    for table, rows in seq_scans:
+                        self.stdout.write(
+                            f'    Seq Scan on {table} ({rows} rows)')
+                else:
+                    self.stdout.write(self.style.SUCCESS(name))
+
+                if options['verbosity'] > 1 or seq_scans:
+                    for line in plan:
+                        self.stdout.write('        ' + line)
+
+        if flagged and options['fail']:
+            raise CommandError(
+                f'{flagged} queries with sequential scans found')
@@ -0,0 +1,203 @@
+"""Pagination classes
+
+KeysetPagination (cursor) - constant time pages however deep a client
+    scrolls, falls back to limit/offset when `offset` param is used or the
+    queryset has an explicit ordering (search rank, distance, etc...)
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.encoding import force_text
+from rest_framework.compat import coreapi
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+__all__ = ['KeysetPagination']
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """
+    Keyset pagination over the `ordering` fields, the last one must be
+    unique. Cursors are opaque for the clients, use `next` and `previous`
+    links as is.
+
+    Total count is included by default, `?count=false` skips the query
+    """
+    ordering = ('id', )
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_keyset = (
+            self.offset_query_param not in request.query_params and
+            not queryset.query.order_by
+        )
+        if not self.use_keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = None
+        if self.get_include_count(request):
+            self.count = queryset.count()
+
+        position, self.reverse = self.decode_cursor(request, queryset)
+        self.has_cursor = position is not None
+
+        queryset = queryset.order_by(*self.get_ordering(self.reverse))
+        if self.has_cursor:
+            queryset = queryset.filter(
+                self.get_keyset_filter(position, self.reverse))
+
+        results = list(queryset[:self.limit + 1])
+        self.has_more = len(results) > self.limit
+        results = results[:self.limit]
+
+        if self.reverse:
+            results.reverse()
+
+        self.first = results[0] if results else None
+        self.last = results[-1] if results else None
+        self.display_page_controls = False
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_keyset:
+            return super().get_paginated_response(data)
+
+        res = OrderedDict()
+        if self.count is not None:
+            res['count'] = self.count
+        res['next'] = self.get_next_link()
+        res['previous'] = self.get_previous_link()
+        res['results'] = data
+        return Response(res)
+
+    def get_include_count(self, request):
+        value = request.query_params.get(self.count_query_param, 'true')
+        return value.lower() not in ('0', 'false', 'no')
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return self.ordering
+        return [
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        ]
+
+    def get_keyset_filter(self, position, reverse):
+        """
+        Rows after the position, for ordering (a, b) and position (x, y):
+
+            a >= x AND (a > x OR (a = x AND b > y))
+
+        The first condition lets the database use an index range scan
+        """
+        lookups = []
+        for field in self.get_ordering(reverse):
+            if field.startswith('-'):
+                lookups.append((field[1:], 'lt'))
+            else:
+                lookups.append((field, 'gt'))
+
+        keyset_filter = Q()
+        for i, (field, lookup) in enumerate(lookups):
+            exact = {
+                name: position[j]
+                for j, (name, _) in enumerate(lookups[:i])
+            }
+            exact[f'{field}__{lookup}'] = position[i]
+            keyset_filter |= Q(**exact)
+
+        field, lookup = lookups[0]
+        return Q(**{f'{field}__{lookup}e': position[0]}) & keyset_filter
+
+    def get_position(self, item):
+        """Ordering fields values of a model instance or `values()` row"""
+        if isinstance(item, dict):
+            return [item[field.lstrip('-')] for field in self.ordering]
+        return [
+            getattr(item, field.lstrip('-'))
+            for field in self.ordering
+        ]
+
+    def encode_cursor(self, item, reverse):
+        position = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in self.get_position(item)
+        ]
+        cursor = json.dumps([position, int(reverse)]).encode()
+        cursor = force_text(urlsafe_b64encode(cursor))
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, queryset):
+        """Get (position, reverse) from the request cursor param"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        try:
+            position, reverse = json.loads(
+                force_text(urlsafe_b64decode(cursor.encode()))
+            )
+            if len(position) != len(self.ordering):
+                raise ValueError
+            fields = [
+                queryset.model._meta.get_field(field.lstrip('-'))
+                for field in self.ordering
+            ]
+            position = [
+                field.to_python(value)
+                for field, value in zip(fields, position)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, bool(reverse)
+
+    def get_next_link(self):
+        if not self.use_keyset:
+            return super().get_next_link()
+
+        # Going backwards there always is the page we came from
+        if self.last is None or not (self.has_more or self.reverse):
+            return None
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_keyset:
+            return super().get_previous_link()
+
+        # Going forward there is a previous page only if we came from it
+        has_previous = self.has_more if self.reverse else self.has_cursor
+        if self.first is None or not has_previous:
+            return None
+        return self.encode_cursor(self.first, reverse=True)
+
+    def get_schema_fields(self, view):
+        return super().get_schema_fields(view) + [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                description='The pagination cursor value.',
+            ),
+            coreapi.Field(
+                name=self.count_query_param,
+                required=False,
+                location='query',
+                description='Set to `false` to skip the total count.',
+            ),
+        ]
@@ -0,0 +1,23 @@
+"""API parsers
+
+MessagePackParser - `application/msgpack` request bodies, see also
+    main.renderers.MessagePackRenderer
+"""
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .renderers import MessagePackRenderer
+
+__all__ = ['MessagePackParser']
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), encoding='utf-8')
+        except Exception as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
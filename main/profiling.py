@@ -0,0 +1,173 @@
+"""Sampling profiler for requests
+
+ProfilerMiddleware samples stacks of the threads handling profiled
+requests from a background thread, every PROFILE_INTERVAL seconds, and
+writes them in the folded format of flamegraph.pl (also opened by
+speedscope.app) to PROFILE_DIR:
+
+    20171018-120000-123456-GET-api.games-512ms.folded
+
+    handler (django/core/handlers/wsgi.py:146);... 12
+
+Requests are profiled when:
+    - a PROFILE_SAMPLE_RATE fraction of them is picked at random, their
+      profiles are only kept when they took longer than PROFILE_SLOW_MS
+      (when set), so `1` and `500` keep every request slower than 500ms
+    - a superuser sends the `X-Profile` header (with PROFILE_HEADER on),
+      the file name is then returned in the `X-Profile` header. Users are
+      only known after the response (api views authenticate them), so any
+      client sending the header is sampled: turn it on per environment,
+      where clients are trusted
+
+Only the newest PROFILE_KEEP profiles are kept. The middleware isn't used
+when both are off, and costs a header lookup when only the header is on
+"""
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from random import random
+from time import perf_counter, sleep
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+__all__ = ['ProfilerMiddleware']
+
+
+HEADER = 'X-Profile'
+META_HEADER = 'HTTP_X_PROFILE'
+
+EXTENSION = '.folded'
+
+# Thread id -> stack samples of the request it is handling
+_samples = {}
+_lock = threading.Lock()
+_profiling = threading.Event()
+_sampler = None
+
+# Code object -> frame label
+_labels = {}
+
+
+def get_label(code):
+    """function (path:line), path relative to its sys.path entry"""
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        roots = [root for root in sys.path if root and path.startswith(root)]
+        if roots:
+            path = path[len(max(roots, key=len)):].lstrip(os.sep)
+        label = f'{code.co_name} ({path}:{code.co_firstlineno})'
+        _labels[code] = label
+    return label
+
+
+def get_stack(frame):
+    """Folded stack of the frame, outermost call first"""
+    labels = []
+    while frame is not None:
+        labels.append(get_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def sample():
+    """Sample profiled threads while there are any, runs in a thread"""
+    while True:
+        _profiling.wait()
+        frames = sys._current_frames()
+        with _lock:
+            for thread_id, samples in _samples.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples[get_stack(frame)] += 1
+        del frames
+        sleep(settings.PROFILE_INTERVAL)
+
+
+def start_profiling():
+    """Start sampling stacks of the current thread"""
+    global _sampler
+
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(
+                target=sample, name='profiler', daemon=True)
+            _sampler.start()
+        _samples[threading.get_ident()] = Counter()
+        _profiling.set()
+
+
+def stop_profiling():
+    """Stack samples of the current thread"""
+    with _lock:
+        samples = _samples.pop(threading.get_ident())
+        if not _samples:
+            _profiling.clear()
+    return samples
+
+
+def save_profile(request, duration, samples):
+    """Write folded stacks, remove the oldest profiles, returns file name"""
+    path = re.sub(r'[^\w.-]', '_', request.path.strip('/').replace('/', '.'))
+    name = '{:%Y%m%d-%H%M%S-%f}-{}-{}-{}ms{}'.format(
+        datetime.utcnow(),
+        request.method,
+        path[:100] or 'root',
+        round(duration * 1000),
+        EXTENSION,
+    )
+
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(settings.PROFILE_DIR, name), 'w') as profile:
+        for stack, count in samples.most_common():
+            profile.write(f'{stack} {count}\n')
+
+    # Names start with the time
+    profiles = sorted(
+        file_name for file_name in os.listdir(settings.PROFILE_DIR)
+        if file_name.endswith(EXTENSION)
+    )
+    for file_name in profiles[:-settings.PROFILE_KEEP]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, file_name))
+        except FileNotFoundError:
+            pass  # Removed by another process
+    return name
+
+
+class ProfilerMiddleware:
+    """Should come early, so that profiles cover the other middleware"""
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_SAMPLE_RATE and not settings.PROFILE_HEADER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        requested = settings.PROFILE_HEADER and META_HEADER in request.META
+        sampled = random() < settings.PROFILE_SAMPLE_RATE
+        if not requested and not sampled:
+            return self.get_response(request)
+
+        start_profiling()
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            samples = stop_profiling()
+        duration = perf_counter() - start
+
+        # Api views authenticate users themselves and set request.user
+        user = getattr(request, 'user', None)
+        requested = requested and user is not None and user.is_superuser
+        slow_ms = settings.PROFILE_SLOW_MS
+        if requested or (sampled and (
+                slow_ms is None or duration * 1000 > slow_ms)):
+            name = save_profile(request, duration, samples)
+            if requested:
+                response[HEADER] = name
+        return response
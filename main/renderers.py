@@ -0,0 +1,74 @@
+"""API renderers
+
+RapidJSONRenderer - JSON with python-rapidjson, datetimes, decimals and
+    UUIDs are encoded natively, without the `default()` callback
+MessagePackRenderer - `application/msgpack` for the mobile clients, see
+    also main.parsers.MessagePackParser
+"""
+import msgpack
+import rapidjson
+from django.contrib.gis.geos import GEOSGeometry
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+__all__ = ['MessagePackRenderer', 'RapidJSONRenderer']
+
+
+_encoder = JSONEncoder()
+
+
+def encode(obj):
+    """Value of a type encoders don't know about (lazy strings, etc...)"""
+    if isinstance(obj, GEOSGeometry):
+        # Same as rest_framework_gis GeometryField
+        return {'type': obj.geom_type, 'coordinates': obj.coords}
+    return _encoder.default(obj)
+
+
+class RapidJSONRenderer(renderers.JSONRenderer):
+    """
+    Same output as JSONRenderer for serializers data, raw datetimes are
+    ISO 8601 with the UTC offset (`+00:00` rather than `Z`)
+
+    Dicts are encoded in their insertion order, which for OrderedDicts
+    ignores `move_to_end()`. Pretty printed output (`; indent=4` and the
+    browsable API) is left to JSONRenderer
+    """
+    datetime_mode = rapidjson.DM_ISO8601
+    number_mode = rapidjson.NM_NAN | rapidjson.NM_DECIMAL
+    uuid_mode = rapidjson.UM_CANONICAL
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) or \
+                not self.compact:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+        ret = rapidjson.dumps(
+            data,
+            ensure_ascii=self.ensure_ascii,
+            default=encode,
+            datetime_mode=self.datetime_mode,
+            number_mode=self.number_mode,
+            uuid_mode=self.uuid_mode,
+        )
+
+        # Same as JSONRenderer, keep the output a strict javascript subset
+        ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return bytes(ret.encode('utf-8'))
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+        return msgpack.packb(data, default=encode, use_bin_type=True)
@@ -0,0 +1,102 @@
+"""Offline seeding helpers for the `random*` commands (`--offline` mode)
+
+Offline data doesn't need the network and is generated from a seed, so
+that the same options give the same database (up to ids and the current
+time). Users, teams, locations and games are inserted with bulk_create,
+the relation tables (roles, team managers, game teams and rsvps) with COPY,
+rsvps of pickup games in parallel processes. Model signals are not sent
+(see the commands for what they do instead)
+"""
+import csv
+from io import BytesIO, StringIO
+from multiprocessing import Pool
+from random import Random
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections
+from PIL import Image, ImageDraw
+
+from .images import make_variants
+
+__all__ = [
+    'DEFAULT_SEED',
+    'copy_rows',
+    'get_random',
+    'make_placeholder_images',
+    'run_chunks',
+]
+
+
+DEFAULT_SEED = 'gfc'
+
+PLACEHOLDERS_DIR = 'placeholders'
+PLACEHOLDER_SIZE = 640
+
+
+def get_random(seed, *keys):
+    """Random generator of the seed, separate one for every key"""
+    return Random(':'.join(map(str, (seed, ) + keys)))
+
+
+def copy_rows(model, columns, rows):
+    """Insert rows with COPY
+
+    copy_rows(RsvpStatus, ['game_id', 'player_id'], [(1, 2), ...])
+    """
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    columns = ', '.join(map(quote_name, columns))
+
+    data = StringIO()
+    csv.writer(data).writerows(rows)
+    data.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', data)
+
+
+def run_chunks(func, chunks, jobs):
+    """Call func(chunk) for every chunk in `jobs` processes
+
+    Database connections are closed first, so that every process opens its
+    own, func has to be a module level function
+    """
+    if jobs <= 1:
+        return [func(chunk) for chunk in chunks]
+
+    connections.close_all()
+    with Pool(jobs) as pool:
+        return pool.map(func, chunks)
+
+
+def make_placeholder_images(field, count, seed=DEFAULT_SEED):
+    """Store `count` generated images for the image field, with variants
+
+    make_placeholder_images(User._meta.get_field('img'), 10) ->
+        [(name, variants), ...]
+    """
+    random = get_random(seed, 'placeholders', field.name)
+    images = []
+    for i in range(count):
+        color = tuple(random.randrange(256) for _ in range(3))
+        image = Image.new('RGB', (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), color)
+        draw = ImageDraw.Draw(image)
+        margin = PLACEHOLDER_SIZE // 4
+        draw.ellipse(
+            [margin, margin, PLACEHOLDER_SIZE - margin,
+             PLACEHOLDER_SIZE - margin],
+            fill=tuple(255 - channel for channel in color),
+        )
+
+        content = BytesIO()
+        image.save(content, 'PNG')
+        name = f'{PLACEHOLDERS_DIR}/{field.name}_{i}.png'
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        name = default_storage.save(name, ContentFile(content.getvalue()))
+
+        images.append(
+            (name, make_variants(field.attr_class(None, field, name))))
+    return images
@@ -1,12 +1,24 @@
 from datetime import timedelta
+from importlib import import_module
 from random import randint
 
 import pytest
 from django.contrib.gis.geos import Point
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from mixer.backend.django import mixer
+from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 
+from .benchmarks import (
+    ENDPOINTS,
+    check_budgets,
+    create_data,
+    load_budgets,
+    measure,
+)
+
 
 __all__ = ['mixer']
 
@@ -44,3 +56,90 @@ def client():
     client.user = mixer.blend('users.User')
     client.force_authenticate(user=client.user)
     return client
+
+
+@pytest.fixture
+def search_vectors(db):
+    """
+    pg_trgm and game search vector triggers, tests run without migrations
+    that add them. Rolled back with the rest of the test
+    """
+    migration = import_module('games.migrations.0013_game_search_vector')
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            'SELECT 1 FROM pg_proc '
+            "WHERE proname = 'games_game_search_vector_update'"
+        )
+        if cursor.fetchone() is None:
+            for sql in migration.SEARCH_VECTOR_TRIGGERS:
+                cursor.execute(sql)
+
+
+@pytest.mark.django_db
+def test_endpoint_queries(settings, tmpdir, search_vectors):
+    settings.MEDIA_ROOT = str(tmpdir)
+    results = {}
+    for scale in 'tiny', 'small':
+        context = create_data(scale)
+        client = APIClient()
+        client.force_authenticate(user=context['user'])
+        results[scale] = {
+            name: measure(client, name, context, repeat=2)
+            for name in ENDPOINTS
+        }
+        for name, result in results[scale].items():
+            assert result['status'] < 400, f'{scale} {name} should succeed'
+
+    grown = [
+        name for name in ENDPOINTS
+        if results['small'][name]['queries'] >
+        results['tiny'][name]['queries']
+    ]
+    assert grown == [], 'Query counts should not grow with the data'
+
+    exceeded = check_budgets(results, load_budgets(), latency=False)
+    assert exceeded == [], \
+        'Endpoints should stay within their recorded query budgets'
+
+
+@pytest.mark.django_db
+def test_server_timing(client):
+    mixer.blend('games.Game')
+
+    with CaptureQueriesContext(connection) as queries:
+        res = client.get(reverse('game-list'))
+    metrics = res['Server-Timing'].split(', ')
+    names = [metric.split(';')[0] for metric in metrics]
+    assert set(names) >= {'permissions', 'queryset', 'serialize', 'sql',
+                          'total'}, 'Should time view steps and queries'
+
+    sql = metrics[names.index('sql')]
+    assert sql.endswith(f';desc="{len(queries)} queries"'), \
+        'Should count every query'
+
+
+@pytest.mark.django_db
+def test_profiler(client, settings, tmpdir):
+    settings.PROFILE_DIR = str(tmpdir)
+    settings.PROFILE_KEEP = 2
+    url = reverse('game-list')
+
+    res = client.get(url, HTTP_X_PROFILE='1')
+    assert 'X-Profile' not in res and not tmpdir.listdir(), \
+        'Only superusers can profile their requests'
+
+    client.user.is_superuser = True
+    names = [client.get(url, HTTP_X_PROFILE='1')['X-Profile']
+             for _ in range(3)]
+    assert sorted(path.basename for path in tmpdir.listdir()) == names[1:], \
+        'Should only keep the newest profiles'
+
+    settings.PROFILE_HEADER = False
+    assert 'X-Profile' not in client.get(url, HTTP_X_PROFILE='1'), \
+        'Header should be ignored when it is off'
+
+    settings.PROFILE_SAMPLE_RATE = 1
+    settings.PROFILE_SLOW_MS = 60 * 1000
+    client.get(url)
+    assert len(tmpdir.listdir()) == 2, 'Should only keep slow requests'
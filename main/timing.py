@@ -0,0 +1,152 @@
+"""Per-request timings in `Server-Timing` headers and the log
+
+ServerTimingMiddleware collects durations of request parts in
+`request.timings` (see Timings):
+
+    sql - queries of every database connection
+    permissions, queryset, serialize - AppViewSet steps (see main.viewsets)
+    total - the whole request, including the middleware below this one
+
+Parts overlap, queries are also counted in the steps that run them. The
+timings are sent in the `Server-Timing` header (shown by browser dev
+tools) and logged as one line to the `app.timing` logger:
+
+    GET /api/games/ 200 total=12.31 sql=3.20 sql_count=4 ...
+
+with the same numbers in the `timings` attribute of the log record.
+Queries are timed by a cursor wrapper, which is what
+`connection.execute_wrapper()` of newer Django versions does
+"""
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+from time import perf_counter
+
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+
+__all__ = ['ServerTimingMiddleware', 'Timings']
+
+
+logger = logging.getLogger('app.timing')
+
+# Timings of the request the thread is handling
+_local = threading.local()
+
+
+class Timings:
+    """Total durations (seconds) and counts of request parts by name"""
+
+    def __init__(self):
+        self.durations = OrderedDict()
+        self.counts = {}
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def wrap(self, name, func):
+        """func that adds the time of its calls to the part"""
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, perf_counter() - start)
+        return timed
+
+    def as_dict(self):
+        """{'sql': ms, 'sql_count': queries, ...}"""
+        data = OrderedDict()
+        for name, duration in self.durations.items():
+            data[name] = round(duration * 1000, 2)
+            if name == 'sql':
+                data['sql_count'] = self.counts[name]
+        return data
+
+    def get_header(self):
+        """Server-Timing header value"""
+        metrics = []
+        for name, duration in self.durations.items():
+            metric = f'{name};dur={duration * 1000:.2f}'
+            if name == 'sql':
+                metric += f';desc="{self.counts[name]} queries"'
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+
+class TimedCursorWrapper(CursorWrapper):
+    """Adds queries of a (wrapped) cursor to the timings"""
+
+    def __init__(self, cursor, db, timings):
+        super().__init__(cursor, db)
+        self.timings = timings
+
+    # The wrapped cursor validates the transaction and wraps errors
+    def execute(self, sql, params=None):
+        start = perf_counter()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self.timings.add('sql', perf_counter() - start)
+
+    def executemany(self, sql, param_list):
+        start = perf_counter()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self.timings.add('sql', perf_counter() - start)
+
+
+def time_queries(connection):
+    """Time cursors the connection makes during timed requests"""
+    if getattr(connection, 'timed_queries', False):
+        return
+
+    prepare_cursor = connection._prepare_cursor
+
+    def _prepare_cursor(cursor):
+        cursor = prepare_cursor(cursor)
+        timings = getattr(_local, 'timings', None)
+        if timings is None:
+            return cursor
+        return TimedCursorWrapper(cursor, connection, timings)
+
+    connection._prepare_cursor = _prepare_cursor
+    connection.timed_queries = True
+
+
+class ServerTimingMiddleware:
+    """Should be the first middleware, so that total is the whole request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Connections are per thread, wrapped once each
+        for connection in connections.all():
+            time_queries(connection)
+
+        request.timings = timings = Timings()
+        _local.timings = timings
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.timings = None
+        timings.add('total', perf_counter() - start)
+
+        response['Server-Timing'] = timings.get_header()
+        if logger.isEnabledFor(logging.INFO):
+            data = timings.as_dict()
+            logger.info(
+                '%s %s %s %s',
+                request.method,
+                request.path,
+                response.status_code,
+                ' '.join(f'{name}={value}' for name, value in data.items()),
+                extra={'timings': data},
+            )
+        return response
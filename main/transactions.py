@@ -0,0 +1,17 @@
+"""Transaction helpers
+
+rolled_back - block in a transaction that is rolled back at the end, for
+    benchmark commands that create their own data
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+__all__ = ['rolled_back']
+
+
+@contextmanager
+def rolled_back(using=None):
+    with transaction.atomic(using=using):
+        yield
+        transaction.set_rollback(True, using=using)
@@ -1,7 +1,11 @@
+from django.conf import settings
 from rest_framework.viewsets import ModelViewSet
 
+from .conditional import ConditionalGetMixin
+from .eager import optimize_queryset
 
-class AppViewSet(ModelViewSet):
+
+class AppViewSet(ConditionalGetMixin, ModelViewSet):
     """
     Customised Django REST Framework's ModelViewSet:
 
@@ -14,9 +18,116 @@ class AppViewSet(ModelViewSet):
                ...
             }
             serializer_class = MyOtherSerializer  # the default serializer
+
+    Same goes for pagination classes:
+
+        MyViewSet(AppViewSet):
+            pagination_classes = {
+                'list': KeysetPagination,     # list action pagination
+                ...
+            }
+            pagination_class = ...            # the default pagination
+
+    Querysets are eager loaded with relations the action's serializer needs
+    (see main.eager), use `optimize_queryset` when overriding `get_queryset`
+    without calling super
+
+    List actions can opt in to fast serializers (see main.fast), GET
+    requests are then served from `values()` rows, when FAST_SERIALIZERS
+    setting is on:
+
+        MyViewSet(AppViewSet):
+            fast_serializer_classes = {
+                'list': MyListFastSerializer,
+                ...
+            }
+
+    Retrieve and list actions answer conditional GET requests when
+    `get_last_modified()` is implemented (see main.conditional)
+
+    Permission checks, querysets and serialization are timed in requests
+    with timings (see main.timing)
     """
+    # Timings of the request, set in initial()
+    timings = None
+
+    # Timed part -> view methods, serializer methods
+    timed_methods = {
+        'permissions': ('check_permissions', 'check_object_permissions'),
+        'queryset': ('get_queryset', 'filter_queryset'),
+    }
+    timed_serializer_methods = {
+        'serialize': ('is_valid', 'load', 'to_representation'),
+    }
+
+    def initial(self, request, *args, **kwargs):
+        self.timings = getattr(request, 'timings', None)
+        if self.timings is not None:
+            # Bound methods are wrapped, so calls to super() aren't timed
+            # again
+            self.time_methods(self, self.timed_methods)
+        super().initial(request, *args, **kwargs)
+
+    def time_methods(self, obj, timed_methods):
+        for name, methods in timed_methods.items():
+            for method in methods:
+                if hasattr(obj, method):
+                    setattr(obj, method,
+                            self.timings.wrap(name, getattr(obj, method)))
+
     def get_serializer_class(self):
         try:
             return self.serializer_classes[self.action]
         except (KeyError, AttributeError):
             return super().get_serializer_class()
+
+    def get_fast_serializer_class(self):
+        request = getattr(self, 'request', None)
+        if not settings.FAST_SERIALIZERS or request is None or \
+                request.method != 'GET':
+            return None
+        try:
+            return self.fast_serializer_classes[self.action]
+        except (KeyError, AttributeError):
+            return None
+
+    def get_serializer(self, *args, **kwargs):
+        fast_serializer_class = self.get_fast_serializer_class()
+        if fast_serializer_class is None:
+            serializer = super().get_serializer(*args, **kwargs)
+        else:
+            kwargs['context'] = self.get_serializer_context()
+            serializer = fast_serializer_class(*args, **kwargs)
+
+        if self.timings is not None:
+            self.time_methods(serializer, self.timed_serializer_methods)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fast_serializer_class = self.get_fast_serializer_class()
+        if fast_serializer_class is None:
+            return queryset
+        return fast_serializer_class.get_values(queryset)
+
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
+    def optimize_queryset(self, queryset):
+        return optimize_queryset(queryset, self.get_serializer_class())
+
+    def get_pagination_class(self):
+        try:
+            return self.pagination_classes[self.action]
+        except (KeyError, AttributeError):
+            return self.pagination_class
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.get_pagination_class()
+            if pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = pagination_class()
+        return self._paginator
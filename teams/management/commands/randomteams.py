@@ -1,8 +1,14 @@
 """Ensure that there are randomly generated teams in the system
+
+With --offline any number of teams is generated from a seed, with players
+and managers picked from the random users (see randomusers)
 """
 from django.core.management.base import BaseCommand, CommandError
 
-from teams.models import Team
+from main.seeding import DEFAULT_SEED, copy_rows, get_random
+from teams.models import Role, Team
+from users.management.commands.randomusers import USERNAME_PREFIX
+from users.models import User, recount_invites
 
 
 NAMES = [
@@ -51,15 +57,53 @@ INFO_PREFIX = 'Test team'
 VERSION = ' v003'
 VERSIONED_PREFIX = INFO_PREFIX + VERSION
 
+# Offline teams
+DEFAULT_PLAYERS = 15
+# Weighted roles of the team players other than the captain
+PLAYER_ROLES = [Role.FIELD] * 10 + [Role.SUBSTITUTE] * 4 + [Role.INVITED]
+BATCH_SIZE = 5000
+
 
 class Command(BaseCommand):
     help = __doc__
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            dest='offline',
+            default=False,
+            help='Generate teams with players',
+        )
+        parser.add_argument(
+            '--count',
+            dest='count',
+            type=int,
+            default=len(NAMES),
+            help='Number of offline teams (Default {}).'.format(len(NAMES)),
+        )
+        parser.add_argument(
+            '--players',
+            dest='players',
+            type=int,
+            default=DEFAULT_PLAYERS,
+            help='Players per offline team (Default {}).'
+                 .format(DEFAULT_PLAYERS),
+        )
+        parser.add_argument(
+            '--seed',
+            dest='seed',
+            default=DEFAULT_SEED,
+            help='Seed of the offline teams (Default {}).'
+                 .format(DEFAULT_SEED),
+        )
+
     def handle(self, *args, **options):
+        count = options['count'] if options['offline'] else len(NAMES)
         teams = Team.objects.filter(info__startswith=INFO_PREFIX)
 
         if (
-            teams.count() >= len(NAMES) > 0 and
+            teams.count() >= count > 0 and
             teams.first().info.startswith(VERSIONED_PREFIX)
         ):
             self.stdout.write('Already enough teams in the system')
@@ -68,9 +112,17 @@ class Command(BaseCommand):
         deleted_count, _ = teams.delete()
         if deleted_count:
             self.stdout.write('Deleted {} records'.format(deleted_count))
-            if len(NAMES) == 0:
+            if count == 0:
                 return
 
+        if options['offline']:
+            self.create_offline_teams(
+                count, options['players'], options['seed'])
+            self.stdout.write(self.style.SUCCESS(
+                'Successfully added "{}" offline teams'.format(count)
+            ))
+            return
+
         for i, name in enumerate(NAMES):
             Team(
                 name=name,
@@ -81,3 +133,40 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(
             'Successfully added "{}" test teams'.format(len(NAMES))
         ))
+
+    def create_offline_teams(self, count, players_count, seed):
+        random = get_random(seed, 'teams')
+        player_ids = list(User.objects
+                          .filter(username__startswith=USERNAME_PREFIX)
+                          .order_by('id')
+                          .values_list('id', flat=True))
+        if len(player_ids) < players_count:
+            raise CommandError('Not enough random users, run randomusers')
+
+        for start in range(0, count, BATCH_SIZE):
+            teams = Team.objects.bulk_create([
+                Team(
+                    name=f'{NAMES[i % len(NAMES)]} {i}',
+                    info=VERSIONED_PREFIX,
+                    type=random.choice(TYPES),
+                )
+                for i in range(start, min(count, start + BATCH_SIZE))
+            ])
+
+            roles = []
+            managers = []
+            for team in teams:
+                captain, *players = random.sample(player_ids, players_count)
+                roles.append((captain, Role.CAPTAIN, team.id))
+                roles.extend(
+                    (player_id, random.choice(PLAYER_ROLES), team.id)
+                    for player_id in players
+                )
+                managers.append((team.id, captain))
+
+            copy_rows(Role, ['player_id', 'role', 'team_id'], roles)
+            copy_rows(Team.managers.through, ['team_id', 'user_id'],
+                      managers)
+
+        # Roles are copied without signals
+        recount_invites()
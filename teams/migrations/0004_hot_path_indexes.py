@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2017-10-02 12:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teams', '0003_auto_20161225_1238'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='role',
+            index=models.Index(fields=['player', 'role'], name='teams_role_player_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='role',
+            index=models.Index(fields=['team', 'role'], name='teams_role_team_role_idx'),
+        ),
+        # Pending team invites (role = INVITED)
+        migrations.RunSQL(
+            'CREATE INDEX teams_role_invited_idx '
+            'ON teams_role (player_id) WHERE role = -1',
+            'DROP INDEX teams_role_invited_idx',
+        ),
+    ]
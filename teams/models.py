@@ -1,10 +1,50 @@
-from datetime import datetime, timedelta
-
+from django.conf import settings
 from django.core.exceptions import MultipleObjectsReturned
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.db import models
-from django.db.transaction import atomic
+from django.db.models import DateTimeField, Max, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from django.db.transaction import atomic, on_commit
 from django.dispatch import receiver
+from django.utils import timezone
+
+
+class TeamQuerySet(models.QuerySet):
+
+    def with_last_modified(self):
+        """Annotate `last_modified`, the latest change of a team details
+
+        Team.modified covers the team itself, its roles and managers,
+        players are changed separately
+        """
+        players = Role.objects\
+            .filter(team=OuterRef('pk'))\
+            .order_by()\
+            .values('team')\
+            .annotate(last_modified=Max('player__modified'))\
+            .values('last_modified')
+        managers = Team.managers.through.objects\
+            .filter(team=OuterRef('pk'))\
+            .order_by()\
+            .values('team')\
+            .annotate(last_modified=Max('user__modified'))\
+            .values('last_modified')
+        return self.annotate(last_modified=Greatest(
+            'modified',
+            Subquery(players, output_field=DateTimeField()),
+            Subquery(managers, output_field=DateTimeField()),
+        ))
+
+    def get_last_modified(self, pk):
+        """Last modification time of a team details or None"""
+        try:
+            queryset = self.filter(pk=pk)
+        except (TypeError, ValueError):
+            return None  # Not a valid id
+        return queryset\
+            .with_last_modified()\
+            .values_list('last_modified', flat=True)\
+            .first()
 
 
 class Team(models.Model):
@@ -13,6 +53,7 @@ class Team(models.Model):
     Fields:
         info (String) - team description
         managers (MtM) - Users with permission to edit or delete the team
+        modified (DateTime) - last change of the team, its roles or managers
         name (String) - unique name of a team
         players (MtM) - Team members, each with a role (see Role)
         slots_female (Int) - number of female players wanted more
@@ -33,6 +74,7 @@ class Team(models.Model):
     info = models.CharField(max_length=1000, null=True, blank=True)
     managers = models.ManyToManyField('users.User',
                                       related_name='managed_teams')
+    modified = models.DateTimeField(auto_now=True)
     name = models.CharField(max_length=30)
     players = models.ManyToManyField('users.User', related_name='teams',
                                      through='Role')
@@ -40,6 +82,8 @@ class Team(models.Model):
     slots_male = models.IntegerField(null=True, default=0)
     type = models.IntegerField(choices=TYPE_CHOICES, default=COED)
 
+    objects = TeamQuerySet.as_manager()
+
     def __str__(self):
         return "{name}".format(name=self.name)
 
@@ -72,27 +116,74 @@ class Role(models.Model):
     class Meta:
         unique_together = 'player', 'team'
         ordering = ['-role']
+        indexes = [
+            # Player's teams and invites, see also partial index on
+            # invites in migration 0004
+            models.Index(
+                fields=['player', 'role'],
+                name='teams_role_player_role_idx',
+            ),
+            # Active team players
+            models.Index(
+                fields=['team', 'role'],
+                name='teams_role_team_role_idx',
+            ),
+        ]
+
+    # Set on new roles when the player's invites to the team games are
+    # left to a celery task (see .tasks)
+    invites_pending = False
+
+    # Role in the database, to keep User.team_invites counters (see
+    # users.models), None for new roles
+    _db_role = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        role = super().from_db(db, field_names, values)
+        role._db_role = role.__dict__.get('role')
+        return role
 
     @atomic
     def save(self, *args, **kwargs):
         new = self.id is None
         role = super().save(*args, **kwargs)
+        self._db_role = self.role
 
         if new:
             # New player. Let's add him to existing games
-            # FIXME: can't import at the top (circular imports)
-            from games.models import RsvpStatus
-            games = self.team.games.filter(datetime__gt=datetime.utcnow())
-
-            for game in games:
-                RsvpStatus.objects.get_or_create(
-                    game=game,
-                    player=self.player,
-                    status=RsvpStatus.INVITED,
-                )
+            self.invite_to_team_games()
 
         return role
 
+    def invite_to_team_games(self):
+        """Invite the player to the team future games
+
+        Done right away unless the team has more future games than
+        TEAM_INVITES_ASYNC_THRESHOLD setting
+        """
+        # FIXME: can't import at the top (circular imports)
+        from games.models import RsvpStatus
+        from .tasks import invite_to_team_games
+
+        threshold = settings.TEAM_INVITES_ASYNC_THRESHOLD
+        if threshold is not None:
+            games_count = self.team.games\
+                .filter(datetime__gt=timezone.now())\
+                .count()
+            if games_count > threshold:
+                self.invites_pending = True
+                team_id, player_id = self.team_id, self.player_id
+                on_commit(lambda: invite_to_team_games.delay(
+                    team_id, player_id))
+                return
+
+        RsvpStatus.objects.invite_to_team_games(self.team_id, self.player_id)
+
+    @atomic
+    def delete(self, *args, **kwargs):
+        return super().delete(*args, **kwargs)
+
 
 @receiver(m2m_changed, sender=Team.managers.through)
 def add_team_creator_as_a_captain(sender, instance, action, **kwargs):
@@ -105,3 +196,24 @@ def add_team_creator_as_a_captain(sender, instance, action, **kwargs):
         return
 
     Role.objects.create(player=creator, team=instance, role=Role.CAPTAIN)
+
+
+def touch_team(team_id):
+    """Bump Team.modified, without Team signals"""
+    Team.objects.filter(id=team_id).update(modified=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Role)
+def role_changed(sender, instance, **kwargs):
+    touch_team(instance.team_id)
+
+
+@receiver(m2m_changed, sender=Team.managers.through)
+def managers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        touch_team(instance.id)
+    elif pk_set:
+        # Changed through user.managed_teams
+        Team.objects.filter(id__in=pk_set).update(modified=timezone.now())
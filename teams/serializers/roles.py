@@ -9,6 +9,7 @@ from rest_framework.serializers import (
 )
 
 from main.exceptions import RelationAlreadyExist
+from main.images import ImageVariantsField
 from ..models import Role
 
 
@@ -22,13 +23,20 @@ class RoleCreateSerializer(ModelSerializer):
     first_name = ReadOnlyField(source='player.first_name')
     last_name = ReadOnlyField(source='player.last_name')
     img = ImageField(source='player.img', read_only=True)
+    img_variants = ImageVariantsField(source='player.img_variants')
 
     class Meta:
         model = Role
-        fields = 'id', 'role', 'role_id', 'first_name', 'last_name', 'img'
+        fields = ('id', 'role', 'role_id', 'first_name', 'last_name', 'img',
+                  'img_variants')
 
     def to_representation(self, obj):
         data = super().to_representation(obj)
+
+        # Player is invited to the team games in the background
+        if obj.invites_pending:
+            data['invites_pending'] = True
+
         request = self.context.get('request', None)
 
         if request and request.accepted_renderer.format == 'api':
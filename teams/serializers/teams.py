@@ -8,6 +8,7 @@ from rest_framework.serializers import (
     ReadOnlyField,
 )
 
+from main.fast import FastSerializer
 from users.serializers import PlayerListSerializer
 from . import RoleSerializer
 from ..models import Team, Role
@@ -17,6 +18,7 @@ __all__ = [
     'MyTeamListSerializer',
     'TeamCreateSerializer',
     'TeamDetailsSerializer',
+    'TeamListFastSerializer',
     'TeamListSerializer',
 ]
 
@@ -36,12 +38,29 @@ class TeamListSerializer(ModelSerializer):
         return data
 
 
+class TeamListFastSerializer(FastSerializer):
+    """TeamListSerializer for `values()` rows (see main.fast)"""
+    serializer_class = TeamListSerializer
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+
+        request = self.context.get('request', None)
+        if request and request.accepted_renderer.format == 'api':
+            data['url'] = reverse('team-detail', (row['pk'], ),
+                                  request=request)
+        return data
+
+
 class MyTeamListSerializer(TeamListSerializer):
     """
     This takes a *Role* object instead of a Team object, but only uses
     status from it, rest of the fields are for respective .team
     """
 
+    class Meta(TeamListSerializer.Meta):
+        select_related = 'team',
+
     def to_representation(self, role: Role):
         data = super().to_representation(role.team)
         data['role'] = role.role
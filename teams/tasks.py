@@ -0,0 +1,16 @@
+"""Teams background tasks"""
+from celery import shared_task
+
+from .models import Role
+
+
+@shared_task
+def invite_to_team_games(team_id, player_id):
+    """Invite a new team player to the team future games (see Role.save)"""
+    # FIXME: can't import at the top (circular imports)
+    from games.models import RsvpStatus
+
+    if not Role.objects.filter(team_id=team_id, player_id=player_id).exists():
+        return 0  # Left the team meanwhile
+
+    return len(RsvpStatus.objects.invite_to_team_games(team_id, player_id))
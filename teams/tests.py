@@ -1,10 +1,15 @@
+from datetime import timedelta
+
 import pytest
+from django.utils import timezone
 from main.tests import mixer, client
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 
+from games.models import RsvpStatus
 from .models import Role, Team
+from .tasks import invite_to_team_games
 
 pytestmark = pytest.mark.django_db
 
@@ -42,6 +47,57 @@ def test_team_retrieve():
         'Should be able to retrieve team info'
 
 
+def test_team_conditional_get(client):
+    team = mixer.blend('teams.Team')
+    url = reverse('team-detail', (team.id, ))
+
+    etag = client.get(url)['ETag']
+    res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert res.status_code == status.HTTP_304_NOT_MODIFIED
+
+    Role.objects.create(team=team, player=client.user)
+    res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert res.status_code == status.HTTP_200_OK, \
+        'Role changes should modify the team'
+
+    etag = res['ETag']
+    team.managers.add(mixer.blend('users.User'))
+    res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert res.status_code == status.HTTP_200_OK, \
+        'Managers changes should modify the team'
+
+
+def test_team_player_games_invites(client, settings):
+    team = mixer.blend('teams.Team', managers=[client.user])
+    games = mixer.cycle(3).blend('games.Game', teams=[team])
+    mixer.blend('games.Game', teams=[team],
+                datetime=timezone.now() - timedelta(1))
+    player = mixer.blend('users.User')
+    RsvpStatus.objects.create(game=games[0], player=player,
+                              status=RsvpStatus.GOING)
+
+    Role.objects.create(team=team, player=player, role=Role.FIELD)
+    rsvps = RsvpStatus.objects.filter(player=player)
+    assert sorted(rsvps.values_list('game_id', 'status')) == sorted([
+        (games[0].id, RsvpStatus.GOING),
+        (games[1].id, RsvpStatus.INVITED),
+        (games[2].id, RsvpStatus.INVITED),
+    ]), 'Should invite to future games, keeping existing rsvps'
+
+    settings.TEAM_INVITES_ASYNC_THRESHOLD = 2
+    player = mixer.blend('users.User')
+    res = client.post(reverse('team-role-list', (team.id, )), {
+        'id': player.id,
+        'role': Role.FIELD,
+    })
+    assert res.status_code == status.HTTP_201_CREATED
+    assert res.data['invites_pending'], \
+        'Invites for big schedules should be left to a background task'
+
+    assert invite_to_team_games(team.id, player.id) == 3
+    assert RsvpStatus.objects.filter(player=player).count() == 3
+
+
 def test_team_add_player():
     player = mixer.blend('users.User')
     team_manager = mixer.blend('users.User')
@@ -9,6 +9,7 @@ from .serializers import (
     RoleSerializer,
     TeamCreateSerializer,
     TeamDetailsSerializer,
+    TeamListFastSerializer,
     TeamListSerializer,
 )
 
@@ -27,23 +28,33 @@ class TeamViewSet(AppViewSet):
         'create': TeamCreateSerializer,
         'retrieve': TeamDetailsSerializer,
     }
+    fast_serializer_classes = {
+        'list': TeamListFastSerializer,
+        'managed': TeamListFastSerializer,
+    }
     search_fields = ('info', 'name')
 
     def get_queryset(self):
         if self.action == 'my':
-            return Role.objects.all().filter(
+            queryset = Role.objects.all().filter(
                 player=self.request.user,
                 role__gt=Role.INVITED,
             )
         elif self.action == 'managed':
-            return self.request.user.managed_teams.all()
+            queryset = self.request.user.managed_teams.all()
         elif self.action == 'invites':
-            return Role.objects.all().filter(
+            queryset = Role.objects.all().filter(
                 player=self.request.user,
                 role=Role.INVITED,
             )
         else:
             return super().get_queryset()
+        return self.optimize_queryset(queryset)
+
+    def get_last_modified(self):
+        if self.action == 'retrieve':
+            return Team.objects.get_last_modified(self.kwargs['pk'])
+        return None
 
     def list(self, *args, **kwargs):
         """Get a list of existing teams or create a new one
@@ -98,4 +109,9 @@ class RoleViewSet(AppViewSet):
     }
 
     def get_queryset(self):
-        return Role.objects.filter(team_id=self.kwargs['team_pk'])
+        return self.optimize_queryset(
+            Role.objects.filter(team_id=self.kwargs['team_pk']))
+
+    def get_last_modified(self):
+        # Any role change bumps the team
+        return Team.objects.get_last_modified(self.kwargs['team_pk'])
@@ -0,0 +1,107 @@
+"""JWT authentication with cached principals (see .principals)
+
+CachedJSONWebTokenAuthentication - loads users from the cache (when it is
+    shared), request.user has only the principal fields loaded, the rest
+    are deferred
+jwt_payload_handler - adds the user token version to the tokens
+jwt_get_username_from_payload_handler - rejects tokens of an old version
+    on token refresh and verify
+"""
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import ugettext as _
+from rest_framework import exceptions
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+from rest_framework_jwt.utils import jwt_payload_handler as default_handler
+
+from teams.models import Team
+from .models import User
+from .principals import (
+    CACHE_TIMEOUT,
+    PRINCIPAL_FIELDS,
+    get_principal_cache_key,
+    principals_cached,
+)
+
+__all__ = [
+    'CachedJSONWebTokenAuthentication',
+    'jwt_get_username_from_payload_handler',
+    'jwt_payload_handler',
+]
+
+
+def jwt_payload_handler(user):
+    payload = default_handler(user)
+    payload['token_version'] = user.token_version
+    return payload
+
+
+def jwt_get_username_from_payload_handler(payload):
+    """Username of the token, None when the token was revoked"""
+    username = payload.get('username')
+    current = User.objects\
+        .filter(username=username)\
+        .filter(token_version=payload.get('token_version', 0))\
+        .exists()
+    return username if current else None
+
+
+def load_principal(user_id):
+    """Principal of the user from the database or None"""
+    principal = User.objects\
+        .filter(pk=user_id)\
+        .values(*PRINCIPAL_FIELDS)\
+        .first()
+    if principal is not None:
+        principal['managed_team_ids'] = list(
+            Team.managers.through.objects
+            .filter(user_id=user_id)
+            .values_list('team_id', flat=True)
+        )
+    return principal
+
+
+class CachedJSONWebTokenAuthentication(JSONWebTokenAuthentication):
+    """
+    Same as JSONWebTokenAuthentication, but users are loaded from the
+    database only when their principal is not cached
+    """
+
+    def authenticate_credentials(self, payload):
+        user_id = payload.get('user_id')
+        if user_id is None:
+            msg = _('Invalid payload.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        # Tokens issued before the versions were added
+        token_version = payload.get('token_version', 0)
+        key = get_principal_cache_key(user_id, token_version)
+
+        cached = principals_cached()
+        principal = cache.get(key) if cached else None
+        if principal is None:
+            principal = load_principal(user_id)
+            if principal is None or \
+                    principal['token_version'] != token_version:
+                msg = _('Invalid signature.')
+                raise exceptions.AuthenticationFailed(msg)
+            if cached:
+                cache.set(key, principal, CACHE_TIMEOUT)
+
+        if not principal['is_active']:
+            msg = _('User account is disabled.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        # Values go in the model fields order, the rest are deferred
+        field_names = [
+            field.attname
+            for field in User._meta.concrete_fields
+            if field.attname in PRINCIPAL_FIELDS
+        ]
+        user = User.from_db(
+            DEFAULT_DB_ALIAS,
+            field_names,
+            [principal[name] for name in field_names],
+        )
+        user.managed_team_ids = principal['managed_team_ids']
+        return user
@@ -7,6 +7,11 @@ class EmailOrUsernameAuthBackend(ModelBackend):
     """
     Allows use of either username or email.
 
+    Both lookups are served by unique indexes (username and
+    normalized_email), so there are at most two matching users and only
+    one password is checked per successful attempt. Failed ones also check
+    accounts with a duplicate email, which have no normalized_email
+
     Thanks https://stackoverflow.com/a/35836674/723891
     """
 
@@ -14,17 +19,38 @@ class EmailOrUsernameAuthBackend(ModelBackend):
         UserModel = get_user_model()
         if username is None:
             username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None:
+            return None
+
         # `username` field does not restring using `@`, so technically
-        # email can be as username and email, even with different users
+        # email can be as username and email, even with different users,
+        # username match wins then
+        email = username.lower().strip()
         users = UserModel._default_manager.filter(
             Q(**{UserModel.USERNAME_FIELD: username}) |
-            Q(**{f'{UserModel.EMAIL_FIELD}__iexact': username})
+            Q(normalized_email=email)
         )
-        # check for any password match
-        for user in users:
-            if user.check_password(password):
-                return user
-        if not users:
+        user = min(
+            users,
+            key=lambda user: user.get_username() != username,
+            default=None,
+        )
+        if user is not None and user.check_password(password):
+            return user
+
+        # Newer accounts that shared an email before it had to be unique
+        # have no normalized_email (see users/0011 migration)
+        duplicates = []
+        if email:
+            duplicates = UserModel._default_manager.filter(
+                normalized_email=None,
+                **{f'{UserModel.EMAIL_FIELD}__iexact': email}
+            )
+        for duplicate in duplicates:
+            if duplicate.check_password(password):
+                return duplicate
+
+        if user is None and not duplicates:
             # Run the default password hasher once to reduce the timing
             # difference between an existing and a non-existing user (#20760).
             UserModel().set_password(password)
@@ -0,0 +1,102 @@
+"""Measure login throughput
+
+Creates users (inside a transaction that is rolled back at the end) and
+times EmailOrUsernameAuthBackend.authenticate with a username, an email,
+a wrong password and an unknown user, plus the JWT obtain view, which goes
+through the same backend. Password hashing dominates, so a login should
+cost one hash and one query no matter how many users there are
+"""
+import json
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework_jwt.views import obtain_jwt_token
+
+from main.transactions import rolled_back
+from users.backends import EmailOrUsernameAuthBackend
+from users.models import User
+
+
+DEFAULT_USERS = 10000
+DEFAULT_REPEAT = 20
+
+USERNAME_PREFIX = '_benchlogin'
+PASSWORD = 'benchmark password'
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            dest='users',
+            type=int,
+            default=DEFAULT_USERS,
+            help='Number of users in the table (Default {}).'
+                 .format(DEFAULT_USERS),
+        )
+        parser.add_argument(
+            '--repeat',
+            dest='repeat',
+            type=int,
+            default=DEFAULT_REPEAT,
+            help='Logins per measurement (Default {}).'.format(DEFAULT_REPEAT),
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:>16} {:>10} {:>10} {:>10}'.format(
+            'login', 'ms', 'per sec', 'queries'))
+
+        with rolled_back():
+            user = self.create_data(options['users'])
+            backend = EmailOrUsernameAuthBackend()
+            factory = RequestFactory()
+            credentials = json.dumps({
+                'username': user.email,
+                'password': PASSWORD,
+            })
+            cases = [
+                ('username', lambda: backend.authenticate(
+                    username=user.username, password=PASSWORD)),
+                ('email', lambda: backend.authenticate(
+                    username=user.email.upper(), password=PASSWORD)),
+                ('wrong password', lambda: backend.authenticate(
+                    username=user.username, password='wrong')),
+                ('unknown user', lambda: backend.authenticate(
+                    username='unknown', password=PASSWORD)),
+                ('jwt obtain', lambda: obtain_jwt_token(factory.post(
+                    '/api/auth/jwt/', credentials,
+                    content_type='application/json'))),
+            ]
+            for name, login in cases:
+                ms, queries = self.measure(login, options['repeat'])
+                self.stdout.write('{:>16} {:>10.2f} {:>10.1f} {:>10}'
+                                  .format(name, ms, 1000 / ms, queries))
+
+    def create_data(self, count):
+        user = User(username=f'{USERNAME_PREFIX}0')
+        user.set_password(PASSWORD)
+        User.objects.bulk_create([
+            User(
+                username=f'{USERNAME_PREFIX}{i}',
+                email=f'{USERNAME_PREFIX}{i}@example.com',
+                normalized_email=f'{USERNAME_PREFIX}{i}@example.com',
+                password=user.password,
+            )
+            for i in range(count)
+        ], batch_size=5000)
+        return User.objects.get(username=user.username)
+
+    def measure(self, login, repeat):
+        times = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(repeat):
+                start = perf_counter()
+                login()
+                times.append(perf_counter() - start)
+        return median(times) * 1000, len(queries) // repeat
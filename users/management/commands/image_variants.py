@@ -0,0 +1,45 @@
+"""Make variants (thumbnails) of users images that don't have them yet
+
+Variants are made by celery tasks, the same ones as for new images (see
+User.save), or right away with --sync
+"""
+from django.core.management.base import BaseCommand
+
+from users.models import User
+from users.tasks import make_image_variants
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            dest='all',
+            action='store_true',
+            help='Remake the existing variants too (after VARIANT_SIZES '
+                 'changes, etc...)',
+        )
+        parser.add_argument(
+            '--sync',
+            dest='sync',
+            action='store_true',
+            help='Make variants in this process rather than in celery',
+        )
+
+    def handle(self, *args, **options):
+        task = make_image_variants if options['sync'] else \
+            make_image_variants.delay
+
+        for field in User.IMAGE_FIELDS:
+            users = User.objects\
+                .exclude(**{f'{field}__isnull': True})\
+                .exclude(**{field: ''})
+            if not options['all']:
+                users = users.filter(**{f'{field}_variants': {}})
+
+            count = 0
+            for user_id, name in users.values_list('id', field).iterator():
+                task(user_id, field, name)
+                count += 1
+            self.stdout.write(f'{field}: {count} images')
@@ -1,18 +1,23 @@
 """Ensure that there are randomly generated users in the system
 
-Data is acquired using https://randomuser.me ♥
+Data is acquired using https://randomuser.me ♥, or generated locally from
+a seed with --offline, which is the way to go for big load test databases
+(every offline user has the OFFLINE_PASSWORD and one of a few generated
+profile pictures)
 
 These users have special prefix in their usernames to tell them apart from
 other accounts you may have and in the system, in case there is a need to
 remove or update the data
 """
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 import requests
+from django.contrib.auth.hashers import make_password
 from django.core.files import File
 from django.core.files.temp import NamedTemporaryFile
 from django.core.management.base import BaseCommand, CommandError
 
+from main.seeding import DEFAULT_SEED, get_random, make_placeholder_images
 from users.models import User
 
 
@@ -49,6 +54,19 @@ VERSIONED_PREFIX = USERNAME_PREFIX + VERSION
 # parameters available for their api
 API_URL = 'https://randomuser.me/api/?results={count}&seed=gfc&nat=us'
 
+# Offline users
+FIRST_NAMES = {
+    User.FEMALE: ['Alice', 'Emma', 'Grace', 'Julia', 'Maria', 'Olivia',
+                  'Sophia', 'Zoe'],
+    User.MALE: ['Alex', 'Ben', 'David', 'James', 'Leo', 'Noah', 'Oscar',
+                'Sam'],
+}
+LAST_NAMES = ['Brown', 'Davis', 'Garcia', 'Johnson', 'Jones', 'Lopez',
+              'Miller', 'Smith', 'Taylor', 'Wilson']
+OFFLINE_PASSWORD = 'password'
+PLACEHOLDERS_COUNT = 16
+BATCH_SIZE = 5000
+
 
 class Command(BaseCommand):
     help = __doc__
@@ -62,10 +80,24 @@ class Command(BaseCommand):
             help='Number of random users desired in the system '
                  '(Default {}).'.format(DEFAULT_COUNT),
         )
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            dest='offline',
+            default=False,
+            help='Generate users locally, without the count limit',
+        )
+        parser.add_argument(
+            '--seed',
+            dest='seed',
+            default=DEFAULT_SEED,
+            help='Seed of the offline users (Default {}).'
+                 .format(DEFAULT_SEED),
+        )
 
     def handle(self, *args, **options):
         count = options['count']
-        if count > 5000:
+        if count > 5000 and not options['offline']:
             raise CommandError('Can\'t be more than 5000 users')
 
         users = User.objects.filter(username__startswith=USERNAME_PREFIX)
@@ -82,6 +114,13 @@ class Command(BaseCommand):
             if count == 0:
                 return
 
+        if options['offline']:
+            self.create_offline_users(count, options['seed'])
+            self.stdout.write(self.style.SUCCESS(
+                'Successfully added "{}" offline users'.format(count)
+            ))
+            return
+
         url = API_URL.format(count=options['count'])
         response = requests.get(url)
         data = response.json()
@@ -121,3 +160,35 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(
             'Successfully added "{}" random users'.format(options['count'])
         ))
+
+    def create_offline_users(self, count, seed):
+        random = get_random(seed, 'users')
+        password = make_password(OFFLINE_PASSWORD)
+        images = make_placeholder_images(
+            User._meta.get_field('img'), PLACEHOLDERS_COUNT, seed)
+        today = date.today()
+
+        for start in range(0, count, BATCH_SIZE):
+            users = []
+            for i in range(start, min(count, start + BATCH_SIZE)):
+                gender = random.choice([User.FEMALE, User.MALE])
+                username = f'{VERSIONED_PREFIX}offline{i}'
+                img, img_variants = random.choice(images)
+                users.append(User(
+                    bio=random.choice(BIOS),
+                    birthday=today - timedelta(
+                        days=random.randrange(18 * 365, 50 * 365)),
+                    email=f'{username}@example.com',
+                    first_name=random.choice(FIRST_NAMES[gender]),
+                    gender=gender,
+                    img=img,
+                    img_variants=img_variants,
+                    last_name=random.choice(LAST_NAMES),
+                    normalized_email=f'{username}@example.com',
+                    password=password,
+                    phone=''.join(
+                        str(random.randrange(10)) for _ in range(10)),
+                    profile_complete=True,
+                    username=username,
+                ))
+            User.objects.bulk_create(users)
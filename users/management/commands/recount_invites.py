@@ -0,0 +1,16 @@
+"""Fix users invites counters (User.game_invites and User.team_invites)
+
+Counters are updated along with rsvps and roles, this recounts the actual
+pending invites for every user and saves the counters that differ
+"""
+from django.core.management.base import BaseCommand
+
+from users.models import recount_invites
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def handle(self, *args, **options):
+        fixed = recount_invites()
+        self.stdout.write('Fixed invites counters of {} users'.format(fixed))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0015_invitejob'),
+        ('teams', '0005_team_modified'),
+        ('users', '0009_user_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='game_invites',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='team_invites',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        # Count the existing invites (status and role INVITED = -1)
+        migrations.RunSQL(
+            'UPDATE users_user SET '
+            'game_invites = (SELECT count(*) FROM games_rsvpstatus '
+            '    WHERE player_id = users_user.id AND status = -1), '
+            'team_invites = (SELECT count(*) FROM teams_role '
+            '    WHERE player_id = users_user.id AND role = -1)',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_user_invites'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='normalized_email',
+            field=models.EmailField(editable=False, max_length=254, null=True),
+        ),
+        migrations.RunSQL(
+            'UPDATE users_user SET '
+            "email = lower(trim(email)), "
+            "normalized_email = nullif(lower(trim(email)), '')",
+            migrations.RunSQL.noop,
+        ),
+        # Only the oldest account keeps a duplicate email unique, the others
+        # still log in by email (see users.backends)
+        migrations.RunSQL(
+            'UPDATE users_user SET normalized_email = NULL '
+            'WHERE EXISTS (SELECT 1 FROM users_user AS older '
+            '    WHERE older.normalized_email = users_user.normalized_email '
+            '    AND older.id < users_user.id)',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='normalized_email',
+            field=models.EmailField(editable=False, max_length=254, null=True, unique=True),
+        ),
+    ]
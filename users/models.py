@@ -1,11 +1,21 @@
+from collections import defaultdict
+from functools import partial
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.postgres.fields import JSONField
+from django.db import IntegrityError, connection, models
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.db.transaction import atomic, on_commit
+from django.dispatch import receiver
+from django.utils.functional import cached_property
 from timezone_field import TimeZoneField
 from rest_framework.exceptions import ValidationError
 from rest_framework.status import HTTP_409_CONFLICT
 
 from games.models import RsvpStatus
-from teams.models import Role
+from teams.models import Role, Team
+from .principals import forget_principals
 
 
 class User(AbstractUser):
@@ -15,13 +25,29 @@ class User(AbstractUser):
         bio (Text) - "about me" summary
         birthday (Date) - date of birth to calculate age
         cover (Image) - profile cover image
+        cover_variants (JSON) - resized cover images (see main.images)
+        game_invites (Int) - number of pending game invites
         gender (String) - 'M' or 'F' to look up in the search
         img (Image) - profile picture
+        img_variants (JSON) - resized profile pictures (see main.images)
+        modified (DateTime) - last profile change
+        normalized_email (String) - lowercase email or null when blank,
+            unique (null for newer accounts that already had a duplicate)
         phone (String) - phone number
         profile_complete (Bool) - profile is complete flag
+        team_invites (Int) - number of pending team invites
         timezone (Timezone) - users timezone
+        token_version (Int) - JWT tokens of older versions are revoked
+
+    Invites counters are kept up to date by RsvpStatus and Role changes
+    (see below) and left out of updates by saves, which would write back
+    stale values. `manage.py recount_invites` fixes them if they drift
+
+    Image variants are made by celery tasks whenever images change,
+    `manage.py image_variants` makes the missing ones
 
-    Also, the email should be blank or unique
+    Also, the email should be blank or unique, which is enforced by the
+    normalized_email unique constraint
     """
     FEMALE = 'F'
     MALE = 'M'
@@ -34,12 +60,26 @@ class User(AbstractUser):
     bio = models.TextField(blank=True, max_length=1000, default='')
     birthday = models.DateField(null=True)
     cover = models.ImageField(null=True)
+    cover_variants = JSONField(default=dict, editable=False)
     email = models.EmailField(blank=True)
+    game_invites = models.IntegerField(default=0, editable=False)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, null=True)
     img = models.ImageField(null=True)
+    img_variants = JSONField(default=dict, editable=False)
+    modified = models.DateTimeField(auto_now=True)
+    normalized_email = models.EmailField(null=True, unique=True,
+                                         editable=False)
     phone = models.CharField(max_length=12, null=True, blank=True)
     profile_complete = models.BooleanField(default=False)
+    team_invites = models.IntegerField(default=0, editable=False)
     timezone = TimeZoneField(default='UTC')
+    token_version = models.IntegerField(default=0, editable=False)
+
+    # Image fields with variants
+    IMAGE_FIELDS = 'img', 'cover'
+
+    # Fields changed in the database only (see add_invites)
+    COUNTER_FIELDS = 'game_invites', 'team_invites'
 
     class Meta(AbstractUser.Meta):
         pass
@@ -49,23 +89,221 @@ class User(AbstractUser):
 
         player.get_invites_counts() -> (total, games, teams)
         """
-        game_invites = self.rsvps.filter(status=RsvpStatus.INVITED).count()
-        team_invites = self.role_set.filter(role=Role.INVITED).count()
+        return (
+            self.game_invites + self.team_invites,
+            self.game_invites,
+            self.team_invites,
+        )
 
-        return game_invites + team_invites, game_invites, team_invites
+    # Email, token version and image names in the database, see save(),
+    # None for new users
+    _db_email = None
+    _db_token_version = None
+    _db_images = {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._db_email = user.__dict__.get('email')
+        user._db_token_version = user.__dict__.get('token_version')
+        user._db_images = {
+            name: user.__dict__.get(name) or None
+            for name in cls.IMAGE_FIELDS
+            if name in user.__dict__
+        }
+        return user
+
+    def get_changed_images(self, update_fields=None):
+        """Names of image fields that differ from the database"""
+        deferred = self.get_deferred_fields()
+        return [
+            name for name in self.IMAGE_FIELDS
+            if name not in deferred
+            and (update_fields is None or name in update_fields)
+            and (getattr(self, name).name or None) !=
+            self._db_images.get(name)
+        ]
+
+    @cached_property
+    def managed_team_ids(self):
+        """Set from the cached principal for JWT authenticated users"""
+        return list(self.managed_teams.values_list('id', flat=True))
+
+    def revoke_tokens(self):
+        """Invalidate JWT tokens issued so far, once the user is saved"""
+        self.token_version += 1
 
     def save(self, *args, **kwargs):
+        # FIXME: can't import at the top (circular imports)
+        from .tasks import make_image_variants
+
+        update_fields = kwargs.get('update_fields')
+
+        # Variants of the new images are made after the save
+        images = self.get_changed_images(update_fields)
+        for name in images:
+            setattr(self, f'{name}_variants', {})
+        if update_fields is not None and images:
+            kwargs['update_fields'] = update_fields = {
+                *update_fields, *(f'{name}_variants' for name in images)}
+
+        if self.email == self._db_email or \
+                update_fields is not None and 'email' not in update_fields:
+            # Email is not changed, no need to check it
+            super().save(*args, **kwargs)
+        else:
+            self.save_email(*args, **kwargs)
+
+        for name in images:
+            file_name = getattr(self, name).name
+            self._db_images = {**self._db_images, name: file_name or None}
+            if file_name:
+                on_commit(partial(
+                    make_image_variants.delay, self.id, name, file_name))
+
+        # Cached principal is stale now (see .principals)
+        if self._db_token_version is not None:
+            forget_principals({self.id: self._db_token_version})
+        if update_fields is None or 'token_version' in update_fields:
+            self._db_token_version = self.token_version
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        # Counters are left out of the UPDATE, a missing row is still
+        # inserted with them
+        values = [
+            value for value in values
+            if value[0].name not in self.COUNTER_FIELDS
+        ]
+        return super()._do_update(
+            base_qs, using, pk_val, values, update_fields, forced_update)
+
+    def save_email(self, *args, **kwargs):
+        """Save with a new email, which should be blank or unique"""
         self.email = self.email.lower().strip()
+        self.normalized_email = self.email or None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'normalized_email'}
+
+        try:
+            # Savepoint, so that the outer transaction is still usable
+            with atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError as e:
+            if 'normalized_email' not in str(e):
+                raise
+            raise ValidationError({
+                'email': ['A user with that email already exists.'],
+            }, code=HTTP_409_CONFLICT)
+
+        self._db_email = self.email
+
+
+def add_invites(field, counts):
+    """Add to invites counters of the users
+
+    add_invites('game_invites', {user_id: number, ...})
+    """
+    user_ids = defaultdict(list)
+    for user_id, number in counts.items():
+        if number:
+            user_ids[number].append(user_id)
+
+    for number, ids in user_ids.items():
+        User.objects\
+            .filter(id__in=sorted(ids))\
+            .update(**{field: F(field) + number})
+
+
+def recount_invites():
+    """Fix invites counters that differ from the actual invites, in one
+    statement
+
+    recount_invites() -> number of users fixed
+    """
+    quote_name = connection.ops.quote_name
+    users = quote_name(User._meta.db_table)
+    rsvps = quote_name(RsvpStatus._meta.db_table)
+    roles = quote_name(Role._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {users} AS u SET '
+            'game_invites = counts.game_invites, '
+            'team_invites = counts.team_invites '
+            'FROM ('
+            '    SELECT player.id, '
+            '    coalesce(games.count, 0) AS game_invites, '
+            '    coalesce(teams.count, 0) AS team_invites '
+            f'    FROM {users} AS player '
+            '    LEFT JOIN ('
+            f'        SELECT player_id, count(*) FROM {rsvps} '
+            '        WHERE status = %s GROUP BY player_id'
+            '    ) AS games ON games.player_id = player.id '
+            '    LEFT JOIN ('
+            f'        SELECT player_id, count(*) FROM {roles} '
+            '        WHERE role = %s GROUP BY player_id'
+            '    ) AS teams ON teams.player_id = player.id'
+            ') AS counts '
+            'WHERE u.id = counts.id '
+            'AND (u.game_invites, u.team_invites) <> '
+            '(counts.game_invites, counts.team_invites)',
+            [RsvpStatus.INVITED, Role.INVITED],
+        )
+        return cursor.rowcount
+
+
+def get_invites_change(old, new, invited):
+    """Counter change when a status or role changes from old to new"""
+    return (new == invited) - (old == invited)
+
+
+@receiver(post_save, sender=RsvpStatus)
+def rsvp_saved(sender, instance, **kwargs):
+    add_invites('game_invites', {instance.player_id: get_invites_change(
+        instance._db_status, instance.status, RsvpStatus.INVITED)})
+
+
+@receiver(post_delete, sender=RsvpStatus)
+def rsvp_deleted(sender, instance, **kwargs):
+    add_invites('game_invites', {instance.player_id: get_invites_change(
+        instance._db_status, None, RsvpStatus.INVITED)})
+
+
+@receiver(post_save, sender=Role)
+def role_saved(sender, instance, **kwargs):
+    add_invites('team_invites', {instance.player_id: get_invites_change(
+        instance._db_role, instance.role, Role.INVITED)})
+
+
+@receiver(post_delete, sender=Role)
+def role_deleted(sender, instance, **kwargs):
+    add_invites('team_invites', {instance.player_id: get_invites_change(
+        instance._db_role, None, Role.INVITED)})
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if instance._db_token_version is not None:
+        forget_principals({instance.id: instance._db_token_version})
 
-        if self.email != '':
-            same_email_count = User.objects.filter(email=self.email).count()
 
-            if self.id:
-                same_email_count -= 1
+@receiver(m2m_changed, sender=Team.managers.through)
+def managers_principals(sender, instance, action, reverse, pk_set, **kwargs):
+    """Managed team ids of the principals change"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
 
-            if same_email_count > 0:
-                raise ValidationError({
-                    'email': ['A user with that email already exists.'],
-                }, code=HTTP_409_CONFLICT)
+    if reverse:
+        user_ids = [instance.id]
+    elif action == 'pre_clear':
+        user_ids = instance.managers.values_list('id', flat=True)
+    else:
+        user_ids = pk_set
 
-        return super().save(*args, **kwargs)
+    forget_principals(dict(
+        User.objects
+        .filter(id__in=user_ids)
+        .values_list('id', 'token_version')
+    ))
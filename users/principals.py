@@ -0,0 +1,76 @@
+"""Cached principals of JWT authenticated users (see .authentication)
+
+A principal is what authentication and permissions need to know about a
+user: the fields below and ids of the teams the user manages. Principals
+are keyed by user id and token version, so tokens issued before the
+version is bumped (password change, deactivation) don't match them any
+more.
+
+Saving or deleting a user and changing team managers forget the
+principals. The cache has to be shared by every API process (see CACHES),
+otherwise other processes keep letting revoked tokens through, so
+principals aren't cached in per-process caches (see CACHE_PRINCIPALS)
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+__all__ = [
+    'PRINCIPAL_FIELDS',
+    'forget_principals',
+    'get_principal_cache_key',
+    'principals_cached',
+]
+
+
+# Principal cache timeout in seconds
+CACHE_TIMEOUT = 60 * 60
+
+PRINCIPAL_FIELDS = (
+    'id',
+    'username',
+    'is_active',
+    'is_superuser',
+    'token_version',
+)
+
+# Caches every process has its own copy of
+LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+def principals_cached():
+    """CACHE_PRINCIPALS setting, when None - whether the cache is shared"""
+    if settings.CACHE_PRINCIPALS is not None:
+        return settings.CACHE_PRINCIPALS
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def get_principal_cache_key(user_id, token_version):
+    return f'users:principal:{user_id}:{token_version}'
+
+
+def delete_principals(keys):
+    cache.delete_many(keys)
+
+
+def forget_principals(token_versions):
+    """Remove principals of the users from the cache
+
+    Removed right away and once again after the transaction commits, so
+    requests running meanwhile can't cache data that is about to change
+
+    Args:
+        token_versions - user id -> token version of the cached principal
+    """
+    keys = [
+        get_principal_cache_key(user_id, token_version)
+        for user_id, token_version in token_versions.items()
+    ]
+    if not keys:
+        return
+
+    delete_principals(keys)
+    transaction.on_commit(lambda: delete_principals(keys))
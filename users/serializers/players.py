@@ -1,5 +1,6 @@
 from rest_framework.serializers import ModelSerializer
 
+from main.images import ImageVariantsField
 from ..models import User
 
 
@@ -7,14 +8,18 @@ __all__ = ['PlayerListSerializer', 'PlayerDetailsSerializer']
 
 
 class PlayerListSerializer(ModelSerializer):
+    img_variants = ImageVariantsField()
 
     class Meta:
         model = User
-        fields = 'id', 'bio', 'first_name', 'img', 'last_name'
+        fields = 'id', 'bio', 'first_name', 'img', 'img_variants', 'last_name'
 
 
 class PlayerDetailsSerializer(ModelSerializer):
+    cover_variants = ImageVariantsField()
+    img_variants = ImageVariantsField()
 
     class Meta:
         model = User
-        fields = 'id', 'bio', 'cover', 'first_name', 'img', 'last_name'
+        fields = ('id', 'bio', 'cover', 'cover_variants', 'first_name', 'img',
+                  'img_variants', 'last_name')
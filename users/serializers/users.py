@@ -1,5 +1,7 @@
 from rest_framework.serializers import ModelSerializer, CharField
+from rest_framework_jwt.settings import api_settings
 
+from main.images import ImageVariantsField
 from ..models import User
 from teams.views import TeamListSerializer
 from games.views import GameListSerializer
@@ -7,13 +9,18 @@ from games.views import GameListSerializer
 
 __all__ = ['UserSerializer', 'CurrentUserSerializer']
 
+jwt_encode_handler = api_settings.JWT_ENCODE_HANDLER
+jwt_payload_handler = api_settings.JWT_PAYLOAD_HANDLER
+
 
 class UserSerializer(ModelSerializer):
+    cover_variants = ImageVariantsField()
+    img_variants = ImageVariantsField()
 
     class Meta:
         model = User
-        fields = ('id', 'bio', 'birthday', 'cover', 'first_name',
-                  'gender', 'img', 'last_name')
+        fields = ('id', 'bio', 'birthday', 'cover', 'cover_variants',
+                  'first_name', 'gender', 'img', 'img_variants', 'last_name')
 
 
 class CurrentUserSerializer(UserSerializer):
@@ -31,6 +38,10 @@ class CurrentUserSerializer(UserSerializer):
     def to_representation(self, user: User):
         data = super().to_representation(user)
 
+        token = getattr(user, 'token', None)
+        if token is not None:
+            data['token'] = token
+
         inv_total, inv_games, inv_teams = user.get_invites_counts()
         if inv_total:
             data['invites'] = {'total': inv_total}
@@ -45,4 +56,9 @@ class CurrentUserSerializer(UserSerializer):
         new_password = validated_data.pop('password', None)
         if new_password:
             instance.set_password(new_password)
-        return super().update(instance, validated_data)
+            instance.revoke_tokens()
+        user = super().update(instance, validated_data)
+        if new_password:
+            # The token in use is revoked, the client gets a new one
+            user.token = jwt_encode_handler(jwt_payload_handler(user))
+        return user
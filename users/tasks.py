@@ -0,0 +1,169 @@
+"""Users background tasks"""
+import logging
+import pprint
+from datetime import date
+
+import requests
+from celery import shared_task
+from django.conf import settings
+from django.core.files import File
+from django.core.files.temp import NamedTemporaryFile
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from rest_framework.exceptions import ValidationError
+
+from main.images import make_variants
+from .models import User
+
+
+FB_FIELDS = 'timezone,gender,email,birthday,picture.width(640),cover'
+
+# Seconds to wait for Facebook to connect and to send some data
+TIMEOUT = 10
+
+# Images are written to the storage by chunks of that many bytes
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger('app.users.tasks')
+
+_session = None
+
+
+def get_session():
+    """HTTP session of the worker process, keeps connections to Facebook"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=10)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def parse_birthday(birthday):
+    """Facebook birthday, it's either MM/DD/YYYY or MM/DD or YYYY"""
+    birthday = list(map(int, birthday.split('/')))
+
+    day = month = 1
+    year = 1900
+
+    try:
+        year = birthday[-1]
+        month, day = birthday[0:2]
+        month, day, year = birthday
+    except ValueError:  # When there's not enough values to unpack
+        pass
+
+    return date(year=year, month=month, day=day)
+
+
+def save_image(field, url):
+    """Download an image into the image field (without saving the model)"""
+    filename = url.split('/')[-1].split('?', 1)[0]
+
+    response = get_session().get(url, stream=True, timeout=TIMEOUT)
+    try:
+        response.raise_for_status()
+        with NamedTemporaryFile() as temp:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                temp.write(chunk)
+            temp.flush()
+            field.save(filename, File(temp), save=False)
+    finally:
+        response.close()
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def fetch_facebook_details(self, user_id, access_token):
+    """Fill in user details from Facebook Graph API
+
+    Only fields the user doesn't have yet are set (except for gender), so
+    it is safe to run again
+
+    Returns names of the updated fields
+    """
+    try:
+        response = get_session().get(
+            f'{settings.FACEBOOK_GRAPH_URL}/me',
+            params={'fields': FB_FIELDS, 'access_token': access_token},
+            timeout=TIMEOUT,
+        )
+        response.raise_for_status()
+        data = response.json()
+    except requests.RequestException as exc:
+        raise self.retry(exc=exc)
+
+    logger.debug(pprint.pformat(data))
+
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return []
+
+    updates = {}
+
+    if not user.email and data.get('email'):
+        updates['email'] = data['email']
+
+    gender = {
+        'male': User.MALE,
+        'female': User.FEMALE,
+    }.get(data.get('gender'))
+    if gender and gender != user.gender:
+        updates['gender'] = gender
+
+    # TODO: Facebook API gives you users current UTC offset as a
+    # "timezone" and getting an actual timezone from it is non-trivial
+    # so setting it for later
+    # if 'timezone' in data:
+    #     user.timezone = data['timezone']
+
+    if not user.birthday and 'birthday' in data:
+        updates['birthday'] = parse_birthday(data['birthday'])
+
+    for name in updates:
+        setattr(user, name, updates[name])
+
+    images = [
+        ('img', data.get('picture', {}).get('data', {}).get('url')),
+        ('cover', data.get('cover', {}).get('source')),
+    ]
+    try:
+        for name, url in images:
+            if url and not getattr(user, name).name:
+                save_image(getattr(user, name), url)
+                updates[name] = url
+    except requests.RequestException as exc:
+        raise self.retry(exc=exc)
+
+    if not updates:
+        return []
+
+    try:
+        user.save(update_fields=list(updates))
+    except ValidationError:
+        # Email belongs to another account
+        del updates['email']
+        user.email = ''
+        if updates:
+            user.save(update_fields=list(updates))
+
+    return sorted(updates)
+
+
+@shared_task
+def make_image_variants(user_id, field, name):
+    """Make variants of the user image (see User.save)
+
+    Returns variant names or None when the image was changed meanwhile
+    """
+    user = User.objects.filter(id=user_id).only('id', field).first()
+    if user is None or getattr(user, field).name != name:
+        return None
+
+    variants = make_variants(getattr(user, field))
+
+    # Unless the image was changed while the variants were made
+    User.objects\
+        .filter(id=user_id, **{field: name})\
+        .update(**{f'{field}_variants': variants, 'modified': timezone.now()})
+    return variants
@@ -1,4 +1,16 @@
+import json
+from datetime import date
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from threading import Thread
+from urllib.parse import urlsplit
+
 import pytest
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from main.tests import mixer, client
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
@@ -8,7 +20,11 @@ from rest_framework.test import APIClient
 from games.models import RsvpStatus
 from teams.models import Role
 
+from .backends import EmailOrUsernameAuthBackend
+from .models import User, recount_invites
 from .pipeline import facebook_extra_details
+from .principals import principals_cached
+from .tasks import fetch_facebook_details, make_image_variants
 
 pytestmark = pytest.mark.django_db
 
@@ -35,6 +51,7 @@ def test_user_has_game_invites():
         'games.RsvpStatus', player=user, status=RsvpStatus.INVITED
     )
     role = mixer.blend('teams.Role', player=user, status=Role.INVITED)
+    user.refresh_from_db()  # Invites counters are updated in the database
 
     client = APIClient()
     client.force_authenticate(user=user)
@@ -47,30 +64,100 @@ def test_user_has_game_invites():
         'Sould have two invites total, one for games and one for teams'
 
 
-def test_facebook_pipeline(mocker):
-    class MockResponse():
-        def __init__(self, data):
-            self.data = data
+def test_user_invites_counters():
+    user = mixer.blend('users.User')
+    games = mixer.cycle(3).blend('games.Game')
+    team = mixer.blend('teams.Team')
+
+    def get_counts():
+        user.refresh_from_db()
+        return user.game_invites, user.team_invites
+
+    RsvpStatus.objects.bulk_insert([
+        RsvpStatus(game=game, player=user, status=RsvpStatus.INVITED)
+        for game in games
+    ])
+    role = Role.objects.create(team=team, player=user, role=Role.INVITED)
+    assert get_counts() == (3, 1)
+
+    rsvp = RsvpStatus.objects.get(game=games[0], player=user)
+    rsvp.status = RsvpStatus.GOING
+    rsvp.save()
+    rsvp.save()
+    assert get_counts() == (2, 1), 'Accepted invites are not counted'
+
+    RsvpStatus.objects.get(game=games[1], player=user).delete()
+    role.role = Role.FIELD
+    role.save()
+    assert get_counts() == (1, 0)
+
+    games[2].delete()
+    Role.objects.create(team=mixer.blend('teams.Team'), player=user)
+    assert get_counts() == (0, 1)
+
+    User.objects.filter(id=user.id).update(game_invites=5, team_invites=0)
+    assert recount_invites() == 1
+    assert get_counts() == (0, 1), 'Counters should be fixed'
+    assert recount_invites() == 0
+
+    stale = User.objects.get(id=user.id)
+    Role.objects.create(team=mixer.blend('teams.Team'), player=user)
+    stale.bio = 'Bio'
+    stale.save()
+    assert get_counts() == (0, 2), 'Saves should not write back counters'
+    assert user.bio == 'Bio'
+
+    User.objects.filter(id=user.id).delete()
+    stale.save()
+    assert User.objects.filter(id=user.id).exists(), \
+        'Saves of deleted users should insert them again'
+
+
+@pytest.fixture
+def graph_api(settings, tmpdir):
+    """Local fake of Facebook Graph API, set `me` to the user details"""
+    settings.MEDIA_ROOT = str(tmpdir)
+
+    image = BytesIO()
+    Image.new('RGB', (64, 32)).save(image, 'PNG')
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            server.paths.append(path)
+            if path == '/me':
+                body = json.dumps(server.me).encode()
+            elif path.endswith('.png'):
+                body = image.getvalue()
+            else:
+                return self.send_error(404)
+
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
 
-        def json(self):
-            return self.data
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    server.url = f'http://127.0.0.1:{server.server_port}'
+    server.me = {}
+    server.paths = []
+    settings.FACEBOOK_GRAPH_URL = server.url
 
-    def get_mock(*args, **kwargs):
-        return MockResponse({})
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
 
-    requests_get = mocker.patch('requests.get', side_effect=get_mock)
 
-    class NoImage:
-        name = None
+def test_facebook_pipeline(mocker):
+    delay = mocker.patch('users.pipeline.fetch_facebook_details.delay')
+    mocker.patch('users.pipeline.on_commit', side_effect=lambda func: func())
 
     class MockUser:
-        email = 'mail@example.com'
-        birthday = None
-        img = NoImage()
-        cover = NoImage()
-
-        def save(self):
-            pass
+        id = 1
 
     class MockBackEnd:
         name = 'facebook'
@@ -79,16 +166,65 @@ def test_facebook_pipeline(mocker):
         extra_data = {'access_token': 'foobar'}
 
     facebook_extra_details(MockBackEnd(), MockUser(), social=MockSocial())
+    delay.assert_called_once_with(1, 'foobar')
+
+
+def test_facebook_details_task(graph_api):
+    user = mixer.blend('users.User', email='', birthday=None, gender=None,
+                       img=None, cover=None)
+    graph_api.me = {
+        'birthday': '02/03/1990',
+        'cover': {'source': f'{graph_api.url}/cover.png'},
+        'email': 'Mail@Example.com',
+        'gender': 'female',
+        'picture': {'data': {'url': f'{graph_api.url}/img.png?size=640'}},
+    }
 
+    assert fetch_facebook_details(user.id, 'token') == \
+        ['birthday', 'cover', 'email', 'gender', 'img']
 
-def test_email_blank_or_unique():
+    user.refresh_from_db()
+    assert user.email == 'mail@example.com'
+    assert user.birthday == date(1990, 2, 3)
+    assert user.gender == User.FEMALE
+    assert user.img.name.startswith('img')
+    assert user.cover.name.startswith('cover')
+
+    assert fetch_facebook_details(user.id, 'token') == [], \
+        'Details should be applied once'
+    assert graph_api.paths.count('/img.png') == 1
+
+    other = mixer.blend('users.User', email='', birthday=None, gender=None,
+                        img=None, cover=None)
+    graph_api.me = {'email': 'mail@example.com', 'gender': 'male'}
+    assert fetch_facebook_details(other.id, 'token') == ['gender'], \
+        'Emails of other accounts are skipped'
+
+
+def test_email_blank_or_unique(django_assert_num_queries):
     alice = mixer.blend('users.User', email='alice@example.com')
 
     with pytest.raises(ValidationError):
         eve = mixer.blend('users.User', email='alice@example.com')
 
+    with pytest.raises(ValidationError):
+        eve = mixer.blend('users.User', email=' Alice@Example.com')
+
     mixer.cycle(2).blend('users.User', email='')
 
+    bob = User.objects.get(id=mixer.blend('users.User', email='bob@a.com').id)
+    with django_assert_num_queries(1):
+        bob.first_name = 'Bob'
+        bob.save()  # Email is not changed, so no savepoint
+
+    bob.email = 'Alice@example.com'
+    with pytest.raises(ValidationError):
+        bob.save()
+
+    bob.email = 'BOB@example.com'
+    bob.save()
+    assert User.objects.filter(normalized_email='bob@example.com').exists()
+
 
 def test_account_delete():
     user = mixer.blend('users.User')
@@ -124,3 +260,116 @@ def test_passwodr_change():
 
     user.refresh_from_db()
     assert user.check_password('4321'), 'Should set new password'
+
+
+def test_email_or_username_login(django_assert_num_queries, mocker):
+    alice = mixer.blend('users.User', username='alice', email='a@a.com')
+    alice.set_password('1234')
+    alice.save()
+    # Email of one user is the username of the other
+    eve = mixer.blend('users.User', username='a@a.com', email='')
+    eve.set_password('4321')
+    eve.save()
+
+    backend = EmailOrUsernameAuthBackend()
+    check_password = mocker.spy(User, 'check_password')
+    with django_assert_num_queries(1):
+        assert backend.authenticate(username='A@a.com ', password='1234') \
+            == alice
+    assert backend.authenticate(username='alice', password='1234') == alice
+    assert backend.authenticate(username='a@a.com', password='4321') == eve, \
+        'Username match goes first'
+    assert backend.authenticate(username='a@a.com', password='1234') is None
+    assert check_password.call_count == 4, 'One password check per login'
+
+    assert backend.authenticate(username='bob', password='1234') is None
+
+
+def test_duplicate_email_login():
+    alice = mixer.blend('users.User', email='a@a.com')
+    alice.set_password('1234')
+    alice.save()
+    eve = mixer.blend('users.User', email='')
+    eve.set_password('4321')
+    eve.save()
+    # Newer duplicate left by the users/0011 migration
+    User.objects.filter(id=eve.id).update(email='a@a.com')
+
+    backend = EmailOrUsernameAuthBackend()
+    assert backend.authenticate(username='a@a.com', password='1234') == alice
+    assert backend.authenticate(username='A@a.com', password='4321') == eve, \
+        'Accounts without normalized_email should still log in by email'
+    assert backend.authenticate(username='a@a.com', password='0000') is None
+
+
+def test_jwt_cached_principal(settings):
+    user = mixer.blend('users.User', username='alice')
+    user.set_password('1234')
+    user.save()
+    client = APIClient()
+
+    def get_token(password='1234'):
+        res = client.post('/api/auth/jwt/', {
+            'username': 'alice',
+            'password': password,
+        })
+        return res.data.get('token')
+
+    def get(url, token):
+        client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(url)
+        return res.status_code, len(queries)
+
+    token = get_token()
+    url = reverse('team-managed')
+    code, queries_count = get(url, token)
+    assert code == status.HTTP_200_OK
+    assert get(url, token) == (code, queries_count - 2), \
+        'User should be loaded from the cache'
+
+    client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+    res = client.patch(reverse('current-user'), {'password': '4321'})
+    assert res.status_code == status.HTTP_200_OK
+    new_token = res.data['token']
+    assert get(url, token)[0] == status.HTTP_401_UNAUTHORIZED, \
+        'Password change should revoke the tokens'
+    res = client.post('/api/auth/jwt/refresh/', {'token': token})
+    assert res.status_code == status.HTTP_400_BAD_REQUEST, \
+        'Revoked tokens can not be refreshed'
+
+    token = new_token
+    assert get(url, token)[0] == status.HTTP_200_OK
+    assert get_token('4321') is not None
+
+    client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+    res = client.delete(reverse('current-user'))
+    assert res.status_code == status.HTTP_204_NO_CONTENT
+    assert get(url, token)[0] == status.HTTP_401_UNAUTHORIZED, \
+        'Deactivated user should be logged out'
+
+    settings.CACHE_PRINCIPALS = None
+    assert not principals_cached(), \
+        'Principals should not be cached in a per-process cache'
+
+
+def test_image_variants(client, settings, tmpdir):
+    settings.MEDIA_ROOT = str(tmpdir)
+    user = client.user
+    image = BytesIO()
+    Image.new('RGB', (1000, 500)).save(image, 'PNG')
+
+    user.img.save('photo.png', ContentFile(image.getvalue()))
+    assert user.img_variants == {}, 'Variants are made in the background'
+
+    variants = make_image_variants(user.id, 'img', user.img.name)
+    assert {'small', 'medium', 'large'} <= set(variants)
+    with default_storage.open(variants['small']) as small:
+        assert Image.open(small).size == (64, 32)
+
+    res = client.get(reverse('player-details', (user.id, )))
+    assert res.data['img_variants']['small'].endswith(variants['small'])
+    assert res.data['cover_variants'] is None
+
+    assert make_image_variants(user.id, 'img', 'old.png') is None, \
+        'Variants of replaced images are not made'
@@ -7,6 +7,8 @@ from rest_framework.generics import (
     ListAPIView,
     RetrieveAPIView,
 )
+
+from main.conditional import ConditionalGetMixin
 from .models import User
 from .serializers import (
     CurrentUserSerializer,
@@ -22,10 +24,15 @@ class CurrentUser(RetrieveUpdateDestroyAPIView):
     serializer_class = CurrentUserSerializer
 
     def get_object(self):
-        return self.request.user
+        user = self.request.user
+        if user.get_deferred_fields():
+            # Cached principal (see users.authentication)
+            user = User.objects.get(pk=user.pk)
+        return user
 
     def perform_destroy(self, instance: User):
         instance.is_active = False
+        instance.revoke_tokens()
         instance.save()
 
 
@@ -35,6 +42,12 @@ class PlayerList(ListAPIView):
     search_fields = ('first_name', 'last_name', 'bio')
 
 
-class PlayerDetails(RetrieveAPIView):
+class PlayerDetails(ConditionalGetMixin, RetrieveAPIView):
     serializer_class = PlayerDetailsSerializer
     queryset = User.objects.all()
+
+    def get_last_modified(self):
+        return User.objects\
+            .filter(pk=self.kwargs['pk'])\
+            .values_list('modified', flat=True)\
+            .first()